@@ -31,474 +31,491 @@ bl_info = {
 }
 
 import bpy
-import struct
-import argparse
+import os
 import json
-from math import degrees, radians, isclose
-from mathutils import Matrix, Euler
+import time
+import tempfile
+import cProfile
+from dataclasses import replace
+import numpy as np
+from math import radians, degrees
 from bpy.types import Panel, Operator
-from bpy.props import StringProperty, BoolProperty, IntProperty, FloatProperty
+from bpy.props import StringProperty, BoolProperty, IntProperty, FloatProperty, EnumProperty
 from bpy_extras.io_utils import ExportHelper
-import re
-
-# ---------------------------------------------- BONES --------------------------------------------
-
-BASE_BONES = [
-    "mPelvis",
-    "mTorso",
-    "mChest",
-    "mNeck",
-    "mHead",
-    "mSkull",
-    "mCollarLeft",
-    "mShoulderLeft",
-    "mElbowLeft",
-    "mWristLeft",
-    "mCollarRight",
-    "mShoulderRight",
-    "mElbowRight",
-    "mWristRight",
-    "mHipLeft",
-    "mKneeLeft",
-    "mAnkleLeft",
-    "mFootLeft",
-    "mToeLeft",
-    "mHipRight",
-    "mKneeRight",
-    "mAnkleRight",
-    "mFootRight",
-    "mToeRight",
-    "mGroin"
-]
-
-VOLUME_BONES = [
-    "LEFT_PEC",
-    "RIGHT_PEC",
-    "PELVIS",
-    "HEAD",
-    "NECK",
-    "R_CLAVICLE",
-    "L_CLAVICLE",
-    "CHEST",
-    "UPPER_BACK",
-    "BELLY",
-    "LEFT_HANDLE",
-    "RIGHT_HANDLE",
-    "R_UPPER_ARM",
-    "L_UPPER_ARM",
-    "LOWER_BACK",
-    "BUTT",
-    "R_LOWER_ARM",
-    "L_LOWER_ARM",
-    "L_HAND",
-    "R_HAND",
-    "R_UPPER_LEG",
-    "L_UPPER_LEG",
-    "R_LOWER_LEG",
-    "L_LOWER_LEG",
-    "R_FOOT",
-    "L_FOOT"
-]
-
-def is_sl_bone(bone):    
-    # Base and Volume bones
-    if bone in BASE_BONES or bone in VOLUME_BONES:
-        return True
-
-    # Fingers
-    if re.search("^mHand(Thumb|Index|Middle|Ring|Pinky)(1|2|3)(Right|Left)$", bone):
-        return True
-    
-    # Tail
-    if re.search("^mTail(1|2|3|4|5|6)$", bone):
-        return True
-    
-    # Spine
-    if re.search("^mSpine(1|2|3|4)$", bone):
-        return True
-    
-    # Wings
-    if "mWingsRoot" == bone or "mWing4FanRight" == bone or "mWing4FanLeft" == bone:
-        return True
-    if re.search("^mWing(1|2|3|4)(Right|Left)$", bone):
-        return True
-    
-    # Hinds Limbs
-    if "mHindLimbsRoot" == bone:
-        return True
-    if re.search("^mHindLimb(1|2|3|4)(Right|Left)$", bone):
-        return True
-    
-    # Face
-    if re.search("^mFaceForehead(Right|Left|Center)$", bone):
-        return True
-    if re.search("^mFaceEyebrow(Outer|Center|Inner)(Right|Left)$", bone):
-        return True
-    if re.search("^mFaceEyeLid(Upper|Lower)(Right|Left)$", bone):
-        return True
-    if re.search("^mFaceEyeAlt(Right|Left)$", bone):
-        return True
-    if re.search("^mFaceEyecornerInner(Right|Left)$", bone):
-        return True
-    if re.search("^mFaceEar(1|2)(Right|Left)$", bone):
-        return True
-    if re.search("^mFaceNose(Right|Left|Center|Base|Bridge)$", bone):
-        return True
-    if re.search("^mFaceCheek(Upper|Lower)(Right|Left)$", bone):
-        return True
-    if "mFaceJaw" == bone or "mFaceChin" == bone or "mFaceJawShaper" == bone or "mFaceRoot" == bone:
-        return True
-    if re.search("^mFaceLip(Upper|Corner)(Right|Left|Center)$", bone):
-        return True
-    if re.search("^mFaceTongue(Base|Tip)$", bone):
-        return True
-    if re.search("^mFaceLipLower(Right|Left|Center)$", bone):
-        return True
-    if re.search("^mFaceTeeth(Lower|Upper)$", bone):
-        return True
-    
-    # Eyes
-    if re.search("^mEye(Right|Left)$", bone):
-        return True
-        
-    return False
+from .slanim.skeleton import BASE_BONES, VOLUME_BONES, SL_BONES, is_sl_bone, getHierarchyIssues
+from .sampling import SAMPLING_ITEMS, SceneSampler, SceneIsolation, RangeSampler, FCurveSampler, getSamplingMethod
+from .slanim import posemath
+from .slanim.reduction import countKeys, countSampledKeys, getStreamingReducer, TrackStream
+from .slanim.cache import SampleCache
+from .slanim.sparse import sampleSparse
+from .slanim.profiling import ExportProfiler
+from .slanim.pipeline import Pipeline, getDefaultWorkers
+from .slanim.budget import MAX_ANIM_SIZE, fitToSize
+from .slanim.options import ExportOptions
+from .slanim.variants import parseVariants, getVariantPath, getVariantJoints
+from .slanim.mirror import getMirroredValues, getMirroredPositions
+from .slanim.sidecar import getSidecarPath, writeSidecar
+from .slanim.tracks import ROTATION_COMPONENTS, POSITION_COMPONENTS, JointTrack, TrackSpill, getEmptyTrack
+from .slanim.anim import sAnimHeader, sAnimParams, sAnimFrame, sAnimUInt32, sAnimConstraint, getClipDictionary, convertDictionaryToAnim
 
 # ---------------------------------------------- ACTION TO DICTIONARY -------------------------------------
 
-class DecoratedBone:
-
-    def __init__(self, obj, arm, bone_name):
-        
-        self.name = bone_name
-        
-        self.rest_bone = arm.bones[bone_name]
-        self.pose_bone = obj.pose.bones[bone_name]
-        
-        self.rot_order_str = 'ZYX'
-        self.rot_order_str_reverse = self.rot_order_str[::-1]
-        self.rot_order = (2, 1, 0)
-        
-        self.pose_mat = self.pose_bone.matrix
-        self.rest_arm_mat = self.rest_bone.matrix_local
-        self.rest_local_mat = self.rest_bone.matrix
-        self.pose_imat = self.pose_mat.inverted()
-        self.rest_arm_imat = self.rest_arm_mat.inverted()
-        self.rest_local_imat = self.rest_local_mat.inverted()
-         
-        self.parent = None
-        self.prev_euler = Euler((0.0, 0.0, 0.0), self.rot_order_str_reverse)
-    
-    def update_posedata(self):
-        self.pose_mat = self.pose_bone.matrix
-        self.pose_imat = self.pose_mat.inverted()
-    
-    def __repr__(self):
-        if self.parent:
-            return "[\"%s\" child on \"%s\"]\n" % (self.name, self.parent.name)
-        else:
-            return "[\"%s\" root bone]\n" % (self.name)
-
-def getChannels(with_translations):
-    channels = {"rotation_channels": [], "location_channels": []}
-    obj = bpy.context.active_object
-    action = obj.animation_data.action
+# SL avatars face X, Blender avatars face -Y: the export space is the armature space turned by 90 degrees around Z
+EXPORT_ROTATION = np.array([
+    [0.0, -1.0, 0.0, 0.0],
+    [1.0, 0.0, 0.0, 0.0],
+    [0.0, 0.0, 1.0, 0.0],
+    [0.0, 0.0, 0.0, 1.0]
+])
+
+# Frames sampled at once. Long takes are sampled, reduced and spilled window by window
+FRAME_WINDOW = 256
+
+class ExportPlan:
+    """Everything getJoints needs that does not change from one frame to the next."""
+
+    def __init__(self, obj, channels, frame_start, frame_end):
+        arm = obj.data
+
+        self.rotation_channels = set(channels['rotation_channels'])
+        self.location_channels = set(channels['location_channels'])
+
+        # Exported bones in armature order, and the bones whose pose matrices they need
+        self.bones = [bone for bone in arm.bones if bone.name in self.rotation_channels or bone.name in self.location_channels]
+        self.sampled_names = []
+        for bone in self.bones:
+            for sampled in (bone, bone.parent):
+                if sampled and not sampled.name in self.sampled_names:
+                    self.sampled_names.append(sampled.name)
+
+        # Roots point to the identity matrix appended after the sampled bones
+        identity = np.identity(4)
+        sampled_indices = {name: i for i, name in enumerate(self.sampled_names)}
+        self.bone_indices = [sampled_indices[bone.name] for bone in self.bones]
+        self.parent_indices = [sampled_indices[bone.parent.name] if bone.parent else -1 for bone in self.bones]
+
+        self.parent_rest_mats = np.array([bone.parent.matrix_local if bone.parent else identity for bone in self.bones]).reshape(-1, 4, 4)
+        self.rest_imats = np.array([bone.matrix_local.inverted() for bone in self.bones]).reshape(-1, 4, 4)
+        self.heads = np.array([bone.head_local for bone in self.bones]).reshape(-1, 3)
+        self.head_offsets = np.array([
+            bone.head_local - bone.parent.head_local if bone.parent else bone.head
+            for bone in self.bones
+        ]).reshape(-1, 3) @ EXPORT_ROTATION[:3, :3].T
+
+        self.frame_start = frame_start
+        self.frame_end = frame_end
+        self.frames = range(frame_start, frame_end + 1)
+        self.times = posemath.getFrameTimes(frame_start, frame_end, self.frames)
+
+    def getLocalTransforms(self, pose_mats):
+        """Computes the rest relative transforms of the exported bones, in export space, from the sampled pose matrices."""
+        identity = np.broadcast_to(np.identity(4), (len(pose_mats), 1, 4, 4))
+        pose_mats = np.concatenate((pose_mats, identity), axis=1)
+        mats = posemath.getLocalTransforms(
+            pose_mats[:, self.bone_indices],
+            pose_mats[:, self.parent_indices],
+            self.parent_rest_mats,
+            self.rest_imats,
+            self.heads
+        )
+        return EXPORT_ROTATION @ mats @ EXPORT_ROTATION.T
+
+    def getJointTransforms(self, j, local_mats):
+        """Same as getLocalTransforms for the exported bone j alone, from its (frames, 4, 4) rest relative transforms in armature space."""
+        mats = posemath.getTranslationMatrices(-self.heads[j]) @ local_mats @ posemath.getTranslationMatrices(self.heads[j])
+        return EXPORT_ROTATION @ mats @ EXPORT_ROTATION.T
+
+    def getRestPositions(self, offset):
+        """Returns the position keys of the exported bones at rest."""
+        positions = self.head_offsets * 0.5
+        return {bone.name: positions[j] - offset if 'mPelvis' == bone.name else positions[j] for j, bone in enumerate(self.bones)}
+
+    def getDepths(self):
+        return {bone.name: len(bone.parent_recursive) for bone in self.bones}
+
+def getChannels(with_translations, obj=None, action=None):
+    """Returns the SL bones of the armature that the action animates, the active armature and its action by default."""
+    rotation_channels = {}
+    location_channels = {}
+    obj = obj or bpy.context.active_object
+    action = action or obj.animation_data.action
     for fcurve in action.fcurves:
-        if "pose.bones" != fcurve.data_path[0:10]:
+        bone_path, _, fcurve_type = fcurve.data_path.rpartition('.')
+        # pose.bones["name"]
+        if 'pose.bones["' != bone_path[0:12]:
             continue
-        parts = fcurve.data_path.rpartition('.')
-        pose_bone = obj.path_resolve(parts[0])
-        fcurve_type = parts[2]
-        if not is_sl_bone(pose_bone.name):
+        bone_name = bone_path[12:-2]
+        if not bone_name in SL_BONES:
             continue
-        if 'rotation_quaternion' == fcurve_type and not pose_bone.name in channels['rotation_channels']:
-            channels['rotation_channels'].append(pose_bone.name)
-        if 'location' == fcurve_type and not pose_bone.name in channels['location_channels']:
-            if 'mPelvis' == pose_bone.name or with_translations:
-                channels['location_channels'].append(pose_bone.name)
-
-    return channels
-
+        if 'rotation_quaternion' == fcurve_type:
+            rotation_channels[bone_name] = True
+        if 'location' == fcurve_type:
+            if 'mPelvis' == bone_name or with_translations:
+                location_channels[bone_name] = True
+
+    pose_bones = obj.pose.bones
+    return {
+        "rotation_channels": [name for name in rotation_channels if pose_bones.get(name)],
+        "location_channels": [name for name in location_channels if pose_bones.get(name)]
+    }
 
-def getBonesDecorated(obj, arm):
-    bones_decorated = [DecoratedBone(obj, arm, bone.name) for bone in arm.bones]
 
-    # Assign parents
-    bones_decorated_dict = {dbone.name: dbone for dbone in bones_decorated}
-    for dbone in bones_decorated:
-        parent = dbone.rest_bone.parent
-        if parent:
-            dbone.parent = bones_decorated_dict[parent.name]
-    del bones_decorated_dict
+def getSampledBoneNames(options):
+    """Returns the names of the bones an export samples, for the file and all its variants."""
+    channels = getChannels(options.getSampledTranslations())
+    return channels['rotation_channels'] + channels['location_channels']
 
-    return bones_decorated
 
+def sampleKeyframes(plan, sampler, j, is_rotation, offset, tolerance):
+    """Samples the track of the exported bone j at its keyframes, refined within tolerance, and returns it as a JointTrack."""
+    bone = plan.bones[j]
 
-def getJoints(priority, with_translations):
+    def sample(frames):
+        mats = plan.getJointTransforms(j, sampler.sampleLocalMatrices(bone.name, frames, not is_rotation))
+        if is_rotation:
+            return posemath.getQuaternionsFromMatrices(mats)
+        locs = (mats[:, :3, 3] + plan.head_offsets[j]) * 0.5
+        return locs - offset if 'mPelvis' == bone.name else locs
+
+    frames, values = sampleSparse(sampler.getKeyframes(bone.name, plan.frame_start, plan.frame_end), sample, tolerance, is_rotation)
+    times = posemath.getFrameTimes(plan.frame_start, plan.frame_end, frames)
+    return JointTrack(times, values, ROTATION_COMPONENTS if is_rotation else POSITION_COMPONENTS)
+
+
+def runSteps(steps):
+    """Runs the steps of an export to the end and returns its result."""
+    while True:
+        try:
+            next(steps)
+        except StopIteration as stop:
+            return stop.value
+
+
+def iterJoints(options, spill_dir=None, sample_cache=None, profiler=None, pipeline=None, sampled_ranges=None):
+    """
+    Samples the joints of the active armature with the sampling, reduction
+    and isolation of the ExportOptions. Yields the progress, from 0 to 1,
+    after every sampled window or track, and returns the joints.
+
+    The windows are reduced in the pipeline while the next one is sampled.
+    With options.isolate, scene evaluation only evaluates the objects the armature
+    depends on. sampled_ranges replaces scene evaluation with the pose
+    matrices sampled by other processes, as (frame_start, frame_end, .npy path)
+    ranges covering the frames of the scene. Closing the generator stops the
+    export and puts the scene back the way it was.
+    """
 
     context = bpy.context
     obj = context.active_object
     arm = obj.data
-    offset = arm.bones[0].head / 2
+    offset = np.array(arm.bones[0].head / 2)
     scene = context.scene
 
-    bpy.ops.object.mode_set(mode = 'OBJECT')
-    obj.rotation_euler[2] = radians(90)
-    bpy.ops.object.transform_apply(rotation=True)
-
+    # Bones edited in edit mode are only copied to the armature when leaving it
+    if 'EDIT' == obj.mode:
+        obj.update_from_editmode()
+
+    profiler = profiler or ExportProfiler()
+    own_pipeline = pipeline is None
+    if own_pipeline:
+        pipeline = Pipeline(0, profiler)
+    with profiler.stage("channels"):
+        plan = ExportPlan(obj, getChannels(options.with_translations), scene.frame_start, scene.frame_end)
+
+    sampling = options.sampling
+    rotation_tolerance = options.rotation_tolerance
+    position_tolerance = options.position_tolerance
+    # Only the F-Curves define the samples of the F-Curve paths, so only they can be cached
+    if sampling not in ('FCURVES', 'KEYFRAMES'):
+        sample_cache = None
+    if sample_cache is not None:
+        hash_sampler = FCurveSampler(obj, plan.sampled_names)
+        fps = scene.render.fps / scene.render.fps_base
+
+    # One stream per track, fed window by window through its reducer into its spill.
+    # The tracks are spread over the lanes of the pipeline, the windows of a track stay in order
     joints = {}
+    streams = []
+    for j, bone in enumerate(plan.bones):
+
+        joints[bone.name] = {
+            "priority": options.priority,
+            "position_keys": getEmptyTrack(POSITION_COMPONENTS),
+            "rotation_keys": getEmptyTrack(ROTATION_COMPONENTS)
+        }
+
+        for channels, keys, components, tolerance, is_rotation in (
+            (plan.location_channels, "position_keys", POSITION_COMPONENTS, position_tolerance, False),
+            (plan.rotation_channels, "rotation_keys", ROTATION_COMPONENTS, rotation_tolerance, True),
+        ):
+            if not bone.name in channels:
+                continue
+            path = os.path.join(spill_dir, "%d_%s.bin" % (j, keys)) if spill_dir else None
+            joints[bone.name][keys] = TrackSpill(components, path)
+            stream = TrackStream(joints[bone.name][keys], getStreamingReducer(options.key_reduction, tolerance, is_rotation))
+            lane = j % pipeline.workers
+
+            cache_key = None
+            if sample_cache is not None:
+                hasher = hash_sampler.getBoneHasher(bone.name)
+                if hasher:
+                    with profiler.stage("cache"):
+                        cache_key = hasher.update(
+                            keys, plan.frame_start, plan.frame_end, fps, offset, EXPORT_ROTATION,
+                            plan.parent_rest_mats[j], plan.rest_imats[j], plan.heads[j], plan.head_offsets[j]
+                        )
+                        # The frames picked by keyframe sampling also depend on the tolerance
+                        if 'KEYFRAMES' == sampling:
+                            hasher.update(sampling, tolerance)
+                        cache_key = hasher.getKey()
+                        track = sample_cache.load(cache_key, components)
+                    if track is not None:
+                        pipeline.submit(lane, "reduction", stream.pushWindows, track, FRAME_WINDOW)
+                        pipeline.submit(lane, "reduction", stream.flush)
+                        continue
+                    stream.raw = TrackSpill(components, path + ".raw" if path else None)
+
+            streams.append((bone.name, is_rotation, stream, cache_key, lane))
+
+    # Bones left to sample, all of them unless some came from the cache
+    sampled_bones = {bone_name for bone_name, is_rotation, stream, cache_key, lane in streams}
+    if len(sampled_bones) < len(plan.bones):
+        plan = ExportPlan(obj, {
+            "rotation_channels": [bone.name for bone in plan.bones if bone.name in sampled_bones and bone.name in plan.rotation_channels],
+            "location_channels": [bone.name for bone in plan.bones if bone.name in sampled_bones and bone.name in plan.location_channels]
+        }, scene.frame_start, scene.frame_end)
+    bone_indices = {bone.name: j for j, bone in enumerate(plan.bones)}
+    lanes = [[stream for stream in streams if lane == stream[4]] for lane in range(pipeline.workers)]
+
+    def pushWindow(lane_streams, times, quats, locs):
+        for bone_name, is_rotation, stream, cache_key, lane in lane_streams:
+            j = bone_indices[bone_name]
+            if is_rotation:
+                stream.push(JointTrack(times, quats[:, j], ROTATION_COMPONENTS))
+            elif 'mPelvis' == bone_name:
+                stream.push(JointTrack(times, locs[:, j] - offset, POSITION_COMPONENTS))
+            else:
+                stream.push(JointTrack(times, locs[:, j], POSITION_COMPONENTS))
 
-    bones_decorated = getBonesDecorated(obj, arm)
-    channels = getChannels(with_translations)
-    
     frame_current = scene.frame_current
     
     wm = bpy.context.window_manager
     wm.progress_begin(0, scene.frame_end - scene.frame_start)
 
-    for frame in range(scene.frame_start, scene.frame_end + 1):
-        
-        wm.progress_update(frame - scene.frame_start)
-  
-        scene.frame_set(frame)
+    if not streams:
+        sampler = None
+    elif sampling in ('FCURVES', 'KEYFRAMES'):
+        sampler = FCurveSampler(obj, plan.sampled_names)
+    elif sampled_ranges:
+        sampler = RangeSampler(obj, plan.sampled_names, sampled_ranges)
+    else:
+        sampler = SceneSampler(scene, obj, plan.sampled_names)
+    isolation = SceneIsolation(scene, obj) if options.isolate and isinstance(sampler, SceneSampler) else None
+
+    try:
+        if isolation:
+            with profiler.stage("isolation"):
+                isolation.isolate()
+
+        # Keyframe sampling picks its own frames for every track, the refinement uses the reduction tolerances
+        if 'KEYFRAMES' == sampling:
+            for i, (bone_name, is_rotation, stream, cache_key, lane) in enumerate(streams):
+                wm.progress_update(round(i / len(streams) * (len(plan.frames) - 1)))
+                with profiler.hotLoop(), profiler.stage("sampling"):
+                    track = sampleKeyframes(
+                        plan, sampler, bone_indices[bone_name], is_rotation, offset,
+                        rotation_tolerance if is_rotation else position_tolerance
+                    )
+                profiler.addKeys("sampling", 0, len(track))
+                pipeline.submit(lane, "reduction", stream.pushWindows, track, FRAME_WINDOW)
+                yield (i + 1) / len(streams)
+        else:
+            for start in range(0, len(plan.frames) if sampler else 0, FRAME_WINDOW):
+                frames = plan.frames[start:start + FRAME_WINDOW]
+                times = plan.times[start:start + FRAME_WINDOW]
+                with profiler.hotLoop():
+                    with profiler.stage("sampling"):
+                        pose_mats = sampler.samplePoseMatrices(frames, lambda i: wm.progress_update(start + i))
+                    profiler.addKeys("sampling", 0, len(frames) * len(streams))
+
+                    with profiler.stage("pose_math"):
+                        mats = plan.getLocalTransforms(pose_mats)
+                        locs = (mats[..., :3, 3] + plan.head_offsets) * 0.5
+                        quats = posemath.getQuaternionsFromMatrices(mats)
+
+                for lane, lane_streams in enumerate(lanes):
+                    if lane_streams:
+                        pipeline.submit(lane, "reduction", pushWindow, lane_streams, times, quats, locs)
+                yield (start + len(frames)) / len(plan.frames)
+
+        for bone_name, is_rotation, stream, cache_key, lane in streams:
+            pipeline.submit(lane, "reduction", stream.flush)
+        pipeline.wait()
+    finally:
+        if own_pipeline:
+            pipeline.close(cancel=True)
+        if isolation:
+            isolation.restore()
+        if isinstance(sampler, SceneSampler):
+            scene.frame_set(frame_current)
+        wm.progress_end()
+
+    if sample_cache is not None:
+        with profiler.stage("cache"):
+            for bone_name, is_rotation, stream, cache_key, lane in streams:
+                if cache_key:
+                    sample_cache.store(cache_key, stream.raw.load())
+            sample_cache.evict()
+
+    tracks = [track for joint in joints.values() for track in (joint["rotation_keys"], joint["position_keys"])]
+    profiler.addKeys("reduction", sum(getattr(track, "sampled", 0) for track in tracks), sum(len(track) for track in tracks))
 
-        for dbone in bones_decorated:
-            dbone.update_posedata()
+    return joints
 
-        for dbone in bones_decorated:
 
-            if not dbone.name in channels['rotation_channels'] and not dbone.name in channels['location_channels']:
-                continue
+def getJoints(options, **kwargs):
+    return runSteps(iterJoints(options, **kwargs))
 
-            if frame == scene.frame_start:
-                joints[dbone.name] = {"priority": priority, "position_keys": [], "rotation_keys": []}
 
-            trans = Matrix.Translation(dbone.rest_bone.head_local)
-            itrans = Matrix.Translation(-dbone.rest_bone.head_local)
-            
-            if dbone.parent:
-                mat_final = dbone.parent.rest_arm_mat @ dbone.parent.pose_imat @ dbone.pose_mat @ dbone.rest_arm_imat
-                mat_final = itrans @ mat_final @ trans
-                loc = mat_final.to_translation() + (dbone.rest_bone.head_local - dbone.parent.rest_bone.head_local)
-            else:
-                mat_final = dbone.pose_mat @ dbone.rest_arm_imat
-                mat_final = itrans @ mat_final @ trans
-                loc = mat_final.to_translation() + dbone.rest_bone.head
-
-            rot = mat_final.to_euler(dbone.rot_order_str_reverse, dbone.prev_euler)
-            rot_quat = mat_final.to_quaternion()
-            
-            nbr_inter_frames = scene.frame_end - scene.frame_start
-            frameU16 = round((frame - scene.frame_start) / nbr_inter_frames * 0xFFFF) if nbr_inter_frames > 0 else 0
-            
-            if dbone.name in channels['location_channels']:
-                loc = loc * 0.5
-                if 'mPelvis' == dbone.name:
-                    loc = loc - offset
-                joints[dbone.name]["position_keys"].append({"time": frameU16, "x": loc.x, "y": loc.y, "z": loc.z})
-            
-            if dbone.name in channels['rotation_channels']:
-                joints[dbone.name]["rotation_keys"].append({
-                    "time": frameU16,
-                    "w": rot_quat.w,
-                    "x": rot_quat.x,
-                    "y": rot_quat.y,
-                    "z": rot_quat.z,
-                    # "eulerXYZ": f"{degrees(rot[dbone.rot_order[2]])} {degrees(rot[dbone.rot_order[1]])} {degrees(rot[dbone.rot_order[0]])}",
-                })
-
-            dbone.prev_euler = rot
-
-    scene.frame_set(frame_current)
-    wm.progress_end()
-
-    obj.rotation_euler[2] = radians(-90)
-    bpy.ops.object.transform_apply(rotation=True)
-    
-    return joints
-    
+def iterActionToDictionary(options, **kwargs):
+    """Samples the clip of the active armature, see iterJoints for the arguments."""
+    joints = yield from iterJoints(options, **kwargs)
+    return getActionDictionary(options, joints)
 
 
-def convertActionToDictionary(priority, loop, loop_start, loop_end, ease_in_duration, ease_out_duration, with_translations):
+def getActionDictionary(options, joints):
+    """Returns the dictionary of a clip of the scene frame range made of these joints, with the header of the ExportOptions."""
     scene = bpy.context.scene
     duration = (scene.frame_end - scene.frame_start) / scene.render.fps
 
+    loop_start = options.loop_start
+    loop_end = options.loop_end
+
     if loop_start < scene.frame_start:
         loop_start = scene.frame_start
         
     if loop_end > scene.frame_end:
         loop_end = scene.frame_end
 
-    action = {
-        "version": 1,
-        "sub_version": 0,
-        "base_priority": priority,
-        "duration": duration,
-        "emote_name": "",
-        "loop": int(loop),
-        "loop_in_point": (loop_start - scene.frame_start) / scene.render.fps,
-        "loop_out_point": (loop_end - scene.frame_start) / scene.render.fps,
-        "ease_in_duration": ease_in_duration,
-        "ease_out_duration": ease_out_duration,
-        "hand_pose": 0,
-        "constraints": [],
-        "joints": getJoints(priority, with_translations)
-    }
-
-    return action
-
-# ---------------------------------------------- DICTIONARY TO ANIM ---------------------------------------
-
-sAnimHeader = struct.Struct("<HHLf")
-sAnimParams = struct.Struct("<ffLffLL")
-sAnimFrame = struct.Struct("<HHHH")
-sAnimUInt32 = struct.Struct("<I") #Used for various stuff
-sAnimConstraint = struct.Struct("<BB16sfff16sffffffffff")
-
-def convertDictionaryToAnim(data):
-    result = b""
-    result += sAnimHeader.pack(
-        data["version"],
-        data["sub_version"],
-        data["base_priority"],
-        data["duration"]
+    return getClipDictionary(
+        options.priority, duration, options.loop,
+        (loop_start - scene.frame_start) / scene.render.fps,
+        (loop_end - scene.frame_start) / scene.render.fps,
+        options.ease_in, options.ease_out, joints
     )
-    result += data["emote_name"].encode() + b"\0"
-    result += sAnimParams.pack(
-        data["loop_in_point"],
-        data["loop_out_point"],
-        data["loop"],
-        data["ease_in_duration"],
-        data["ease_out_duration"],
-        data["hand_pose"],
-        len(data["joints"])
-    )
-    
-    for bname, joint in data["joints"].items():
-        
-        result += bname.encode() + b"\0"
-        
-        result += sAnimUInt32.pack(joint["priority"])
-        
-        result += sAnimUInt32.pack(len(joint["rotation_keys"]))
-        
-        for rot_key in joint["rotation_keys"]:
-                        
-            rot_w = rot_key['w']
-            rot_x = rot_key['x']
-            rot_y = rot_key['y']
-            rot_z = rot_key['z']
-  
-            if rot_w < 0:
-                rot_x = -rot_x
-                rot_y = -rot_y
-                rot_z = -rot_z
-                rot_w = -rot_w
-            
-            
-            result += sAnimFrame.pack(
-                rot_key["time"],
-                int(((rot_x + 1) / 2) * 0xFFFF),
-                int(((rot_y + 1) / 2) * 0xFFFF),
-                int(((rot_z + 1) / 2) * 0xFFFF)
-            )
-                    
-        result += sAnimUInt32.pack(len(joint["position_keys"]))
-        
-        for pos_key in joint["position_keys"]:
-            pos_key["x"] = min(max(-1,pos_key["x"]),1)
-            pos_key["y"] = min(max(-1,pos_key["y"]),1)
-            pos_key["z"] = min(max(-1,pos_key["z"]),1)
-            result += sAnimFrame.pack(
-                pos_key["time"],
-                int(((pos_key["x"]/5)+0.5)*0xFFFF),
-                int(((pos_key["y"]/5)+0.5)*0xFFFF),
-                int(((pos_key["z"]/5)+0.5)*0xFFFF)
-            )
-    
-    result += sAnimUInt32.pack(len(data["constraints"]))
-    
-    for constraint in data["constraints"]:
-        result += sAnimConstraint.pack(
-            constraint["chain_length"],
-            constraint["constraint_type"],
-            (constraint["source_volume"].encode()+(b"\0"*16))[0:16],
-            constraint["source_offset"][0],
-            constraint["source_offset"][1],
-            constraint["source_offset"][2],
-            (constraint["target_volume"].encode()+(b"\0"*16))[0:16],
-            constraint["target_offset"][0],
-            constraint["target_offset"][1],
-            constraint["target_offset"][2],
-            constraint["target_dir"][0],
-            constraint["target_dir"][1],
-            constraint["target_dir"][2],
-            constraint["ease_in_start"],
-            constraint["ease_in_stop"],
-            constraint["ease_out_start"],
-            constraint["ease_out_stop"]
-        )
-    
-    return result
-
-# ---------------------------------------------- CLEANING -------------------------------------------------
-
-def removeDuplicatedFrames(data):
-    def is_close_to_sibblings(previous_key, current_key, next_key, is_rotation):
-        if not isclose(previous_key['x'], current_key['x'], abs_tol=0.0001) or not isclose(current_key['x'], next_key['x'], abs_tol=0.0001):
-            return False
-        if not isclose(previous_key['y'], current_key['y'], abs_tol=0.0001) or not isclose(current_key['y'], next_key['y'], abs_tol=0.0001):
-            return False
-        if not isclose(previous_key['z'], current_key['z'], abs_tol=0.0001) or not isclose(current_key['z'], next_key['z'], abs_tol=0.0001):
-            return False
-        if is_rotation:
-            if not isclose(previous_key['w'], current_key['w'], abs_tol=0.0001) or not isclose(current_key['w'], next_key['w'], abs_tol=0.0001):
-                return False
-        return True
-    
-    for joint_name, joint in data['joints'].items():
-        if len(joint['rotation_keys']) >= 3:
-            to_delete = []
-            for i in range(1, len(joint['rotation_keys']) - 1):
-                previous_key = joint['rotation_keys'][i - 1]
-                current_key = joint['rotation_keys'][i]
-                next_key = joint['rotation_keys'][i + 1]
-                if is_close_to_sibblings(previous_key, current_key, next_key, True):
-                    to_delete.append(i)
-            for i in sorted(to_delete, reverse=True):
-                del data['joints'][joint_name]['rotation_keys'][i]
-
-        if len(joint['position_keys']) >= 3:
-            to_delete = []
-            for i in range(1, len(joint['position_keys']) - 1):
-                previous_key = joint['position_keys'][i - 1]
-                current_key = joint['position_keys'][i]
-                next_key = joint['position_keys'][i + 1]
-                if is_close_to_sibblings(previous_key, current_key, next_key, False):
-                    to_delete.append(i)
-            for i in sorted(to_delete, reverse=True):
-                del data['joints'][joint_name]['position_keys'][i]
-
-    return data
 
 
+def convertActionToDictionary(options, **kwargs):
+    return runSteps(iterActionToDictionary(options, **kwargs))
+
 # ---------------------------------------------- EXPORTER WIDGET ------------------------------------------
 
-def writeAnimToFile(context, filepath, priority, loop, loop_start, loop_end, ease_in, ease_out, dump_json, with_translations):
-    
-    dictionary = convertActionToDictionary(priority, loop, loop_start, loop_end, ease_in, ease_out, with_translations)
-    dictionary = removeDuplicatedFrames(dictionary)
-    anim = convertDictionaryToAnim(dictionary)
+def getSampleCache():
+    """Returns the cache of sampled tracks shared by all exports, in the Blender user data folder."""
+    return SampleCache(os.path.join(bpy.utils.user_resource('DATAFILES'), "sl_anim_exporter", "cache"))
+
+
+def iterAnimToFile(context, filepath, options, stats=None, sample_cache=None, profiler=None, workers=None, sampled_ranges=None):
+    """
+    Exports the active armature to a .anim file with the ExportOptions. Yields
+    the progress, from 0 to 1, and returns the operator result. Closing the
+    generator cancels the export.
+
+    Reduction and the JSON dump run in `workers` threads, a default number
+    when None, on the calling thread when 0. With a max_size in bytes, the
+    tolerances are only the base of the search for the smallest ones that fit.
+    Every variant of the options is also written from the same sampled
+    tracks. With sampled_ranges, scene evaluation reads the pose matrices
+    sampled by other processes instead, see iterJoints. With dump_json, the
+    tracks are also written to a sidecar in dump_format, one of
+    SIDECAR_FORMATS.
+    """
+
+    profiler = profiler or ExportProfiler()
+    outputs = [(filepath, options)] + [(getVariantPath(filepath, variant["name"]), options.getVariant(variant)) for variant in options.variants]
+    # The translations of every output are sampled at once, each one only keeps its own
+    sampled_options = replace(options, with_translations=options.getSampledTranslations())
+    # The size search starts from every key and does its own reduction, within the tolerances for 'TOLERANCE'
+    max_size = options.max_size
+    if max_size:
+        sampled_options.key_reduction = 'DUPLICATES'
+
+    # Memory tracing stops with the export, even when it fails or is cancelled
+    with profiler:
+        # Keys are reduced while sampling and spilled to disk until the files are assembled.
+        # The workers are joined before the spill directory is removed
+        with tempfile.TemporaryDirectory(prefix="sl_anim_") as spill_dir, \
+                Pipeline(getDefaultWorkers() if workers is None else workers, profiler) as pipeline:
+            dictionary = yield from iterActionToDictionary(
+                sampled_options, spill_dir=spill_dir, sample_cache=sample_cache, profiler=profiler, pipeline=pipeline, sampled_ranges=sampled_ranges
+            )
+            # The keys of the file alone, the variants may have sampled more channels
+            keys_before = countSampledKeys({"joints": getVariantJoints(dictionary["joints"], options.priority, options.with_translations)})
+
+            # Subtracted from the mPelvis positions, mirrored clips mirror it with them
+            obj = context.active_object
+            offset = np.array(obj.data.bones[0].head / 2)
+            if max_size:
+                plan = ExportPlan(obj, getChannels(sampled_options.with_translations), context.scene.frame_start, context.scene.frame_end)
+                depths = plan.getDepths()
+                rest_positions = plan.getRestPositions(offset)
+
+            results = []
+            for output_path, output_options in outputs:
+                output = getActionDictionary(
+                    output_options,
+                    getVariantJoints(dictionary["joints"], output_options.priority, output_options.with_translations, output_options.mirror, offset)
+                )
+                result = {"filepath": output_path}
+                if max_size:
+                    keys = countKeys(output)
+                    with profiler.stage("budget"):
+                        result["budget"] = fitToSize(
+                            output, max_size,
+                            getMirroredValues(depths) if output_options.mirror else depths,
+                            getMirroredPositions(rest_positions, offset) if output_options.mirror else rest_positions,
+                            output_options.rotation_tolerance, output_options.position_tolerance,
+                            'TOLERANCE' == output_options.key_reduction
+                        )
+                    profiler.addKeys("budget", keys, countKeys(output))
+                result["keys_after"] = countKeys(output)
+
+                # The sidecar is written while the file is encoded, both read the spilled tracks
+                if options.dump_json:
+                    pipeline.submit(0, "sidecar", writeSidecar, getSidecarPath(output_path, options.dump_format), output, options.dump_format)
+                with profiler.stage("encoding"):
+                    result["anim"] = convertDictionaryToAnim(output)
+                profiler.addKeys("encoding", result["keys_after"], result["keys_after"])
+                results.append(result)
+                yield 1.0
+            while not pipeline.isDone(0.05):
+                yield 1.0
+
+        with profiler.stage("write"):
+            for result in results:
+                f_anim = open(result["filepath"], 'wb')
+                f_anim.write(result.pop("anim"))
+                f_anim.close()
+                result["size"] = os.path.getsize(result["filepath"])
+
+    if stats is not None:
+        stats["keys_before"] = keys_before
+        stats["keys_after"] = results[0]["keys_after"]
+        stats["size"] = results[0]["size"]
+        if max_size:
+            stats["budget"] = results[0]["budget"]
+        if options.variants:
+            stats["variants"] = {variant["name"]: result for variant, result in zip(options.variants, results[1:])}
+        if sample_cache is not None:
+            stats["cache_hits"] = sample_cache.hits
+            stats["cache_misses"] = sample_cache.misses
+        stats.update(profiler.getStats())
 
-    if dump_json:
-        f_json = open(filepath + ".json", 'w')
-        f_json.write(json.dumps(dictionary, indent=4))
-        f_json.close()
+    return {'FINISHED'}
 
-    f_anim = open(filepath, 'wb')
-    f_anim.write(anim)
-    f_anim.close()
 
-    return {'FINISHED'}
+def writeAnimToFile(context, filepath, options, **kwargs):
+    return runSteps(iterAnimToFile(context, filepath, options, **kwargs))
 
 
 class SL_ANIM_EXPORTER_OT_export_operator(Operator, ExportHelper):
@@ -554,9 +571,113 @@ class SL_ANIM_EXPORTER_OT_export_operator(Operator, ExportHelper):
     )
 
     dump_json: BoolProperty(
-        name="Dump as JSON?",
+        name="Dump tracks?",
+        default=False,
+        description="This will produce an additional file with the keys before quantization, for debugging purposes."
+    )
+
+    dump_format: EnumProperty(
+        name="Format",
+        items=[
+            ('JSON', "JSON", "Indented .json file that you can open in a text editor"),
+            ('COMPACT', "Compact JSON", "Same .json file without whitespace, much smaller and faster to write on long takes"),
+            ('NPZ', "NumPy arrays", "Columnar .npz file with the times and values of every track, that numpy loads instantly"),
+        ],
+        default='JSON',
+        description="Format of the dumped tracks"
+    )
+
+    write_stats: BoolProperty(
+        name="Write stats?",
         default=False,
-        description="This will produce an addition .json file that you can open in a text editor for debuging purpose."
+        description="Write the time, calls, peak memory and keys of every export stage to a .stats.json file next to the .anim file. Tracing the memory slows the export down"
+    )
+
+    profile: BoolProperty(
+        name="Profile sampling?",
+        default=False,
+        description="Also capture a cProfile of the sampling loop to a .prof file next to the .anim file"
+    )
+
+    key_reduction: EnumProperty(
+        name="Reduction",
+        items=[
+            ('DUPLICATES', "Duplicates", "Only remove keys that are equal to both of their neighbours"),
+            ('TOLERANCE', "Error tolerance", "Remove every key that can be rebuilt from the keys around it within the tolerances"),
+        ],
+        default='DUPLICATES',
+        description="How keys are removed before writing the file"
+    )
+
+    rotation_tolerance: FloatProperty(
+        name="Rotation",
+        default=radians(0.5),
+        min=0,
+        subtype='ANGLE',
+        description="Largest rotation error allowed on a removed key, or between the frames sampled with Keyframes sampling"
+    )
+
+    position_tolerance: FloatProperty(
+        name="Position",
+        default=0.001,
+        min=0,
+        precision=4,
+        description="Largest position error allowed on a removed key, or between the frames sampled with Keyframes sampling"
+    )
+
+    use_size_limit: BoolProperty(
+        name="Fit size limit",
+        default=False,
+        description="Drop the joints and positions that stay at rest, then use the smallest tolerances that fit the file in the size limit. "
+                    "The tolerances are the ones of the root joints, deeper joints get larger ones"
+    )
+
+    max_size: IntProperty(
+        name="Size limit",
+        default=MAX_ANIM_SIZE,
+        min=1024,
+        description="Largest size of the file, in bytes. The viewer does not upload files larger than %d bytes" % MAX_ANIM_SIZE
+    )
+
+    write_mirrored: BoolProperty(
+        name="Mirrored copy",
+        default=False,
+        description="Also write the clip mirrored left to right, with the _mirrored suffix, from the same sampling"
+    )
+
+    variants: StringProperty(
+        name="Variants",
+        default="",
+        description="Other versions of the clip to write from the same sampling, separated by semicolons, each a name and the settings that differ. "
+                    "For instance: p2: priority=2; once: loop=0, ease_in=0.3; rot: with_translations=0. "
+                    "They are written next to the file, with their name as a suffix"
+    )
+
+    sampling: EnumProperty(
+        name="Sampling",
+        items=SAMPLING_ITEMS,
+        default='SCENE',
+        description="How the bone transforms are read for every frame"
+    )
+
+    use_cache: BoolProperty(
+        name="Reuse unchanged bones",
+        default=True,
+        description="With F-Curve or keyframe sampling, keep the sampled bones on disk and only sample again the bones whose animation changed"
+    )
+
+    live_export: BoolProperty(
+        name="Live export",
+        default=False,
+        description="After this export, export again to the same file whenever the animation of the exported bones or the rest pose changes, "
+                    "until File > Export > Stop Live .anim Export"
+    )
+
+    isolate_scene: BoolProperty(
+        name="Isolate armature",
+        default=True,
+        description="With scene evaluation, hide the objects the armature does not depend on and turn their modifiers off while sampling, "
+                    "so that the meshes it deforms are not evaluated on every frame. Everything is put back after the export"
     )
     
     def invoke(self, context, event):
@@ -601,10 +722,48 @@ class SL_ANIM_EXPORTER_OT_export_operator(Operator, ExportHelper):
         row.prop(self, "ease_in")
         row.prop(self, "ease_out")
         
+        row = layout.row()
+        row.label(text="VARIANTS")
+        row = layout.row()
+        row.prop(self, "write_mirrored")
+        row = layout.row()
+        row.prop(self, "variants", text="")
+        
+        row = layout.row()
+        row.label(text="KEY REDUCTION")
+        row = layout.row()
+        row.prop(self, "key_reduction")
+        row = layout.row()
+        row.prop(self, "use_size_limit")
+        if self.use_size_limit:
+            row.prop(self, "max_size")
+        if 'TOLERANCE' == self.key_reduction or 'KEYFRAMES' == self.sampling or self.use_size_limit:
+            row = layout.row()
+            row.prop(self, "rotation_tolerance")
+            row.prop(self, "position_tolerance")
+        
+        row = layout.row()
+        row.label(text="SAMPLING")
+        row = layout.row()
+        row.prop(self, "sampling")
+        if self.sampling in ('FCURVES', 'KEYFRAMES') or self.live_export:
+            row = layout.row()
+            row.prop(self, "use_cache")
+        row = layout.row()
+        row.prop(self, "isolate_scene")
+        row = layout.row()
+        row.prop(self, "live_export")
+        
         row = layout.row()
         row.label(text="DEBUG")
         row = layout.row()
         row.prop(self, "dump_json")
+        if self.dump_json:
+            row.prop(self, "dump_format")
+        row = layout.row()
+        row.prop(self, "write_stats")
+        if self.write_stats:
+            row.prop(self, "profile")
          
 
     def execute(self, context):
@@ -613,22 +772,283 @@ class SL_ANIM_EXPORTER_OT_export_operator(Operator, ExportHelper):
         if "" != error:
             self.report({'ERROR'}, error)
             return {'FINISHED'}
-        
-        return writeAnimToFile(
-            context, self.filepath,
-            self.priority,
-            self.loop,
-            self.loop_start,
-            self.loop_end,
-            self.ease_in,
-            self.ease_out,
-            self.dump_json,
-            self.with_translations
+
+        warning = getWarning()
+        if "" != warning:
+            self.report({'WARNING'}, warning)
+
+        try:
+            variants = parseVariants(self.variants)
+        except ValueError as e:
+            self.report({'ERROR'}, "Variants: %s" % e)
+            return {'FINISHED'}
+        if self.write_mirrored and not any("mirrored" == variant["name"] for variant in variants):
+            variants.append({"name": "mirrored", "mirror": True})
+
+        self.stats = {}
+        self.profiler = ExportProfiler(
+            trace_memory=self.write_stats,
+            profile=cProfile.Profile() if self.write_stats and self.profile else None
+        )
+        # The sampling asked for, a live export picks the method again on every change
+        self.options = ExportOptions(
+            priority=self.priority,
+            loop=self.loop,
+            loop_start=self.loop_start,
+            loop_end=self.loop_end,
+            ease_in=self.ease_in,
+            ease_out=self.ease_out,
+            with_translations=self.with_translations,
+            sampling=self.sampling,
+            isolate=self.isolate_scene,
+            key_reduction=self.key_reduction,
+            rotation_tolerance=self.rotation_tolerance,
+            position_tolerance=self.position_tolerance,
+            max_size=self.max_size if self.use_size_limit else None,
+            variants=variants,
+            dump_json=self.dump_json,
+            dump_format=self.dump_format
+        )
+        sampling, self.message = getSamplingMethod(context.active_object, self.sampling, getSampledBoneNames(self.options))
+        self.steps = iterAnimToFile(
+            context, self.filepath, replace(self.options, sampling=sampling),
+            stats=self.stats,
+            sample_cache=getSampleCache() if self.use_cache and sampling in ('FCURVES', 'KEYFRAMES') else None,
+            profiler=self.profiler
         )
 
+        # Without a window there is no event to step on
+        if bpy.app.background or context.window is None:
+            return self.finish(context, runSteps(self.steps))
+
+        wm = context.window_manager
+        self.timer = wm.event_timer_add(0.01, window=context.window)
+        wm.modal_handler_add(self)
+        return {'RUNNING_MODAL'}
+
+    def modal(self, context, event):
+        # Input is held back while sampling, moving the timeline would change the sampled frames
+        if 'ESC' == event.type:
+            self.steps.close()
+            self.stop(context)
+            self.report({'WARNING'}, "Export cancelled")
+            return {'CANCELLED'}
+        if 'TIMER' != event.type:
+            return {'RUNNING_MODAL'}
+
+        # One window of frames, or one track, per timer event
+        try:
+            progress = next(self.steps)
+        except StopIteration as stop:
+            self.stop(context)
+            return self.finish(context, stop.value)
+        except Exception:
+            self.stop(context)
+            raise
+        context.workspace.status_text_set("Exporting %s: %d%%, press Esc to cancel" % (os.path.basename(self.filepath), progress * 100))
+        return {'RUNNING_MODAL'}
+
+    def stop(self, context):
+        context.window_manager.event_timer_remove(self.timer)
+        context.workspace.status_text_set(None)
+
+    def finish(self, context, result):
+        if self.write_stats:
+            with open(self.filepath + ".stats.json", 'w') as f_stats:
+                json.dump(self.stats, f_stats, indent=4)
+            if self.profiler.profile:
+                self.profiler.profile.dump_stats(self.filepath + ".prof")
+
+        message = self.message
+        if "cache_hits" in self.stats:
+            message += " (%d tracks reused, %d sampled)" % (self.stats["cache_hits"], self.stats["cache_misses"])
+        self.report({'INFO'}, "%s. Kept %d of %d keys in %s" % (message, self.stats["keys_after"], self.stats["keys_before"], self.profiler.getSummary()))
+        if "variants" in self.stats:
+            self.report({'INFO'}, "Also wrote %s" % ", ".join(
+                "%s (%d bytes)" % (os.path.basename(variant["filepath"]), variant["size"]) for variant in self.stats["variants"].values()
+            ))
+
+        # Every joint is in the stats, the report only shows the worst ones
+        if "budget" in self.stats:
+            budget = self.stats["budget"]
+            if not all(variant["budget"]["fits"] for variant in self.stats.get("variants", {}).values()):
+                self.report({'WARNING'}, "Some variants are over the %d bytes limit, see the stats" % budget["max_size"])
+            if not budget["fits"]:
+                self.report({'WARNING'}, "The file is still %d bytes with only the first and last keys, over the %d bytes limit" % (budget["size"], budget["max_size"]))
+            else:
+                worst = sorted(budget["errors"].items(), key=lambda item: item[1]["rotation"], reverse=True)[:3]
+                self.report({'INFO'}, "Fitted in %d of %d bytes, %d joints and %d positions dropped. Worst errors: %s" % (
+                    budget["size"], budget["max_size"], len(budget["dropped_joints"]), len(budget["dropped_positions"]),
+                    ", ".join("%s %.2f degrees" % (name, degrees(errors["rotation"])) for name, errors in worst)
+                ))
+
+        if self.live_export and {'FINISHED'} == result:
+            startLiveExport(context.active_object, self.filepath, self.options, self.use_cache)
+            sampling, message = running_live_export.getSamplingMethod(context.active_object)
+            if 'SCENE' == sampling or not self.use_cache:
+                self.report({'WARNING'}, "Live export to %s started, every change samples all the bones again and blocks Blender until it is written. %s" % (os.path.basename(self.filepath), message))
+            else:
+                self.report({'INFO'}, "Live export to %s started" % os.path.basename(self.filepath))
+
+        return result
+
+
+class SL_ANIM_EXPORTER_OT_stop_live_export(Operator):
+    """Stops exporting the .anim file again on every change"""
+    bl_idname = "sl_anim_exporter.stop_live_export"
+    bl_label = "Stop Live .anim Export"
+
+    @classmethod
+    def poll(cls, context):
+        return running_live_export is not None
+
+    def execute(self, context):
+        self.report({'INFO'}, "Live export to %s stopped after %d exports" % (os.path.basename(running_live_export.filepath), running_live_export.exports))
+        stopLiveExport()
+        return {'FINISHED'}
+
 
 def menu_func_export(self, context):
     self.layout.operator(SL_ANIM_EXPORTER_OT_export_operator.bl_idname, text="Second Life Animation (.anim)")
+    if running_live_export is not None:
+        self.layout.operator(SL_ANIM_EXPORTER_OT_stop_live_export.bl_idname)
+
+# ---------------------------------------------- LIVE EXPORT ----------------------------------------------
+
+# Seconds without changes before a live export starts, so that dragging keys does not export on every update
+LIVE_EXPORT_DELAY = 0.5
+
+running_live_export = None
+
+
+class LiveExport:
+    """
+    Exports an armature again whenever the F-Curves of its exported bones or
+    its rest pose change.
+
+    The depsgraph handler only looks for updates of the action and of the
+    armature, so playing the animation costs next to nothing. Once the
+    changes settle, the hashes of the bones tell whether their animation
+    really changed. The export then runs one step per timer call, and the
+    sample cache only samples again the bones that changed. Scene sampling
+    cannot use the cache, so it is replaced with F-Curve sampling whenever
+    the F-Curves alone move the bones. Otherwise the whole export runs in one
+    timer call, so that the playhead and the isolated objects are restored
+    before the user gets the scene back.
+    """
+
+    def __init__(self, obj, filepath, options, use_cache):
+        self.obj_name = obj.name
+        self.filepath = filepath
+        self.options = options
+        self.use_cache = use_cache
+        self.hashes = self.getHashes(obj)
+        self.changed = None
+        self.steps = None
+        self.exports = 0
+        # Timers are found by the function object, a new bound method would not match
+        self.timer = self.tick
+
+    def getBoneNames(self):
+        return getSampledBoneNames(self.options)
+
+    def getHashes(self, obj):
+        """Returns the hash of everything the samples of every exported bone depend on, as far as the F-Curves tell."""
+        scene = bpy.context.scene
+        sampler = FCurveSampler(obj, self.getBoneNames())
+        hashes = {None: (scene.frame_start, scene.frame_end, scene.render.fps, scene.render.fps_base)}
+        for bone_name in sampler.bone_names:
+            hasher = sampler.getBoneHasher(bone_name)
+            # Bones with F-Curve modifiers cannot be hashed, they always count as changed
+            hashes[bone_name] = hasher.getKey() if hasher else object()
+        return hashes
+
+    def onUpdate(self, depsgraph):
+        obj = bpy.data.objects.get(self.obj_name)
+        if obj is None or obj.animation_data is None:
+            return
+        watched = (obj.animation_data.action, obj.data)
+        for update in depsgraph.updates:
+            if update.id.original in watched:
+                self.changed = time.monotonic()
+                if not bpy.app.timers.is_registered(self.timer):
+                    bpy.app.timers.register(self.timer, first_interval=LIVE_EXPORT_DELAY)
+                return
+
+    def tick(self):
+        """Timer callback: runs a step of the export, or starts one once the changes have settled. Returns the delay of the next call."""
+        if self.steps is not None:
+            try:
+                next(self.steps)
+                return 0.0
+            except StopIteration:
+                self.steps = None
+                self.exports += 1
+            except Exception:
+                self.steps = None
+                raise
+        if self.changed is None:
+            return None
+        wait = self.changed + LIVE_EXPORT_DELAY - time.monotonic()
+        if wait > 0:
+            return wait
+        self.changed = None
+
+        # The export reads the active object, the changes wait for the next update with the armature active
+        obj = bpy.data.objects.get(self.obj_name)
+        if obj is None or obj != bpy.context.active_object or "" != getError():
+            return None
+        hashes = self.getHashes(obj)
+        if hashes == self.hashes:
+            return None
+        self.hashes = hashes
+
+        sampling, message = self.getSamplingMethod(obj)
+        options = replace(self.options, sampling=sampling)
+        if 'SCENE' == sampling:
+            # Scene sampling moves the playhead and hides the other objects, which must not outlast the tick while the user works
+            writeAnimToFile(bpy.context, self.filepath, options)
+            self.exports += 1
+            return None
+        self.steps = iterAnimToFile(
+            bpy.context, self.filepath, options,
+            sample_cache=getSampleCache() if self.use_cache else None
+        )
+        return 0.0
+
+    def getSamplingMethod(self, obj):
+        """Same as getSamplingMethod, except that Scene sampling reads the F-Curves when they alone move the bones, so that the cache can be used."""
+        sampling = self.options.sampling
+        return getSamplingMethod(obj, 'FCURVES' if 'SCENE' == sampling else sampling, self.getBoneNames())
+
+    def stop(self):
+        if bpy.app.timers.is_registered(self.timer):
+            bpy.app.timers.unregister(self.timer)
+        if self.steps is not None:
+            self.steps.close()
+            self.steps = None
+
+
+def onDepsgraphUpdate(scene, depsgraph):
+    if running_live_export is not None:
+        running_live_export.onUpdate(depsgraph)
+
+
+def startLiveExport(obj, filepath, options, use_cache):
+    global running_live_export
+    stopLiveExport()
+    running_live_export = LiveExport(obj, filepath, options, use_cache)
+    bpy.app.handlers.depsgraph_update_post.append(onDepsgraphUpdate)
+
+
+def stopLiveExport():
+    global running_live_export
+    if running_live_export is None:
+        return
+    running_live_export.stop()
+    running_live_export = None
+    if onDepsgraphUpdate in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.remove(onDepsgraphUpdate)
 
 
 # ---------------------------------------------- PROCESS --------------------------------------------------
@@ -643,16 +1063,34 @@ def getError():
         return "You must select an armature"
     if not obj.animation_data.action:
         return "Your armature has no action."
+
+    channels = getChannels(True)
+    if not channels['rotation_channels'] and not channels['location_channels']:
+        return "Your action does not animate any Second Life bone."
     
     return ""
 
 
+def getWarning():
+    obj = bpy.context.active_object
+    parents = {bone.name: bone.parent.name if bone.parent else None for bone in obj.data.bones}
+    issues = getHierarchyIssues(parents)
+
+    if issues:
+        return "Your armature does not follow the Second Life hierarchy: %s" % ", ".join(issues)
+
+    return ""
+
+
 def register():
     bpy.utils.register_class(SL_ANIM_EXPORTER_OT_export_operator)
+    bpy.utils.register_class(SL_ANIM_EXPORTER_OT_stop_live_export)
     bpy.types.TOPBAR_MT_file_export.append(menu_func_export)
 
 def unregister():
+    stopLiveExport()
     bpy.utils.unregister_class(SL_ANIM_EXPORTER_OT_export_operator)
+    bpy.utils.unregister_class(SL_ANIM_EXPORTER_OT_stop_live_export)
     bpy.types.TOPBAR_MT_file_export.remove(menu_func_export)
 
 if __name__ == "__main__":
@@ -0,0 +1,200 @@
+"""
+Inspection of exported .anim files, without Blender.
+
+    python anim_tool.py info anims/                      # one line per clip
+    python anim_tool.py info anims/walk.anim --joints    # and one line per joint
+    python anim_tool.py diff old/ new/                   # clips with the same relative path
+    python anim_tool.py diff walk.anim walk.anim.json    # quantization error against the JSON (or .npz) dump
+
+Directories are scanned recursively for .anim files. diff compares two clips
+joint by joint, at the times where either of them has a key, the way the
+viewer interpolates them. Rotation errors are in degrees. Add --json to
+get the results as JSON.
+"""
+
+import argparse
+import json
+import os
+import sys
+from math import degrees, radians
+
+from slanim.anim import convertAnimToDictionary
+from slanim.compare import compareClips
+from slanim.sidecar import readSidecar
+
+
+def findClips(paths):
+    """Returns the .anim files of the given files and directories."""
+    clips = []
+    for path in paths:
+        if os.path.isdir(path):
+            for dirpath, dirnames, filenames in os.walk(path):
+                dirnames.sort()
+                clips += [os.path.join(dirpath, filename) for filename in sorted(filenames) if filename.endswith(".anim")]
+        else:
+            clips.append(path)
+    return clips
+
+
+def loadClip(path):
+    """Reads a .anim file, or the .json or .npz dump of an export."""
+    if path.endswith((".json", ".npz")):
+        return readSidecar(path)
+    with open(path, 'rb') as f_anim:
+        return convertAnimToDictionary(f_anim.read())
+
+
+def getClipSummary(path, data):
+    joints = data["joints"].values()
+    return {
+        "path": path,
+        "size": os.path.getsize(path),
+        "duration": data["duration"],
+        "priority": data["base_priority"],
+        "loop": bool(data["loop"]),
+        "joints": len(data["joints"]),
+        "rotation_keys": sum(len(joint["rotation_keys"]) for joint in joints),
+        "position_keys": sum(len(joint["position_keys"]) for joint in joints),
+        "constraints": len(data["constraints"]),
+    }
+
+
+def printTable(rows):
+    widths = [max(len(str(row[i])) for row in rows) for i in range(len(rows[0]))]
+    for row in rows:
+        print("  ".join(str(cell).ljust(width) for cell, width in zip(row, widths)).rstrip())
+
+
+def runInfo(args):
+    clips = findClips(args.paths)
+    summaries = []
+    rows = [("CLIP", "SIZE", "DURATION", "PRIO", "LOOP", "JOINTS", "ROT KEYS", "POS KEYS")]
+    for path in clips:
+        try:
+            data = loadClip(path)
+        except Exception as e:
+            summaries.append({"path": path, "error": "%s: %s" % (type(e).__name__, e)})
+            rows.append((path, "FAILED: %s" % summaries[-1]["error"], "", "", "", "", "", ""))
+            continue
+        summary = getClipSummary(path, data)
+        if args.joints:
+            summary["joint_keys"] = {
+                name: {"priority": joint["priority"], "rotation_keys": len(joint["rotation_keys"]), "position_keys": len(joint["position_keys"])}
+                for name, joint in data["joints"].items()
+            }
+        summaries.append(summary)
+        rows.append((
+            path, "%d B" % summary["size"], "%.2fs" % summary["duration"], summary["priority"],
+            "yes" if summary["loop"] else "no", summary["joints"], summary["rotation_keys"], summary["position_keys"]
+        ))
+        if args.joints:
+            for name, keys in summary["joint_keys"].items():
+                rows.append(("  " + name, "", "", keys["priority"], "", "", keys["rotation_keys"], keys["position_keys"]))
+
+    if args.json:
+        print(json.dumps(summaries, indent=4))
+    else:
+        printTable(rows)
+    return 1 if any("error" in summary for summary in summaries) else 0
+
+
+def getClipPairs(path_a, path_b):
+    """Returns the pairs of clips to compare: the two files, or the files with the same relative path in two directories."""
+    if not os.path.isdir(path_a):
+        return [(path_a, path_b)]
+    pairs = []
+    for clip in findClips([path_a]):
+        relative = os.path.relpath(clip, path_a)
+        pairs.append((clip, os.path.join(path_b, relative)))
+    for clip in findClips([path_b]):
+        if not os.path.exists(os.path.join(path_a, os.path.relpath(clip, path_b))):
+            pairs.append((None, clip))
+    return pairs
+
+
+def formatError(value, is_rotation):
+    if value is None:
+        return "-"
+    return "%.3f" % degrees(value) if is_rotation else "%.5f" % value
+
+
+def runDiff(args):
+    results = []
+    differs = False
+    for path_a, path_b in getClipPairs(args.a, args.b):
+        if path_a is None or not os.path.exists(path_b):
+            results.append({"a": path_a, "b": path_b, "error": "only in one of the exports"})
+            differs = True
+            continue
+        try:
+            clip_a, clip_b = loadClip(path_a), loadClip(path_b)
+        except Exception as e:
+            results.append({"a": path_a, "b": path_b, "error": "%s: %s" % (type(e).__name__, e)})
+            differs = True
+            continue
+        header, joints = compareClips(clip_a, clip_b)
+        worst = max((joint["rotation_max"] or 0.0 for joint in joints.values()), default=0.0)
+        worst_position = max((joint["position_max"] or 0.0 for joint in joints.values()), default=0.0)
+        missing = [name for name, joint in joints.items() if not joint["in_a"] or not joint["in_b"]]
+        results.append({"a": path_a, "b": path_b, "header": header, "joints": joints, "rotation_max": worst, "position_max": worst_position})
+        differs = differs or bool(header) or bool(missing) or worst > args.tolerance or worst_position > args.position_tolerance
+
+    if args.json:
+        print(json.dumps(results, indent=4))
+        return 1 if differs else 0
+
+    for result in results:
+        print("%s <> %s" % (result["a"], result["b"]))
+        if "error" in result:
+            print("  " + result["error"])
+            continue
+        for field, (value_a, value_b) in result["header"].items():
+            print("  %s: %s -> %s" % (field, value_a, value_b))
+        rows = [("  JOINT", "ROT KEYS", "ROT MAX", "ROT MEAN", "POS KEYS", "POS MAX", "POS MEAN")]
+        for name, joint in result["joints"].items():
+            if not joint["in_a"] or not joint["in_b"]:
+                rows.append(("  " + name, "only in %s" % ("a" if joint["in_a"] else "b"), "", "", "", "", ""))
+                continue
+            rows.append((
+                "  " + name,
+                "%d -> %d" % joint["rotation_keys"],
+                formatError(joint["rotation_max"], True),
+                formatError(joint["rotation_mean"], True),
+                "%d -> %d" % joint["position_keys"],
+                formatError(joint["position_max"], False),
+                formatError(joint["position_mean"], False),
+            ))
+        if args.all or len(results) == 1:
+            printTable(rows)
+        print("  worst rotation error: %.3f degrees, worst position error: %.5f" % (degrees(result["rotation_max"]), result["position_max"]))
+    return 1 if differs else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="anim_tool.py", description="Inspect and compare Second Life .anim files.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    info = subparsers.add_parser("info", help="Summarize clips")
+    info.add_argument("paths", nargs="+", help=".anim files or directories")
+    info.add_argument("--joints", action="store_true", help="Also list the joints of every clip")
+    info.add_argument("--json", action="store_true")
+
+    diff = subparsers.add_parser("diff", help="Compare two clips, or two directories of clips, joint by joint")
+    diff.add_argument("a")
+    diff.add_argument("b")
+    diff.add_argument("--tolerance", type=float, default=0.001,
+                      help="Largest rotation error in degrees that is not reported as a difference (default: %(default)s)")
+    diff.add_argument("--position-tolerance", type=float, default=0.0001,
+                      help="Largest position error that is not reported as a difference (default: %(default)s)")
+    diff.add_argument("--all", action="store_true", help="Show the joints of every clip when comparing directories")
+    diff.add_argument("--json", action="store_true")
+
+    args = parser.parse_args()
+    if "diff" == args.command:
+        args.tolerance = radians(args.tolerance)
+        return runDiff(args)
+    return runInfo(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
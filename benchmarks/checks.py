@@ -0,0 +1,496 @@
+"""
+Checks of the exporter, without Blender.
+
+Runs the add-on on the synthetic SL rigs of the benchmarks, with the stub bpy
+and mathutils modules of benchmarks/stubs, and checks what the golden files
+of run.py do not cover: the sample cache, the live export, the
+choice of the sampling method, the debug sidecars, the mirrored clips, the
+variant specs, the size limit, the .bvh conversion, the profiler, the
+cleanup of the spilled tracks and the clips the batch export skips.
+
+    python benchmarks/checks.py
+    python benchmarks/checks.py cache live ik
+
+Only numpy is needed. Every check raises AssertionError when it fails, and
+the exit code is 1 when a check fails.
+"""
+
+import argparse
+import importlib
+import json
+import os
+import sys
+import tempfile
+import threading
+import tracemalloc
+import types
+from dataclasses import replace
+from math import radians
+
+from run import GOLDEN_DIR, getOptions, loadExporter
+
+import bpy
+import numpy as np
+from synthetic import HELPER_BONES, buildScene
+
+
+def checkCache(exporter):
+    """A second F-Curve export reads every track from the cache, whatever the current frame, and writes the same file."""
+    cache = importlib.import_module("sl_anim_exporter.slanim.cache")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for run, frame in enumerate((1, 17)):
+            sample_cache = cache.SampleCache(os.path.join(temp_dir, "cache"))
+            obj, scene = buildScene(60, 20, 1)
+            # Moving the playhead writes the animated values to the pose bones
+            scene.frame_set(frame)
+            stats = {}
+            filepath = os.path.join(temp_dir, "short_fcurves.anim")
+            exporter.writeAnimToFile(bpy.context, filepath, getOptions(exporter, 60, 'FCURVES'), stats=stats, sample_cache=sample_cache)
+            if run:
+                assert 0 == stats["cache_misses"] and stats["cache_hits"] > 0, "%d hits, %d misses" % (stats["cache_hits"], stats["cache_misses"])
+            with open(filepath, 'rb') as f_anim, open(os.path.join(GOLDEN_DIR, "short_fcurves.anim"), 'rb') as f_golden:
+                assert f_anim.read() == f_golden.read(), "the file differs from the golden file"
+
+
+class Timers:
+    """Stand-in for bpy.app.timers that runs the registered function on demand."""
+
+    def __init__(self):
+        self.func = None
+
+    def register(self, func, first_interval=0.0):
+        self.func = func
+
+    def unregister(self, func):
+        self.func = None
+
+    def is_registered(self, func):
+        return func == self.func
+
+    def run(self):
+        while self.func is not None:
+            if self.func() is None:
+                self.func = None
+
+
+def sendUpdate(id_data):
+    depsgraph = types.SimpleNamespace(updates=[types.SimpleNamespace(id=types.SimpleNamespace(original=id_data))])
+    for handler in list(bpy.app.handlers.depsgraph_update_post):
+        handler(bpy.context.scene, depsgraph)
+
+
+def checkLiveExport(exporter):
+    """With Scene sampling, moving the playhead exports nothing, a changed key only samples its bone again, and the scene is sampled within one timer call."""
+    cache = importlib.import_module("sl_anim_exporter.slanim.cache")
+    timers = Timers()
+    bpy.app.timers, default_timers = timers, bpy.app.timers
+    live_delay, exporter.LIVE_EXPORT_DELAY = exporter.LIVE_EXPORT_DELAY, 0.0
+    getSampleCache = exporter.getSampleCache
+    try:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            caches = []
+            exporter.getSampleCache = lambda: caches.append(cache.SampleCache(temp_dir)) or caches[-1]
+            obj, scene = buildScene(60, 20, 1)
+            bpy.data.objects[:] = [obj]
+            exporter.startLiveExport(obj, os.path.join(temp_dir, "live.anim"), getOptions(exporter, 60), True)
+            live = exporter.running_live_export
+
+            # The first live export fills the cache
+            action = obj.animation_data.action
+            action.fcurves[1].keyframe_points[1].co[1] += 0.1
+            sendUpdate(action)
+            timers.run()
+            assert 1 == live.exports, "%d exports after the first change" % live.exports
+
+            scene.frame_set(17)
+            sendUpdate(action)
+            timers.run()
+            assert 1 == live.exports, "moving the playhead exported again"
+
+            action.fcurves[1].keyframe_points[1].co[1] += 0.1
+            sendUpdate(action)
+            timers.run()
+            assert 2 == live.exports, "%d exports after the second change" % live.exports
+            # Both tracks of the changed bone are sampled again
+            assert caches, "the live export did not use the cache"
+            assert caches[-1].misses <= 2 and caches[-1].hits > 0, "%d hits, %d misses" % (caches[-1].hits, caches[-1].misses)
+
+            # Scene sampling again, which runs in a single timer call and gives the playhead back
+            obj.pose.bones["mPelvis"].constraints.append(types.SimpleNamespace(type='COPY_LOCATION', mute=False))
+            action.fcurves[1].keyframe_points[1].co[1] += 0.1
+            sendUpdate(action)
+            assert timers.func() is None, "the scene sampling waits for another timer call"
+            assert 3 == live.exports, "%d exports after the third change" % live.exports
+            assert 17 == scene.frame_current, "the playhead is left on frame %d" % scene.frame_current
+            exporter.stopLiveExport()
+    finally:
+        bpy.app.timers = default_timers
+        exporter.LIVE_EXPORT_DELAY = live_delay
+        exporter.getSampleCache = getSampleCache
+
+
+def checkIK(exporter):
+    """An IK constraint on a bone that is not exported still keeps the F-Curves from being read for the bones of its chain."""
+    sampling = importlib.import_module("sl_anim_exporter.sampling")
+    obj, scene = buildScene(60, 20, 1)
+    bone_names = ["mShoulderLeft", "mElbowLeft"]
+    assert not sampling.getFCurveSamplingIssues(obj, bone_names), "issues without constraints"
+
+    ik = types.SimpleNamespace(type='IK', mute=False, chain_count=2, use_tail=True)
+    obj.pose.bones["mWristLeft"].constraints.append(ik)
+    issues = sampling.getFCurveSamplingIssues(obj, bone_names)
+    assert ["mElbowLeft is moved by the IK of mWristLeft"] == issues, issues
+    assert 'SCENE' == sampling.getSamplingMethod(obj, 'FCURVES', bone_names)[0], "the F-Curves are still read"
+
+    ik.chain_count = 0
+    issues = sampling.getFCurveSamplingIssues(obj, bone_names)
+    assert ["mElbowLeft is moved by the IK of mWristLeft", "mShoulderLeft is moved by the IK of mWristLeft"] == issues, issues
+    ik.mute = True
+    assert not sampling.getFCurveSamplingIssues(obj, bone_names), "a muted IK is an issue"
+
+
+def checkSidecar(exporter):
+    """The compact sidecar, written one track at a time, is the JSON of the whole clip, and every format reads back the same tracks."""
+    sidecar = importlib.import_module("sl_anim_exporter.slanim.sidecar")
+    tracks = importlib.import_module("sl_anim_exporter.slanim.tracks")
+    buildScene(60, 20, 1)
+    dictionary = exporter.convertActionToDictionary(getOptions(exporter, 60, 'FCURVES', key_reduction=None))
+    with tempfile.TemporaryDirectory() as temp_dir:
+        filepaths = {}
+        for sidecar_format in sidecar.SIDECAR_FORMATS:
+            filepaths[sidecar_format] = os.path.join(temp_dir, sidecar_format.lower() + sidecar.SIDECAR_FORMATS[sidecar_format])
+            sidecar.writeSidecar(filepaths[sidecar_format], dictionary, sidecar_format)
+        with open(filepaths['COMPACT']) as f_json:
+            assert json.dumps(dictionary, separators=(",", ":"), default=tracks.getJSONValue) == f_json.read(), "the compact sidecar differs"
+
+        clips = {sidecar_format: sidecar.readSidecar(filepath) for sidecar_format, filepath in filepaths.items()}
+        for sidecar_format, clip in clips.items():
+            assert dictionary.keys() == clip.keys() and dictionary["joints"].keys() == clip["joints"].keys(), "%s: other fields" % sidecar_format
+            for name, joint in dictionary["joints"].items():
+                for keys in ("rotation_keys", "position_keys"):
+                    track = tracks.getTrack(joint[keys], joint[keys].components)
+                    read = clip["joints"][name][keys]
+                    assert np.array_equal(track.times, read.times) and np.allclose(track.values, read.values), "%s: %s %s differ" % (sidecar_format, name, keys)
+
+
+def checkMirror(exporter):
+    """Mirroring swaps the sides of the skeleton, mirrors the pelvis about the plane of the avatar, and mirroring the golden mirrored clip gives back the golden clip."""
+    skeleton = importlib.import_module("sl_anim_exporter.slanim.skeleton")
+    mirror = importlib.import_module("sl_anim_exporter.slanim.mirror")
+    anim = importlib.import_module("sl_anim_exporter.slanim.anim")
+    tracks = importlib.import_module("sl_anim_exporter.slanim.tracks")
+    for name, other in skeleton.SL_MIRRORS.items():
+        assert name == skeleton.SL_MIRRORS.get(other), "%s gives %s, which does not give it back" % (name, other)
+        sided = name.endswith(("Left", "Right")) or name.startswith(("L_", "R_", "LEFT_", "RIGHT_"))
+        assert (name != other) == sided, "%s gives %s" % (name, other)
+    assert "mElbowRight" == skeleton.SL_MIRRORS["mElbowLeft"] and "R_CLAVICLE" == skeleton.SL_MIRRORS["L_CLAVICLE"]
+
+    obj, scene = buildScene(60, 20, 1)
+    # The pelvis of the rig is off the plane of symmetry, the positions of mPelvis are relative to it
+    offset = np.array(obj.data.bones[0].head / 2)
+    assert abs(offset[1]) > 0.01, "the pelvis is centred"
+    joints = exporter.convertActionToDictionary(getOptions(exporter, 60, 'FCURVES', key_reduction=None))["joints"]
+    mirrored = mirror.getMirroredJoints(joints, offset)
+    assert set(mirrored) == {skeleton.SL_MIRRORS[name] for name in joints}, "the mirrored joints are not the other side"
+    pelvis, mirrored_pelvis = joints["mPelvis"]["position_keys"], mirrored["mPelvis"]["position_keys"]
+    pelvis = tracks.getTrack(pelvis, pelvis.components)
+    assert np.allclose((mirrored_pelvis.values + offset) * (1, -1, 1), pelvis.values + offset), "the pelvis is not mirrored in place"
+    for name, joint in mirror.getMirroredJoints(mirrored, offset).items():
+        for keys in ("rotation_keys", "position_keys"):
+            track, expected = joint[keys], tracks.getTrack(joints[name][keys], joint[keys].components)
+            assert np.array_equal(track.times, expected.times) and np.allclose(track.values, expected.values, rtol=0, atol=1e-6), "%s %s changed" % (name, keys)
+
+    def readClip(filename):
+        with open(os.path.join(GOLDEN_DIR, filename), 'rb') as f_anim:
+            return anim.convertAnimToDictionary(f_anim.read())
+
+    clip = readClip("short_fcurves.anim")
+    mirrored = readClip("short_fcurves_mirrored.anim")
+    assert {field: value for field, value in clip.items() if "joints" != field} == {field: value for field, value in mirrored.items() if "joints" != field}
+    # Mirrored values are quantized on their own, a component may be one step off
+    for name, joint in mirror.getMirroredJoints(mirrored["joints"], offset).items():
+        for keys, step in (("rotation_keys", 2 / 0xFFFF), ("position_keys", 5 / 0xFFFF)):
+            track, expected = joint[keys], clip["joints"][name][keys]
+            assert np.array_equal(track.times, expected.times), "%s %s: other times" % (name, keys)
+            assert np.allclose(track.values, expected.values, rtol=0, atol=1.5 * step), "%s %s: other values" % (name, keys)
+
+
+def checkVariants(exporter):
+    """Variant specs parse to their settings, every kind of mistake is a ValueError, and the channels of a variant are checked before the F-Curves are read."""
+    variants = importlib.import_module("sl_anim_exporter.slanim.variants")
+    assert [] == variants.parseVariants("") == variants.parseVariants(None) == variants.parseVariants(" ; ")
+    assert [
+        {"name": "p2", "priority": 2},
+        {"name": "once", "loop": False, "ease_in": 0.3},
+        {"name": "left-rot", "mirror": True, "with_translations": False},
+    ] == variants.parseVariants("p2: priority=2; once: loop=0, ease_in=0.3; left-rot: mirror=yes, with_translations=False")
+
+    for spec in (
+        "bad name: priority=2",
+        ": priority=2",
+        "a: priority=2; a: loop=1",
+        "a: speed=2",
+        "a: priority",
+        "a: priority=high",
+        "a: loop=maybe",
+        "a: priority=7",
+        "a: priority=-1",
+    ):
+        try:
+            variants.parseVariants(spec)
+        except ValueError:
+            continue
+        raise AssertionError("'%s' is accepted" % spec)
+
+    # A variant with translations has its location channels checked and sampled, yet not counted in the keys of the file
+    obj, scene = buildScene(60, 20, 1)
+    options = replace(getOptions(exporter, 60, 'FCURVES'), with_translations=False)
+    variant_options = replace(options, variants=[{"name": "moving", "with_translations": True}])
+    # A bone with only location channels, which the file alone does not sample
+    moved = [name for name in exporter.getChannels(True)["location_channels"] if "mPelvis" != name][0]
+    action = obj.animation_data.action
+    action.fcurves = [fcurve for fcurve in action.fcurves if 'pose.bones["%s"].rotation_quaternion' % moved != fcurve.data_path]
+    obj.pose.bones[moved].constraints.append(types.SimpleNamespace(type='COPY_LOCATION', mute=False))
+    bone_names = exporter.getSampledBoneNames(variant_options)
+    assert moved in bone_names and moved not in exporter.getSampledBoneNames(options), bone_names
+    assert 'FCURVES' == exporter.getSamplingMethod(obj, 'FCURVES', exporter.getSampledBoneNames(options))[0]
+    assert 'SCENE' == exporter.getSamplingMethod(obj, 'FCURVES', bone_names)[0], "the F-Curves of the variant are still read"
+    keys_before = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for export_options in (replace(options, sampling='SCENE'), replace(variant_options, sampling='SCENE')):
+            stats = {}
+            exporter.writeAnimToFile(bpy.context, os.path.join(temp_dir, "variants.anim"), export_options, stats=stats)
+            keys_before.append(stats["keys_before"])
+    assert keys_before[0] == keys_before[1], "%d keys before, %d with the variant" % tuple(keys_before)
+
+
+def checkBudget(exporter):
+    """A tolerance keeps exactly the keys whose importance is above it, and the size limit is met as closely as a key allows."""
+    reduction = importlib.import_module("sl_anim_exporter.slanim.reduction")
+    tracks = importlib.import_module("sl_anim_exporter.slanim.tracks")
+    buildScene(60, 20, 1)
+    joints = exporter.convertActionToDictionary(getOptions(exporter, 60, 'FCURVES', key_reduction=None))["joints"]
+    rng = np.random.default_rng(1)
+    for name, joint in joints.items():
+        for keys, is_rotation in (("rotation_keys", True), ("position_keys", False)):
+            track = tracks.getTrack(joint[keys], joint[keys].components)
+            # Noise gives every key its own importance
+            values = track.values + rng.normal(0.0, 0.001, track.values.shape)
+            if is_rotation:
+                values /= np.linalg.norm(values, axis=1, keepdims=True)
+            importances = reduction.getKeyImportances(track.times, values, is_rotation)
+            finite = importances[np.isfinite(importances)]
+            for tolerance in np.concatenate((finite, finite * 0.999, [0.0, 1.0])):
+                kept = reduction.getReducedIndices(track.times, values, tolerance, is_rotation)
+                assert np.array_equal(np.flatnonzero(importances > tolerance), kept), "%s %s: other keys at %g" % (name, keys, tolerance)
+
+    anim_frame = importlib.import_module("sl_anim_exporter.slanim.anim").sAnimFrame
+    with tempfile.TemporaryDirectory() as temp_dir:
+        filepath = os.path.join(temp_dir, "budget.anim")
+        for max_size in (6000, 9000):
+            stats = {}
+            exporter.writeAnimToFile(bpy.context, filepath, getOptions(exporter, 60, 'FCURVES', max_size=max_size), stats=stats)
+            size = os.path.getsize(filepath)
+            assert stats["budget"]["fits"] and max_size - anim_frame.size < size <= max_size, "%d bytes for %d" % (size, max_size)
+
+        # A limit the clip already fits in still reduces it within the tolerances, and only tightens them when it does not
+        tolerance = getOptions(exporter, 60, 'FCURVES', key_reduction='TOLERANCE', rotation_tolerance=radians(2), position_tolerance=0.01)
+        exporter.writeAnimToFile(bpy.context, filepath, tolerance)
+        tolerance_size = os.path.getsize(filepath)
+        for max_size in (100000, tolerance_size - 100):
+            stats = {}
+            exporter.writeAnimToFile(bpy.context, filepath, replace(tolerance, max_size=max_size), stats=stats)
+            size = os.path.getsize(filepath)
+            assert stats["budget"]["fits"] and size <= min(tolerance_size, max_size), "%d bytes for %d, %d with the tolerances" % (size, max_size, tolerance_size)
+
+    # A tolerance of 0 keeps every rotation key that cannot be rebuilt exactly
+    budget = importlib.import_module("sl_anim_exporter.slanim.budget")
+    data = exporter.convertActionToDictionary(getOptions(exporter, 60, 'FCURVES', key_reduction=None))
+    rotations = {name: tracks.getTrack(joint["rotation_keys"], joint["rotation_keys"].components) for name, joint in data["joints"].items()}
+    report = budget.fitToSize(data, 11000, {}, {name: np.full(3, 100.0) for name in rotations}, 0.0, 0.001)
+    assert report["fits"], "%d bytes" % report["size"]
+    for name, track in rotations.items():
+        kept = reduction.getReducedIndices(track.times, track.values, 0.0, True)
+        assert np.array_equal(track.times[kept], data["joints"][name]["rotation_keys"].times), "%s: rotation keys dropped" % name
+
+
+BVH_TEXT = """HIERARCHY
+ROOT Hips
+{
+    OFFSET 0 0 0
+    CHANNELS 6 Xposition Yposition Zposition Zrotation Xrotation Yrotation
+    JOINT Spine
+    {
+        OFFSET 0 10 0
+        CHANNELS 3 Zrotation Xrotation Yrotation
+        JOINT Helper
+        {
+            OFFSET 0 10 0
+            CHANNELS 3 Zrotation Xrotation Yrotation
+            JOINT Neck
+            {
+                OFFSET 0 10 0
+                CHANNELS 3 Zrotation Xrotation Yrotation
+                End Site
+                {
+                    OFFSET 0 5 0
+                }
+            }
+        }
+    }
+}
+MOTION
+Frames: 3
+Frame Time: 0.04
+0 0 0 0 0 0 0 0 0 0 0 0 0 0 0
+2 0 0 0 0 0 0 0 90 0 0 0 0 0 0
+0 0 4 0 0 0 0 0 0 0 0 30 0 0 0
+"""
+
+
+def checkBVH(exporter):
+    """A small .bvh file parses and converts to the expected keys, and malformed files are ValueErrors."""
+    bvh = importlib.import_module("sl_anim_exporter.slanim.bvh")
+    clip = bvh.parseBVH(BVH_TEXT)
+    assert ["Hips", "Spine", "Helper", "Neck"] == [joint.name for joint in clip.joints]
+    assert [-1, 0, 1, 2] == [joint.parent for joint in clip.joints]
+    assert [("rotation", "Y", 14)] == clip.joints[3].channels[2:] and 0.04 == clip.frame_time and (3, 15) == clip.motion.shape
+
+    plan = bvh.BVHPlan(clip, False, 0.01)
+    assert ["mPelvis", "mTorso", "mNeck"] == plan.names, plan.names
+    assert [] == plan.issues, plan.issues
+    joints = bvh.convertBVHToDictionary(plan, 3, False, 0, 2, 0.0, 0.0)["joints"]
+    # BVH x, y, z is SL y, z, x, and positions are halved like the exporter does
+    assert np.allclose(joints["mPelvis"]["position_keys"].values, [[0, 0, 0], [0, 0.01, 0], [0.02, 0, 0]])
+    assert np.allclose(joints["mTorso"]["rotation_keys"].values[1], [np.cos(np.pi / 4), 0, 0, np.sin(np.pi / 4)])
+    # The rotation of Helper, which is not an SL joint, is carried by mNeck
+    assert np.allclose(joints["mNeck"]["rotation_keys"].values, [[1, 0, 0, 0], [1, 0, 0, 0], [np.cos(np.pi / 12), 0, 0, np.sin(np.pi / 12)]])
+    assert 0 == len(joints["mNeck"]["position_keys"]), "mNeck has position keys without translations"
+
+    plan = bvh.BVHPlan(clip, False, 0.01, {"Helper": "mChest"})
+    assert ["mPelvis", "mTorso", "mChest", "mNeck"] == plan.names and [] == plan.issues, plan.names
+    joints = bvh.convertBVHToDictionary(plan, 3, False, 0, 2, 0.0, 0.0)["joints"]
+    assert np.allclose(joints["mChest"]["rotation_keys"].values[2], [np.cos(np.pi / 12), 0, 0, np.sin(np.pi / 12)])
+    assert np.allclose(joints["mNeck"]["rotation_keys"].values[2], [1, 0, 0, 0])
+    plan = bvh.BVHPlan(clip, False, 0.01, {"Helper": "mNeck"})
+    assert ["Neck is mapped to mNeck, which is already taken"] == plan.issues, plan.issues
+
+    hierarchy = BVH_TEXT.split("MOTION")[0]
+    for text in (
+        "",
+        hierarchy,
+        BVH_TEXT.replace("ROOT", "JOINT"),
+        BVH_TEXT.replace("CHANNELS 3 Zrotation", "CHANNELS 4 Zrotation"),
+        BVH_TEXT.replace("Yposition", "Wposition"),
+        BVH_TEXT.replace("Frame Time: 0.04", "Frame Time: 0"),
+        BVH_TEXT.replace("Frames: 3", "Frames 3"),
+        BVH_TEXT.replace("0 0 30 0 0 0", "0 0 30 0 0"),
+        BVH_TEXT.replace("0 0 30 0 0 0", "0 0 30 0 0 x"),
+    ):
+        try:
+            bvh.parseBVH(text)
+        except ValueError:
+            continue
+        raise AssertionError("a malformed file is accepted: %s" % text[-60:])
+
+
+def checkProfiler(exporter):
+    """Memory tracing stops with the export when it finishes and when it is cancelled."""
+    profiling = importlib.import_module("sl_anim_exporter.slanim.profiling")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        filepath = os.path.join(temp_dir, "stats.anim")
+        for steps in (2, None):
+            buildScene(60, 20, 1)
+            profiler = profiling.ExportProfiler(trace_memory=True)
+            export = exporter.iterAnimToFile(bpy.context, filepath, getOptions(exporter, 60), profiler=profiler)
+            if steps:
+                for _ in range(steps):
+                    next(export)
+                assert tracemalloc.is_tracing(), "the memory is not traced while exporting"
+                export.close()
+            else:
+                exporter.runSteps(export)
+            assert not tracemalloc.is_tracing(), "the memory is still traced after the export"
+
+
+def checkSpillCleanup(exporter):
+    """The spill directory is removed after the workers of the pipeline are joined, when the export finishes or is cancelled."""
+    default_directory = exporter.tempfile.TemporaryDirectory
+    workers = []
+
+    class SpillDirectory(default_directory):
+        def cleanup(self):
+            workers.extend(thread.name for thread in threading.enumerate() if thread.name.startswith("sl_anim_"))
+            super().cleanup()
+
+    exporter.tempfile.TemporaryDirectory = SpillDirectory
+    try:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            filepath = os.path.join(temp_dir, "spill.anim")
+            for steps in (2, None):
+                buildScene(60, 20, 1)
+                export = exporter.iterAnimToFile(bpy.context, filepath, getOptions(exporter, 60), workers=2)
+                if steps:
+                    for _ in range(steps):
+                        next(export)
+                    export.close()
+                else:
+                    exporter.runSteps(export)
+                assert not workers, "the spill directory was removed while %s ran" % ", ".join(workers)
+    finally:
+        exporter.tempfile.TemporaryDirectory = default_directory
+
+
+def checkBatchSkip(exporter):
+    """The batch export skips the actions made for other armatures instead of failing on them."""
+    batch = importlib.import_module("sl_anim_batch")
+    obj, scene = buildScene(60, 20, 1)
+    assert batch.getSkipReason(exporter, obj, obj.animation_data.action) is None, "the action of the armature is skipped"
+
+    # An action of another rig, which only shares the helper bones
+    other = bpy.types.Action("Other")
+    helpers = ['pose.bones["%s"]' % name for name, parent in HELPER_BONES]
+    other.fcurves = [fcurve for fcurve in obj.animation_data.action.fcurves if fcurve.data_path.startswith(tuple(helpers))]
+    assert other.fcurves, "no helper bone is animated"
+    assert batch.getSkipReason(exporter, obj, other) is not None, "the action of another armature is exported"
+    assert obj.animation_data.action is not other, "checking an action assigned it"
+
+
+CHECKS = {
+    "cache": checkCache,
+    "live": checkLiveExport,
+    "ik": checkIK,
+    "sidecar": checkSidecar,
+    "mirror": checkMirror,
+    "variants": checkVariants,
+    "budget": checkBudget,
+    "bvh": checkBVH,
+    "profiler": checkProfiler,
+    "spill": checkSpillCleanup,
+    "batch": checkBatchSkip,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="checks.py", description="Check the exporter on synthetic rigs.")
+    parser.add_argument("checks", nargs="*", help="Checks to run, among %s (default: all)" % ", ".join(CHECKS))
+    args = parser.parse_args()
+    unknown = [name for name in args.checks if name not in CHECKS]
+    if unknown:
+        parser.error("unknown checks: %s" % ", ".join(unknown))
+
+    exporter = loadExporter()
+    failed = []
+    for name in args.checks or CHECKS:
+        try:
+            CHECKS[name](exporter)
+        except AssertionError as e:
+            print("%s: FAILED, %s" % (name, e))
+            failed.append(name)
+        else:
+            print("%s: ok" % name)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
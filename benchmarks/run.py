@@ -0,0 +1,193 @@
+"""
+Benchmarks of the exporter, without Blender.
+
+Runs the add-on on synthetic SL rigs with the stub bpy and mathutils modules
+of benchmarks/stubs, and times every stage of an export on its own: channel
+discovery, sampling (scene, F-Curve and keyframes), pose math, duplicate removal,
+encoding and the track dumps in every format. The golden cases are also exported in full, with
+a mirrored copy, and compared byte for byte with the .anim files of benchmarks/golden.
+
+    python benchmarks/run.py
+    python benchmarks/run.py --cases long --repeat 1
+    python benchmarks/run.py --update-golden
+
+Only numpy is needed. The exit code is 1 when an export does not match its
+golden file.
+"""
+
+import argparse
+import filecmp
+import importlib
+import importlib.util
+import json
+import os
+import sys
+import tempfile
+import time
+from math import radians
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path[:0] = [os.path.join(HERE, "stubs"), ROOT]
+
+import bpy
+import numpy as np
+from synthetic import buildScene
+
+# name: (frames, animated joints, seed)
+CASES = {
+    "short": (60, 20, 1),
+    "medium": (600, 60, 2),
+    "long": (3600, 100, 3),
+    "bento": (300, 159, 4),
+}
+# Scene sampling goes through the pure Python stubs, so long cases are only run on demand
+DEFAULT_CASES = ("short", "medium", "bento")
+GOLDEN_CASES = ("short",)
+GOLDEN_DIR = os.path.join(HERE, "golden")
+
+STAGES = ("channels", "sampling_scene", "sampling_fcurves", "sampling_keyframes", "pose_math", "dedup", "encoding", "json", "compact", "npz", "total")
+
+
+def loadExporter():
+    spec = importlib.util.spec_from_file_location(
+        "sl_anim_exporter", os.path.join(ROOT, "__init__.py"), submodule_search_locations=[ROOT]
+    )
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def getOptions(exporter, frames, sampling='SCENE', **kwargs):
+    """Returns the options of the exports of the benchmarks: a looping clip of every frame, with translations."""
+    return exporter.ExportOptions(
+        priority=4, loop=True, loop_start=1, loop_end=frames, ease_in=0.5, ease_out=0.5, with_translations=True, sampling=sampling, **kwargs
+    )
+
+
+def exportCase(exporter, case, filepath, sampling='SCENE', variants=None):
+    frames, joints, seed = CASES[case]
+    buildScene(frames, joints, seed)
+    exporter.writeAnimToFile(bpy.context, filepath, getOptions(exporter, frames, sampling, variants=variants or []))
+
+
+def timeStages(exporter, case):
+    """Returns the time in seconds of every stage of an export of a case."""
+    frames, joints, seed = CASES[case]
+    obj, scene = buildScene(frames, joints, seed)
+    posemath = importlib.import_module("sl_anim_exporter.slanim.posemath")
+    reduction = importlib.import_module("sl_anim_exporter.slanim.reduction")
+    anim = importlib.import_module("sl_anim_exporter.slanim.anim")
+    sidecar = importlib.import_module("sl_anim_exporter.slanim.sidecar")
+    times = {}
+
+    def timeStage(name, func, *args):
+        start = time.perf_counter()
+        result = func(*args)
+        times[name] = time.perf_counter() - start
+        return result
+
+    channels = timeStage("channels", exporter.getChannels, True)
+    plan = exporter.ExportPlan(obj, channels, scene.frame_start, scene.frame_end)
+    pose_mats = timeStage("sampling_scene", exporter.SceneSampler(scene, obj, plan.sampled_names).samplePoseMatrices, plan.frames)
+    sampler = exporter.FCurveSampler(obj, plan.sampled_names)
+    timeStage("sampling_fcurves", sampler.samplePoseMatrices, plan.frames)
+    keyframe_tracks = [
+        (j, is_rotation)
+        for j, bone in enumerate(plan.bones)
+        for is_rotation, channels in ((True, plan.rotation_channels), (False, plan.location_channels))
+        if bone.name in channels
+    ]
+    offset = np.array(obj.data.bones[0].head / 2)
+    timeStage("sampling_keyframes", lambda: [
+        exporter.sampleKeyframes(plan, sampler, j, is_rotation, offset, radians(0.5) if is_rotation else 0.001)
+        for j, is_rotation in keyframe_tracks
+    ])
+    timeStage("pose_math", lambda: posemath.getQuaternionsFromMatrices(plan.getLocalTransforms(pose_mats)))
+
+    # The other stages start from the tracks of a whole unreduced clip
+    dictionary = exporter.convertActionToDictionary(getOptions(exporter, frames, 'FCURVES', key_reduction=None))
+    dictionary = timeStage("dedup", reduction.removeDuplicatedFrames, dictionary)
+    timeStage("encoding", anim.convertDictionaryToAnim, dictionary)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for stage, sidecar_format in (("json", 'JSON'), ("compact", 'COMPACT'), ("npz", 'NPZ')):
+            timeStage(stage, sidecar.writeSidecar, os.path.join(temp_dir, case + "." + stage), dictionary, sidecar_format)
+        timeStage("total", exportCase, exporter, case, os.path.join(temp_dir, case + ".anim"))
+
+    return times
+
+
+def checkGolden(exporter, update):
+    """
+    Exports the golden cases with both sampling methods, and the mirrored copy
+    of the F-Curve export. Returns the names of the files that do not match.
+    """
+    failed = []
+    os.makedirs(GOLDEN_DIR, exist_ok=True)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for case in GOLDEN_CASES:
+            for sampling in ('SCENE', 'FCURVES'):
+                filename = "%s_%s.anim" % (case, sampling.lower())
+                filenames = [filename]
+                variants = None
+                if 'FCURVES' == sampling:
+                    variants = [{"name": "mirrored", "mirror": True}]
+                    filenames.append("%s_%s_mirrored.anim" % (case, sampling.lower()))
+                exportCase(exporter, case, os.path.join(temp_dir, filename), sampling, variants)
+                for filename in filenames:
+                    golden = os.path.join(GOLDEN_DIR, filename)
+                    if update:
+                        os.replace(os.path.join(temp_dir, filename), golden)
+                    elif not os.path.exists(golden) or not filecmp.cmp(golden, os.path.join(temp_dir, filename), shallow=False):
+                        failed.append(filename)
+    return failed
+
+
+def printTimes(results):
+    rows = [("CASE", "FRAMES", "JOINTS") + tuple(stage.upper() for stage in STAGES)]
+    for case, times in results.items():
+        frames, joints, _ = CASES[case]
+        rows.append((case, str(frames), str(joints)) + tuple("%.1f" % (times[stage] * 1000) for stage in STAGES))
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    print("Times in ms, best of each stage:")
+    for row in rows:
+        print("  ".join(cell.rjust(width) for cell, width in zip(row, widths)))
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="run.py", description="Benchmark the exporter stages on synthetic rigs.")
+    parser.add_argument("--cases", nargs="+", choices=CASES, default=list(DEFAULT_CASES))
+    parser.add_argument("--repeat", type=int, default=3, help="Runs of each case, the best time of each stage is kept")
+    parser.add_argument("--json", help="Also write the times to this JSON file")
+    parser.add_argument("--update-golden", action="store_true", help="Overwrite the golden files with the current output")
+    parser.add_argument("--no-golden", action="store_true", help="Skip the golden file check")
+    args = parser.parse_args()
+
+    exporter = loadExporter()
+
+    results = {}
+    for case in args.cases:
+        runs = [timeStages(exporter, case) for _ in range(max(1, args.repeat))]
+        results[case] = {stage: min(run[stage] for run in runs) for stage in STAGES}
+    printTimes(results)
+
+    if args.json:
+        with open(args.json, 'w') as f_json:
+            json.dump(results, f_json, indent=4)
+
+    if args.no_golden:
+        return 0
+    failed = checkGolden(exporter, args.update_golden)
+    if args.update_golden:
+        print("Golden files updated")
+    elif failed:
+        print("Output differs from the golden files: %s" % ", ".join(failed))
+        return 1
+    else:
+        print("Output matches the golden files")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
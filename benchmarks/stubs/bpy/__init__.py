@@ -0,0 +1,53 @@
+"""
+Stand-in for the bpy module, so that the exporter can run outside Blender.
+
+Only what the exporter uses is provided. The benchmarks fill `context` with
+synthetic data built from `bpy.types`.
+"""
+
+import os
+import tempfile
+import types as _types
+
+from . import types, props
+
+
+class _Context:
+
+    def __init__(self):
+        self.scene = types.Scene()
+        self.active_object = None
+        self.window_manager = types.WindowManager()
+        self.view_layer = None
+        self.window = None
+
+
+context = _Context()
+
+
+def _user_resource(resource_type, path=""):
+    return os.path.join(tempfile.gettempdir(), "sl_anim_stub", resource_type.lower(), path)
+
+
+ops = _types.SimpleNamespace(
+    object=_types.SimpleNamespace(),
+    sl_anim_exporter=_types.SimpleNamespace(),
+)
+
+utils = _types.SimpleNamespace(
+    register_class=lambda cls: None,
+    unregister_class=lambda cls: None,
+    user_resource=_user_resource,
+)
+
+app = _types.SimpleNamespace(
+    version=(3, 6, 0),
+    binary_path="blender",
+    background=True,
+    handlers=_types.SimpleNamespace(depsgraph_update_post=[], frame_change_post=[], load_post=[]),
+    timers=_types.SimpleNamespace(register=lambda func, **kwargs: None, unregister=lambda func: None,
+                                  is_registered=lambda func: False),
+)
+
+data = _types.SimpleNamespace(objects=types.bpy_collection(), actions=types.bpy_collection(), filepath="",
+                              is_dirty=False)
@@ -0,0 +1,9 @@
+"""Property constructors only need to exist; annotations are never evaluated."""
+
+
+def _property(**kwargs):
+    return ("PROPERTY", kwargs)
+
+
+StringProperty = BoolProperty = IntProperty = FloatProperty = _property
+EnumProperty = CollectionProperty = PointerProperty = FloatVectorProperty = _property
@@ -0,0 +1,350 @@
+"""
+Minimal data model mirroring the bpy.types the exporter touches.
+
+Pose evaluation follows Blender for bones with default inheritance: the pose
+matrix of a bone is parent_pose @ (parent_rest^-1 @ rest) @ basis, with the
+basis built from location, normalized rotation and scale.
+"""
+
+import re
+
+from mathutils import Matrix, Vector, Quaternion, Euler
+
+
+class Operator:
+    bl_idname = ""
+    bl_label = ""
+
+    def report(self, level, message):
+        print("[%s] %s" % ("/".join(sorted(level)), message))
+
+
+class Panel:
+    pass
+
+
+class PropertyGroup:
+    pass
+
+
+class _Menu:
+
+    def __init__(self):
+        self.draw_funcs = []
+
+    def append(self, func):
+        self.draw_funcs.append(func)
+
+    def remove(self, func):
+        self.draw_funcs.remove(func)
+
+
+TOPBAR_MT_file_export = _Menu()
+
+
+class bpy_collection(list):
+    """List that can also be indexed by name, like bpy_prop_collection."""
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            for item in self:
+                if item.name == key:
+                    return item
+            raise KeyError(key)
+        return list.__getitem__(self, key)
+
+    def get(self, key, default=None):
+        for item in self:
+            if item.name == key:
+                return item
+        return default
+
+    def keys(self):
+        return [item.name for item in self]
+
+    def foreach_get(self, attr, seq):
+        """Fills seq with the flattened values, matrices column by column like RNA."""
+        values = []
+        for item in self:
+            value = getattr(item, attr)
+            if isinstance(value, Matrix):
+                values.extend(c for col in zip(*value) for c in col)
+            elif hasattr(value, "__iter__"):
+                values.extend(value)
+            else:
+                values.append(value)
+        seq[:] = values
+
+
+class Keyframe:
+
+    def __init__(self, frame, value, interpolation='LINEAR'):
+        self.co = Vector((frame, value))
+        self.interpolation = interpolation
+        self.easing = 'AUTO'
+        self.back = 1.70158
+        self.amplitude = 0.8
+        self.period = 4.1
+        self.handle_left_type = 'AUTO_CLAMPED'
+        self.handle_right_type = 'AUTO_CLAMPED'
+        self.handle_left = Vector((frame, value))
+        self.handle_right = Vector((frame, value))
+
+
+class FCurve:
+
+    def __init__(self, data_path, array_index, keyframes=()):
+        self.data_path = data_path
+        self.array_index = array_index
+        self.keyframe_points = bpy_collection(Keyframe(f, v) for f, v in keyframes)
+        self.modifiers = []
+        self.mute = False
+        self.extrapolation = 'CONSTANT'
+
+    @property
+    def range(self):
+        return (self.keyframe_points[0].co[0], self.keyframe_points[-1].co[0])
+
+    def evaluate(self, frame):
+        points = self.keyframe_points
+        if not points:
+            return 0.0
+        if frame <= points[0].co[0]:
+            return points[0].co[1]
+        if frame >= points[-1].co[0]:
+            return points[-1].co[1]
+        lo, hi = 0, len(points) - 1
+        while hi - lo > 1:
+            mid = (lo + hi) // 2
+            if points[mid].co[0] <= frame:
+                lo = mid
+            else:
+                hi = mid
+        a, b = points[lo], points[hi]
+        if a.interpolation == 'CONSTANT':
+            return a.co[1]
+        t = (frame - a.co[0]) / (b.co[0] - a.co[0])
+        return a.co[1] + (b.co[1] - a.co[1]) * t
+
+
+class Action:
+
+    def __init__(self, name="Action"):
+        self.name = name
+        self.fcurves = []
+        self.use_fake_user = False
+
+    @property
+    def frame_range(self):
+        frames = [kp.co[0] for fc in self.fcurves for kp in fc.keyframe_points]
+        return (min(frames), max(frames)) if frames else (0.0, 0.0)
+
+
+class AnimData:
+
+    def __init__(self, action=None):
+        self.action = action
+        self.drivers = []
+        self.nla_tracks = []
+        self.action_blend_type = 'REPLACE'
+        self.action_influence = 1.0
+        self.action_extrapolation = 'HOLD'
+        self.use_tweak_mode = False
+
+
+class Bone:
+
+    def __init__(self, name, parent, head_local, matrix_local, length=0.1):
+        self.name = name
+        self.parent = parent
+        self.children = []
+        self.head_local = Vector(head_local)
+        self.matrix_local = matrix_local
+        self.length = length
+        self.use_connect = False
+        self.use_inherit_rotation = True
+        self.inherit_scale = 'FULL'
+        self.use_local_location = True
+        self.use_deform = True
+        if parent:
+            parent.children.append(self)
+
+    @property
+    def parent_recursive(self):
+        parents = []
+        bone = self.parent
+        while bone:
+            parents.append(bone)
+            bone = bone.parent
+        return parents
+
+    @property
+    def tail_local(self):
+        return self.matrix_local @ Vector((0.0, self.length, 0.0))
+
+    @property
+    def matrix(self):
+        if self.parent:
+            return (self.parent.matrix_local.inverted() @ self.matrix_local).to_3x3()
+        return self.matrix_local.to_3x3()
+
+    @property
+    def head(self):
+        if self.parent:
+            parent_tail = self.parent.matrix_local.inverted() @ self.head_local
+            return parent_tail - Vector((0.0, self.parent.length, 0.0))
+        return self.head_local.copy()
+
+
+class Armature:
+
+    def __init__(self, name="Armature"):
+        self.name = name
+        self.bones = bpy_collection()
+        self.animation_data = None
+
+
+class PoseBone:
+
+    def __init__(self, bone):
+        self.name = bone.name
+        self.bone = bone
+        self.parent = None
+        self.children = []
+        self.location = Vector((0.0, 0.0, 0.0))
+        self.rotation_quaternion = Quaternion()
+        self.rotation_euler = Euler((0.0, 0.0, 0.0), 'XYZ')
+        self.rotation_axis_angle = [0.0, 0.0, 1.0, 0.0]
+        self.rotation_mode = 'QUATERNION'
+        self.scale = Vector((1.0, 1.0, 1.0))
+        self.constraints = []
+        self.matrix = bone.matrix_local.copy()
+
+    @property
+    def matrix_basis(self):
+        if self.rotation_mode == 'QUATERNION':
+            rot = Quaternion(tuple(self.rotation_quaternion)).normalized()
+        elif self.rotation_mode == 'AXIS_ANGLE':
+            angle, *axis = self.rotation_axis_angle
+            rot = Quaternion(axis, angle)
+        else:
+            rot = Euler(tuple(self.rotation_euler), self.rotation_mode)
+        return Matrix.LocRotScale(self.location, rot, self.scale)
+
+
+class Pose:
+
+    def __init__(self):
+        self.bones = bpy_collection()
+
+
+class Modifier:
+
+    def __init__(self, name, type='ARMATURE'):
+        self.name = name
+        self.type = type
+        self.show_viewport = True
+        self.show_render = True
+
+
+class Object:
+
+    def __init__(self, name, data=None, type='ARMATURE'):
+        self.name = name
+        self.type = type
+        self.data = data
+        self.parent = None
+        self.constraints = []
+        self.modifiers = []
+        self.animation_data = None
+        self.rotation_mode = 'XYZ'
+        self.rotation_euler = Euler((0.0, 0.0, 0.0), 'XYZ')
+        self.location = Vector((0.0, 0.0, 0.0))
+        self.scale = Vector((1.0, 1.0, 1.0))
+        self.hide_viewport = False
+        self.library = None
+        self.mode = 'OBJECT'
+        self.pose = None
+        if type == 'ARMATURE':
+            self.pose = Pose()
+            for bone in data.bones:
+                self.pose.bones.append(PoseBone(bone))
+            for pbone in self.pose.bones:
+                if pbone.bone.parent:
+                    pbone.parent = self.pose.bones[pbone.bone.parent.name]
+                    pbone.parent.children.append(pbone)
+
+    @property
+    def matrix_basis(self):
+        return Matrix.LocRotScale(self.location, Euler(tuple(self.rotation_euler), self.rotation_mode), self.scale)
+
+    @property
+    def matrix_world(self):
+        return self.matrix_basis
+
+    def path_resolve(self, path):
+        match = re.match(r'^pose\.bones\["(.*)"\]$', path)
+        if match:
+            return self.pose.bones[match.group(1)]
+        return getattr(self, path)
+
+    def evaluate_pose(self, frame):
+        """Stand-in for the armature part of a depsgraph evaluation."""
+        action = self.animation_data.action if self.animation_data else None
+        if action is not None:
+            for fcurve in action.fcurves:
+                if fcurve.mute:
+                    continue
+                match = re.match(r'^pose\.bones\["(.*)"\]\.(\w+)$', fcurve.data_path)
+                if not match:
+                    continue
+                pbone = self.pose.bones.get(match.group(1))
+                if pbone is None:
+                    continue
+                target = getattr(pbone, match.group(2))
+                target[fcurve.array_index] = fcurve.evaluate(frame)
+        for pbone in self.pose.bones:
+            bone = pbone.bone
+            if pbone.parent:
+                rest_rel = bone.parent.matrix_local.inverted() @ bone.matrix_local
+                pbone.matrix = pbone.parent.matrix @ rest_rel @ pbone.matrix_basis
+            else:
+                pbone.matrix = bone.matrix_local @ pbone.matrix_basis
+
+
+class RenderSettings:
+
+    def __init__(self, fps=30):
+        self.fps = fps
+        self.fps_base = 1.0
+
+
+class Scene:
+
+    def __init__(self, name="Scene"):
+        self.name = name
+        self.objects = bpy_collection()
+        self.frame_start = 1
+        self.frame_end = 250
+        self.frame_current = 1
+        self.render = RenderSettings()
+        self.frame_set_calls = 0
+
+    def frame_set(self, frame, subframe=0.0):
+        self.frame_current = frame
+        self.frame_set_calls += 1
+        for obj in self.objects:
+            if obj.type == 'ARMATURE':
+                obj.evaluate_pose(frame + subframe)
+
+
+class WindowManager:
+
+    def progress_begin(self, min, max):
+        pass
+
+    def progress_update(self, value):
+        pass
+
+    def progress_end(self):
+        pass
@@ -0,0 +1,5 @@
+class ExportHelper:
+    filepath = ""
+
+    def invoke(self, context, event):
+        return {'RUNNING_MODAL'}
@@ -0,0 +1,414 @@
+"""
+Pure Python stand-in for the parts of Blender's mathutils used by the exporter.
+
+Only meant for running the exporter outside Blender (benchmarks). Conventions
+follow mathutils: matrices are indexed by row, vectors are column vectors and
+Matrix.to_quaternion uses the same branch logic as Blender's mat3_to_quat.
+"""
+
+import math
+
+
+class Vector:
+
+    __slots__ = ("_v",)
+
+    def __init__(self, seq=(0.0, 0.0, 0.0)):
+        self._v = [float(c) for c in seq]
+
+    def __len__(self):
+        return len(self._v)
+
+    def __iter__(self):
+        return iter(self._v)
+
+    def __getitem__(self, i):
+        return self._v[i]
+
+    def __setitem__(self, i, value):
+        self._v[i] = float(value)
+
+    def _get(i):
+        return property(lambda self: self._v[i], lambda self, value: self._v.__setitem__(i, float(value)))
+
+    x = _get(0)
+    y = _get(1)
+    z = _get(2)
+    w = _get(3)
+    del _get
+
+    def copy(self):
+        return Vector(self._v)
+
+    def __add__(self, other):
+        return Vector([a + b for a, b in zip(self._v, other)])
+
+    def __sub__(self, other):
+        return Vector([a - b for a, b in zip(self._v, other)])
+
+    def __neg__(self):
+        return Vector([-a for a in self._v])
+
+    def __mul__(self, scalar):
+        return Vector([a * scalar for a in self._v])
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, scalar):
+        return Vector([a / scalar for a in self._v])
+
+    def dot(self, other):
+        return sum(a * b for a, b in zip(self._v, other))
+
+    def cross(self, other):
+        a, b = self._v, list(other)
+        return Vector((a[1] * b[2] - a[2] * b[1], a[2] * b[0] - a[0] * b[2], a[0] * b[1] - a[1] * b[0]))
+
+    @property
+    def length(self):
+        return math.sqrt(self.dot(self))
+
+    def normalized(self):
+        length = self.length
+        return self.copy() if length == 0.0 else self / length
+
+    def to_4d(self):
+        return Vector(self._v[:3] + [1.0])
+
+    def to_3d(self):
+        return Vector(self._v[:3])
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return "Vector((%s))" % ", ".join("%.4f" % c for c in self._v)
+
+
+class Quaternion:
+
+    __slots__ = ("w", "x", "y", "z")
+
+    def __init__(self, seq=(1.0, 0.0, 0.0, 0.0), angle=None):
+        if angle is not None:
+            axis = Vector(seq).normalized()
+            s = math.sin(angle / 2)
+            seq = (math.cos(angle / 2), axis.x * s, axis.y * s, axis.z * s)
+        self.w, self.x, self.y, self.z = (float(c) for c in seq)
+
+    def __iter__(self):
+        return iter((self.w, self.x, self.y, self.z))
+
+    def __getitem__(self, i):
+        return (self.w, self.x, self.y, self.z)[i]
+
+    def __setitem__(self, i, value):
+        setattr(self, "wxyz"[i], float(value))
+
+    def __len__(self):
+        return 4
+
+    def copy(self):
+        return Quaternion(tuple(self))
+
+    def __neg__(self):
+        return Quaternion((-self.w, -self.x, -self.y, -self.z))
+
+    def dot(self, other):
+        return self.w * other.w + self.x * other.x + self.y * other.y + self.z * other.z
+
+    def normalized(self):
+        length = math.sqrt(self.dot(self))
+        if length == 0.0:
+            return Quaternion()
+        return Quaternion([c / length for c in self])
+
+    def conjugated(self):
+        return Quaternion((self.w, -self.x, -self.y, -self.z))
+
+    def inverted(self):
+        n = self.dot(self)
+        return Quaternion([c / n for c in self.conjugated()])
+
+    def __matmul__(self, other):
+        if isinstance(other, Quaternion):
+            w1, x1, y1, z1 = self
+            w2, x2, y2, z2 = other
+            return Quaternion((
+                w1 * w2 - x1 * x2 - y1 * y2 - z1 * z2,
+                w1 * x2 + x1 * w2 + y1 * z2 - z1 * y2,
+                w1 * y2 - x1 * z2 + y1 * w2 + z1 * x2,
+                w1 * z2 + x1 * y2 - y1 * x2 + z1 * w2,
+            ))
+        return self.to_matrix() @ other
+
+    def to_matrix(self):
+        q0, q1, q2, q3 = (c * math.sqrt(2.0) for c in self)
+        qda, qdb, qdc = q0 * q1, q0 * q2, q0 * q3
+        qaa, qab, qac = q1 * q1, q1 * q2, q1 * q3
+        qbb, qbc, qcc = q2 * q2, q2 * q3, q3 * q3
+        # Same layout as Blender's quat_to_mat3, transposed to row order.
+        return Matrix((
+            (1.0 - qbb - qcc, qab - qdc, qac + qdb),
+            (qab + qdc, 1.0 - qaa - qcc, qbc - qda),
+            (qac - qdb, qbc + qda, 1.0 - qaa - qbb),
+        ))
+
+    def to_euler(self, order='XYZ', compat=None):
+        return self.to_matrix().to_euler(order, compat)
+
+    def __repr__(self):
+        return "Quaternion((%.4f, %.4f, %.4f, %.4f))" % tuple(self)
+
+
+class Euler:
+
+    __slots__ = ("_v", "order")
+
+    def __init__(self, angles=(0.0, 0.0, 0.0), order='XYZ'):
+        self._v = [float(a) for a in angles]
+        self.order = order
+
+    def __iter__(self):
+        return iter(self._v)
+
+    def __getitem__(self, i):
+        return self._v[i]
+
+    def __setitem__(self, i, value):
+        self._v[i] = float(value)
+
+    def __len__(self):
+        return 3
+
+    def _get(i):
+        return property(lambda self: self._v[i], lambda self, value: self._v.__setitem__(i, float(value)))
+
+    x = _get(0)
+    y = _get(1)
+    z = _get(2)
+    del _get
+
+    def copy(self):
+        return Euler(self._v, self.order)
+
+    def to_matrix(self):
+        axes = {"X": 0, "Y": 1, "Z": 2}
+        result = Matrix.Identity(3)
+        # Blender applies the first axis of the order first.
+        for axis in self.order:
+            result = Matrix.Rotation(self._v[axes[axis]], 3, axis) @ result
+        return result
+
+    def to_quaternion(self):
+        return self.to_matrix().to_quaternion()
+
+    def __repr__(self):
+        return "Euler((%.4f, %.4f, %.4f), '%s')" % (self._v[0], self._v[1], self._v[2], self.order)
+
+
+class Matrix:
+
+    __slots__ = ("_m",)
+
+    def __init__(self, rows=None):
+        if rows is None:
+            rows = Matrix.Identity(4)._m
+        self._m = [[float(c) for c in row] for row in rows]
+
+    @staticmethod
+    def Identity(size):
+        return Matrix([[1.0 if i == j else 0.0 for j in range(size)] for i in range(size)])
+
+    @staticmethod
+    def Translation(vector):
+        m = Matrix.Identity(4)
+        for i in range(3):
+            m._m[i][3] = float(vector[i])
+        return m
+
+    @staticmethod
+    def Rotation(angle, size, axis):
+        c, s = math.cos(angle), math.sin(angle)
+        if axis == 'X':
+            rows = ((1, 0, 0), (0, c, -s), (0, s, c))
+        elif axis == 'Y':
+            rows = ((c, 0, s), (0, 1, 0), (-s, 0, c))
+        elif axis == 'Z':
+            rows = ((c, -s, 0), (s, c, 0), (0, 0, 1))
+        else:
+            return Quaternion(axis, angle).to_matrix() if size == 3 else Quaternion(axis, angle).to_matrix().to_4x4()
+        m = Matrix(rows)
+        return m if size == 3 else m.to_4x4()
+
+    @staticmethod
+    def Diagonal(vector):
+        size = len(vector)
+        return Matrix([[float(vector[i]) if i == j else 0.0 for j in range(size)] for i in range(size)])
+
+    @staticmethod
+    def LocRotScale(location, rotation, scale):
+        m = Matrix.Identity(3)
+        if rotation is not None:
+            if isinstance(rotation, Matrix):
+                m = rotation.to_3x3()
+            else:
+                m = rotation.to_matrix()
+        if scale is not None:
+            m = m @ Matrix.Diagonal(scale)
+        m = m.to_4x4()
+        if location is not None:
+            for i in range(3):
+                m._m[i][3] = float(location[i])
+        return m
+
+    def __len__(self):
+        return len(self._m)
+
+    def __getitem__(self, i):
+        return self._m[i]
+
+    def __iter__(self):
+        return iter(self._m)
+
+    def copy(self):
+        return Matrix(self._m)
+
+    @property
+    def translation(self):
+        return Vector(row[3] for row in self._m[:3])
+
+    def to_translation(self):
+        return self.translation
+
+    def to_3x3(self):
+        return Matrix([row[:3] for row in self._m[:3]])
+
+    def to_4x4(self):
+        if len(self._m) == 4:
+            return self.copy()
+        rows = [row[:3] + [0.0] for row in self._m] + [[0.0, 0.0, 0.0, 1.0]]
+        return Matrix(rows)
+
+    def transposed(self):
+        return Matrix(list(zip(*self._m)))
+
+    def __matmul__(self, other):
+        a = self._m
+        if isinstance(other, Matrix):
+            b = other._m
+            n = len(b)
+            return Matrix([[sum(a[i][k] * b[k][j] for k in range(n)) for j in range(len(b[0]))] for i in range(len(a))])
+        v = list(other)
+        if len(a) == 4 and len(v) == 3:
+            out = [sum(a[i][k] * v[k] for k in range(3)) + a[i][3] for i in range(3)]
+            return Vector(out)
+        return Vector([sum(a[i][k] * v[k] for k in range(len(v))) for i in range(len(a))])
+
+    def inverted(self):
+        n = len(self._m)
+        m = [row[:] + [1.0 if i == j else 0.0 for j in range(n)] for i, row in enumerate(self._m)]
+        for col in range(n):
+            pivot = max(range(col, n), key=lambda r: abs(m[r][col]))
+            if abs(m[pivot][col]) < 1e-30:
+                raise ValueError("Matrix.inverted(): matrix does not have an inverse")
+            m[col], m[pivot] = m[pivot], m[col]
+            p = m[col][col]
+            m[col] = [c / p for c in m[col]]
+            for r in range(n):
+                if r != col and m[r][col] != 0.0:
+                    f = m[r][col]
+                    m[r] = [a - f * b for a, b in zip(m[r], m[col])]
+        return Matrix([row[n:] for row in m])
+
+    def normalized(self):
+        cols = list(zip(*self.to_3x3()._m))
+        cols = [Vector(c).normalized() for c in cols]
+        m = Matrix(list(zip(*cols)))
+        return m if len(self._m) == 3 else m.to_4x4()
+
+    def to_quaternion(self):
+        # mat4_to_quat / mat3_normalized_to_quat_fast (Mike Day's method), with
+        # Blender's column-major mat[col][row] indexing.
+        m3 = self.to_3x3().normalized()
+        mat = [[m3._m[row][col] for row in range(3)] for col in range(3)]
+        if m3.determinant() < 0.0:
+            mat = [[-c for c in col] for col in mat]
+        q = [0.0, 0.0, 0.0, 0.0]
+        if mat[2][2] < 0.0:
+            if mat[0][0] > mat[1][1]:
+                trace = 1.0 + mat[0][0] - mat[1][1] - mat[2][2]
+                s = 2.0 * math.sqrt(trace)
+                if mat[1][2] < mat[2][1]:
+                    s = -s
+                q[1] = 0.25 * s
+                s = 1.0 / s
+                q[0] = (mat[1][2] - mat[2][1]) * s
+                q[2] = (mat[0][1] + mat[1][0]) * s
+                q[3] = (mat[2][0] + mat[0][2]) * s
+                if trace == 1.0 and q[0] == 0.0 and q[2] == 0.0 and q[3] == 0.0:
+                    q[1] = 1.0
+            else:
+                trace = 1.0 - mat[0][0] + mat[1][1] - mat[2][2]
+                s = 2.0 * math.sqrt(trace)
+                if mat[2][0] < mat[0][2]:
+                    s = -s
+                q[2] = 0.25 * s
+                s = 1.0 / s
+                q[0] = (mat[2][0] - mat[0][2]) * s
+                q[1] = (mat[0][1] + mat[1][0]) * s
+                q[3] = (mat[1][2] + mat[2][1]) * s
+                if trace == 1.0 and q[0] == 0.0 and q[1] == 0.0 and q[3] == 0.0:
+                    q[2] = 1.0
+        else:
+            if mat[0][0] < -mat[1][1]:
+                trace = 1.0 - mat[0][0] - mat[1][1] + mat[2][2]
+                s = 2.0 * math.sqrt(trace)
+                if mat[0][1] < mat[1][0]:
+                    s = -s
+                q[3] = 0.25 * s
+                s = 1.0 / s
+                q[0] = (mat[0][1] - mat[1][0]) * s
+                q[1] = (mat[2][0] + mat[0][2]) * s
+                q[2] = (mat[1][2] + mat[2][1]) * s
+                if trace == 1.0 and q[0] == 0.0 and q[1] == 0.0 and q[2] == 0.0:
+                    q[3] = 1.0
+            else:
+                trace = 1.0 + mat[0][0] + mat[1][1] + mat[2][2]
+                s = 2.0 * math.sqrt(trace)
+                q[0] = 0.25 * s
+                s = 1.0 / s
+                q[1] = (mat[1][2] - mat[2][1]) * s
+                q[2] = (mat[2][0] - mat[0][2]) * s
+                q[3] = (mat[0][1] - mat[1][0]) * s
+        return Quaternion(q).normalized()
+
+    def determinant(self):
+        m = self.to_3x3()._m
+        return (m[0][0] * (m[1][1] * m[2][2] - m[1][2] * m[2][1])
+                - m[0][1] * (m[1][0] * m[2][2] - m[1][2] * m[2][0])
+                + m[0][2] * (m[1][0] * m[2][1] - m[1][1] * m[2][0]))
+
+    def to_euler(self, order='XYZ', compat=None):
+        m = self.to_3x3().normalized()._m
+        if order != 'XYZ':
+            raise NotImplementedError("stub only decomposes XYZ eulers")
+        cy = math.hypot(m[0][0], m[1][0])
+        if cy > 1e-6:
+            x = math.atan2(m[2][1], m[2][2])
+            y = math.atan2(-m[2][0], cy)
+            z = math.atan2(m[1][0], m[0][0])
+        else:
+            x = math.atan2(-m[1][2], m[1][1])
+            y = math.atan2(-m[2][0], cy)
+            z = 0.0
+        return Euler((x, y, z), order)
+
+    def decompose(self):
+        loc = self.translation
+        m3 = self.to_3x3()
+        scale = Vector(Vector(c).length for c in zip(*m3._m))
+        return loc, m3.normalized().to_quaternion(), scale
+
+    def __repr__(self):
+        return "Matrix((%s))" % ", ".join("(%s)" % ", ".join("%.4f" % c for c in row) for row in self._m)
@@ -0,0 +1,81 @@
+"""
+Synthetic Second Life rigs and actions for the benchmarks.
+
+buildScene makes a full SL skeleton (base, Bento and volume bones) plus a few
+helper bones that are not exported. It animates a given number of joints
+with random keys, and makes the result the active object of the stub
+bpy.context. Everything is seeded, so a case always gives the same scene.
+"""
+
+import random
+
+import bpy
+from bpy import types as T
+from mathutils import Matrix, Vector, Euler
+
+from slanim.skeleton import getSkeletonDefinition
+
+# Bones that are not part of the SL skeleton, as found on most rigs
+HELPER_BONES = [
+    ("ctrl_ik_hand_L", None),
+    ("ctrl_ik_hand_R", None),
+    ("helper_chest", "mChest"),
+]
+
+
+def buildArmature(rnd):
+    arm = T.Armature()
+    bones = {}
+    for name, parent, *_ in getSkeletonDefinition() + HELPER_BONES:
+        parent_bone = bones.get(parent)
+        if parent_bone:
+            head = parent_bone.head_local + Vector((rnd.uniform(-0.1, 0.1), rnd.uniform(-0.1, 0.1), rnd.uniform(-0.1, 0.2)))
+        else:
+            head = Vector((rnd.uniform(-0.1, 0.1), rnd.uniform(-0.1, 0.1), rnd.uniform(0.9, 1.1)))
+        rot = Euler((rnd.uniform(-1, 1), rnd.uniform(-1, 1), rnd.uniform(-1, 1)), 'XYZ').to_matrix().to_4x4()
+        bone = T.Bone(name, parent_bone, head, Matrix.Translation(head) @ rot, length=rnd.uniform(0.05, 0.3))
+        arm.bones.append(bone)
+        bones[name] = bone
+    return arm
+
+
+def buildAction(rnd, frames, joints, translations):
+    """Animates `joints` random SL bones, always including mPelvis, plus one helper bone."""
+    sl_names = [name for name, *_ in getSkeletonDefinition()]
+    animated = ["mPelvis"] + rnd.sample(sl_names[1:], min(joints, len(sl_names)) - 1)
+    animated.append(HELPER_BONES[0][0])
+
+    action = T.Action("Clip")
+    for name in animated:
+        step = rnd.choice((1, 3, 5, 8))
+        for i in range(4):
+            base = 1.0 if 0 == i else 0.0
+            # Some channels hold still for the whole clip
+            if rnd.random() < 0.15:
+                keys = [(1, base), (frames, base)]
+            else:
+                keys = [(f, base + rnd.uniform(-0.4, 0.4)) for f in range(1, frames + 1, step)]
+            action.fcurves.append(T.FCurve('pose.bones["%s"].rotation_quaternion' % name, i, keys))
+        if "mPelvis" == name or (translations and rnd.random() < 0.3):
+            for i in range(3):
+                keys = [(f, rnd.uniform(-0.2, 0.2)) for f in range(1, frames + 1, 4)]
+                action.fcurves.append(T.FCurve('pose.bones["%s"].location' % name, i, keys))
+    return action
+
+
+def buildScene(frames, joints, seed=1, translations=True):
+    """Builds a scene with an SL rig animated on `joints` joints over `frames` frames, and returns (obj, scene)."""
+    rnd = random.Random(seed)
+    obj = T.Object("Armature", buildArmature(rnd))
+    obj.animation_data = T.AnimData(buildAction(rnd, frames, joints, translations))
+
+    scene = T.Scene()
+    scene.frame_start = 1
+    scene.frame_end = frames
+    scene.frame_current = 1
+    scene.render.fps = 30
+    scene.objects.append(obj)
+
+    bpy.context.scene = scene
+    bpy.context.active_object = obj
+    return obj, scene
@@ -0,0 +1,185 @@
+"""
+Conversion of .bvh motion capture files to .anim files, without Blender.
+
+    python bvh_to_anim.py mocap/ -o anims/ --priority 4 --loop
+    python bvh_to_anim.py "takes/*.bvh" -o anims/ --scale 0.01 --map rokoko.json --jobs 8
+
+The joints are mapped onto the SL skeleton by name: SL names are kept and the
+usual names of mocap skeletons (Hips, Spine, LeftArm, LeftUpLeg,
+LeftHandIndex1...) are translated, with or without a "namespace:" prefix.
+--map gives a JSON file of {"BVH name": "SL name"} for the other names, an
+empty SL name leaves a joint out. The files are converted the same way the
+add-on exports them once imported in Blender, by a pool of --jobs processes.
+A summary with the timing, the key counts and the failures of every clip is
+printed at the end, and can also be written as JSON with --summary.
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from math import radians
+
+from slanim.anim import convertDictionaryToAnim
+from slanim.budget import fitToSize
+from slanim.bvh import BVHPlan, loadBVH, convertBVHToDictionary
+from slanim.reduction import countKeys, removeDuplicatedFrames, reduceKeyframes
+from slanim.sidecar import getSidecarPath, writeSidecar
+from slanim.skeleton import SL_BONES
+
+
+def getArgumentParser():
+    parser = argparse.ArgumentParser(prog="bvh_to_anim.py", description="Convert .bvh motion capture files to Second Life .anim files.")
+    parser.add_argument("files", nargs="+", help="Globs of the .bvh files or of directories of .bvh files")
+    parser.add_argument("-o", "--output", default=".", help="Directory of the .anim files, directories keep their tree in it")
+    parser.add_argument("--map", help="JSON file mapping BVH joint names to SL joint names")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="Size of a unit of the files in meters, 0.01 for files in centimeters (default: %(default)s)")
+
+    parser.add_argument("--priority", type=int, default=4, choices=range(0, 7))
+    parser.add_argument("--loop", action="store_true")
+    parser.add_argument("--loop-start", type=int, default=0, help="First frame of the loop, from 0 (default: %(default)s)")
+    parser.add_argument("--loop-end", type=int, help="Last frame of the loop (default: last frame)")
+    parser.add_argument("--ease-in", type=float, default=0.0)
+    parser.add_argument("--ease-out", type=float, default=0.0)
+    parser.add_argument("--with-translations", action="store_true",
+                        help="Export the position channels of every joint, not only the mPelvis ones")
+    parser.add_argument("--reduction", choices=("DUPLICATES", "TOLERANCE"), default="DUPLICATES")
+    parser.add_argument("--rotation-tolerance", type=float, default=0.5, help="In degrees (default: %(default)s)")
+    parser.add_argument("--position-tolerance", type=float, default=0.001)
+    parser.add_argument("--max-size", type=int,
+                        help="Fit every clip in this many bytes with the smallest tolerances, 250000 for the viewer upload limit")
+    parser.add_argument("--dump-json", action="store_true", help="Also write the keys before quantization next to every clip")
+    parser.add_argument("--dump-format", choices=("JSON", "COMPACT", "NPZ"), default="JSON",
+                        help="Indented or compact .json, or columnar .npz arrays (default: %(default)s)")
+
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                        help="Number of processes converting at the same time (default: number of CPUs)")
+    parser.add_argument("--summary", help="Also write the summary to this JSON file")
+    return parser
+
+
+def findClips(patterns, output):
+    """Returns the .bvh files matching the globs, with the path of their .anim file."""
+    clips = []
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern)):
+            if os.path.isdir(path):
+                for dirpath, dirnames, filenames in os.walk(path):
+                    dirnames.sort()
+                    clips += [
+                        (os.path.join(dirpath, filename), os.path.join(output, os.path.relpath(dirpath, path), os.path.splitext(filename)[0] + ".anim"))
+                        for filename in sorted(filenames) if filename.lower().endswith(".bvh")
+                    ]
+            else:
+                clips.append((path, os.path.join(output, os.path.splitext(os.path.basename(path))[0] + ".anim")))
+    return clips
+
+
+def loadMapping(path):
+    """Reads a --map file. Raises ValueError when it maps a joint to a name that is not an SL joint."""
+    with open(path) as f_map:
+        mapping = json.load(f_map)
+    if not isinstance(mapping, dict):
+        raise ValueError("%s is not a JSON object" % path)
+    for name, sl_name in mapping.items():
+        if sl_name and sl_name not in SL_BONES:
+            raise ValueError("%s maps %s to %s, which is not an SL joint" % (path, name, sl_name))
+    return mapping
+
+
+def convertClip(path, output, args, mapping):
+    """Converts one .bvh file. Runs in the processes of the pool."""
+    result = {"clip": path, "output": output}
+    start = time.perf_counter()
+    try:
+        plan = BVHPlan(loadBVH(path), args.with_translations, args.scale, mapping)
+        if not plan.names:
+            raise ValueError("no animated joint maps to the SL skeleton")
+        frames = len(plan.clip.motion)
+        data = convertBVHToDictionary(
+            plan, args.priority, args.loop, args.loop_start, frames - 1 if args.loop_end is None else args.loop_end, args.ease_in, args.ease_out
+        )
+        result["keys_before"] = countKeys(data)
+
+        # The size search starts from every key and does its own reduction, within the tolerances for TOLERANCE
+        if 'TOLERANCE' == args.reduction and not args.max_size:
+            reduceKeyframes(data, radians(args.rotation_tolerance), args.position_tolerance)
+        else:
+            removeDuplicatedFrames(data)
+        if args.max_size:
+            result["budget"] = fitToSize(
+                data, args.max_size, plan.getDepths(), plan.getRestPositions(),
+                radians(args.rotation_tolerance), args.position_tolerance, 'TOLERANCE' == args.reduction
+            )
+        result["keys_after"] = countKeys(data)
+
+        os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+        if args.dump_json:
+            writeSidecar(getSidecarPath(output, args.dump_format), data, args.dump_format)
+        with open(output, 'wb') as f_anim:
+            f_anim.write(convertDictionaryToAnim(data))
+
+        result["frames"] = frames
+        result["size"] = os.path.getsize(output)
+        result["issues"] = plan.issues
+    except Exception as e:
+        result["error"] = "%s: %s" % (type(e).__name__, e)
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def printSummary(results, seconds):
+    rows = [("CLIP", "TIME", "KEYS", "SIZE", "STATUS")]
+    for result in results:
+        if "error" in result:
+            rows.append((result["clip"], "", "", "", "FAILED: " + result["error"]))
+            continue
+        rows.append((
+            result["clip"],
+            "%.2fs" % result["seconds"],
+            "%d -> %d" % (result["keys_before"], result["keys_after"]),
+            "%d B" % result["size"],
+            "OVER SIZE LIMIT" if not result.get("budget", {}).get("fits", True) else "ok"
+        ))
+        # Mapping issues are printed under their clip, out of the columns
+        rows += [("  " + issue,) for issue in result["issues"]]
+    widths = [max(len(row[i]) for row in rows if len(row) > 1) for i in range(4)]
+    for row in rows:
+        print("  ".join(cell.ljust(width) for cell, width in zip(row, widths)) + "  " + row[4] if len(row) > 1 else row[0])
+
+    failed = sum(1 for result in results if "error" in result)
+    print("%d clips converted, %d failed, in %.2fs" % (len(results) - failed, failed, seconds))
+
+
+def main():
+    args = getArgumentParser().parse_args()
+    clips = findClips(args.files, args.output)
+    if not clips:
+        print("No .bvh file matches %s" % " ".join(args.files))
+        return 1
+    try:
+        mapping = loadMapping(args.map) if args.map else None
+    except (OSError, ValueError) as e:
+        print("Cannot read the joint map: %s" % e)
+        return 1
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+        futures = [pool.submit(convertClip, path, output, args, mapping) for path, output in clips]
+        results = [future.result() for future in futures]
+    seconds = time.perf_counter() - start
+
+    printSummary(results, seconds)
+    if args.summary:
+        with open(args.summary, 'w') as f_summary:
+            json.dump({"seconds": seconds, "clips": results}, f_summary, indent=4)
+
+    return 1 if any("error" in result for result in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
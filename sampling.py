@@ -0,0 +1,380 @@
+"""
+Pose sampling engines.
+
+The default engine calls scene.frame_set() for every frame and reads the
+evaluated pose bones, which re-evaluates the whole dependency graph. The
+F-Curve engine reads the pose channels straight from the action and builds
+the pose matrices itself, which is only valid when nothing but the action
+drives the exported bones. The keyframe engine is the F-Curve engine run on
+the frames of the keys of each bone, and on the frames in between only
+where the motion strays from the keys.
+
+With scene evaluation, SceneIsolation keeps Blender from evaluating the
+objects that cannot move the bones, like the meshes deformed by the
+armature, while the frames are sampled.
+"""
+
+import re
+import numpy as np
+from .slanim import posemath
+from .slanim.cache import SampleHasher
+
+SAMPLING_ITEMS = [
+    ('SCENE', "Scene", "Evaluate the whole scene on every frame. Slow, but handles constraints, drivers and IK"),
+    ('FCURVES', "F-Curves", "Read the bone channels directly from the action F-Curves. Falls back to Scene when the exported bones use constraints, drivers or NLA"),
+    ('KEYFRAMES', "Keyframes", "Read the F-Curves at the keyframes of each bone only, adding frames in between where the motion strays from the keys by more than the tolerances. Falls back to Scene like F-Curves"),
+]
+
+CHANNEL_SIZES = {
+    "location": 3,
+    "rotation_quaternion": 4,
+    "rotation_euler": 3,
+    "rotation_axis_angle": 4,
+    "scale": 3,
+}
+
+
+def getFCurveSamplingIssues(obj, bone_names):
+    """Returns the reasons why the action alone does not define the pose of these bones."""
+    issues = []
+    anim_data = obj.animation_data
+
+    if anim_data.use_tweak_mode:
+        issues.append("the action is edited in NLA tweak mode")
+    if any(not track.mute and len(track.strips) for track in anim_data.nla_tracks):
+        issues.append("the armature has NLA tracks")
+    if 'REPLACE' != anim_data.action_blend_type or 1.0 != anim_data.action_influence:
+        issues.append("the action is blended with an influence or blend mode")
+
+    driven = set()
+    for id_data in (obj, obj.data):
+        if id_data.animation_data is None:
+            continue
+        for driver in id_data.animation_data.drivers:
+            if driver.mute:
+                continue
+            match = re.match(r'^pose\.bones\["(.+?)"\]', driver.data_path)
+            driven.add(match.group(1) if id_data is obj and match else None)
+    if None in driven:
+        issues.append("the armature has drivers")
+
+    for bone_name in bone_names:
+        pose_bone = obj.pose.bones[bone_name]
+        bone = pose_bone.bone
+        if bone_name in driven:
+            issues.append("%s is driven" % bone_name)
+        if any(not constraint.mute for constraint in pose_bone.constraints):
+            issues.append("%s has constraints" % bone_name)
+        if not bone.use_inherit_rotation or 'FULL' != bone.inherit_scale or not bone.use_local_location:
+            issues.append("%s does not fully inherit its parent transform" % bone_name)
+
+    # IK moves the bones up its chain, which can be exported bones whatever bone holds the constraint
+    for pose_bone in obj.pose.bones:
+        for constraint in pose_bone.constraints:
+            if constraint.mute or constraint.type not in ('IK', 'SPLINE_IK'):
+                continue
+            chain = []
+            bone = pose_bone if 'SPLINE_IK' == constraint.type or constraint.use_tail else pose_bone.parent
+            while bone is not None and (not constraint.chain_count or len(chain) < constraint.chain_count):
+                chain.append(bone.name)
+                bone = bone.parent
+            issues += ["%s is moved by the IK of %s" % (name, pose_bone.name) for name in chain if name != pose_bone.name and name in bone_names]
+
+    return issues
+
+
+def getSamplingMethod(obj, sampling, bone_names):
+    """Returns the sampling method to use and a message telling which one was picked and why."""
+    if sampling in ('FCURVES', 'KEYFRAMES'):
+        issues = getFCurveSamplingIssues(obj, bone_names)
+        if not issues and 'KEYFRAMES' == sampling:
+            return 'KEYFRAMES', "Sampled at the keyframes of the action F-Curves"
+        if not issues:
+            return 'FCURVES', "Sampled from the action F-Curves"
+        return 'SCENE', "Sampled with scene evaluation: %s" % ", ".join(issues)
+    return 'SCENE', "Sampled with scene evaluation"
+
+
+def getDependencies(scene, obj):
+    """
+    Returns the names of the objects of the scene that the pose of an armature
+    can depend on: itself, its parents, the targets of its constraints and the
+    objects read by its drivers, and theirs in turn.
+    """
+    needed = set()
+    pending = [obj]
+    while pending:
+        current = pending.pop()
+        if current is None or current.name in needed:
+            continue
+        needed.add(current.name)
+        pending.append(current.parent)
+
+        constraints = list(current.constraints)
+        if current.pose:
+            for pose_bone in current.pose.bones:
+                constraints += list(pose_bone.constraints)
+        for constraint in constraints:
+            pending += [getattr(constraint, "target", None), getattr(constraint, "pole_target", None)]
+            # Armature constraints have a list of targets
+            pending += [target.target for target in getattr(constraint, "targets", ())]
+        # Constraint targets with a vertex group read the evaluated mesh
+        for modifier in current.modifiers:
+            pending.append(getattr(modifier, "object", None))
+
+        # Drivers can read any data block, the objects using it are kept
+        read = []
+        for id_data in (current, current.data):
+            if id_data is None or id_data.animation_data is None:
+                continue
+            for driver in id_data.animation_data.drivers:
+                for variable in driver.driver.variables:
+                    read += [target.id for target in variable.targets if target.id is not None]
+        for other in scene.objects:
+            shape_keys = getattr(other.data, "shape_keys", None)
+            if any(id_data in (other, other.data) or (shape_keys is not None and id_data == shape_keys) for id_data in read):
+                pending.append(other)
+    return needed
+
+
+class SceneIsolation:
+    """
+    Hides the objects of the scene that the pose of an armature does not
+    depend on, and turns their modifiers off, until restore() puts every
+    setting back the way it was. Hidden objects are still evaluated when
+    something else depends on them, hence the modifiers.
+    """
+
+    def __init__(self, scene, obj):
+        self.scene = scene
+        self.obj = obj
+        self.changes = []
+
+    def setValue(self, data, attribute, value):
+        if getattr(data, attribute) != value:
+            self.changes.append((data, attribute, getattr(data, attribute)))
+            setattr(data, attribute, value)
+
+    def isolate(self):
+        needed = getDependencies(self.scene, self.obj)
+        for other in self.scene.objects:
+            # Linked objects cannot be edited
+            if other.name in needed or other.library is not None:
+                continue
+            for modifier in other.modifiers:
+                self.setValue(modifier, "show_viewport", False)
+            self.setValue(other, "hide_viewport", True)
+        return self
+
+    def restore(self):
+        while self.changes:
+            data, attribute, value = self.changes.pop()
+            setattr(data, attribute, value)
+
+    def __enter__(self):
+        return self.isolate()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.restore()
+
+
+class SceneSampler:
+    """Samples the evaluated pose matrices by moving the scene to every frame."""
+
+    def __init__(self, scene, obj, bone_names):
+        self.scene = scene
+        self.obj = obj
+        self.bone_names = list(bone_names)
+        all_indices = {pose_bone.name: i for i, pose_bone in enumerate(obj.pose.bones)}
+        self.indices = np.array([all_indices[bone_name] for bone_name in self.bone_names], dtype=np.int64)
+
+    def samplePoseMatrices(self, frames, progress=None):
+        """Returns the (frames, bones, 4, 4) armature space pose matrices of the bones."""
+        buffer = np.empty((len(self.obj.pose.bones), 4, 4), dtype=np.float32)
+        pose_mats = np.empty((len(frames), len(self.bone_names), 4, 4), dtype=np.float32)
+        for i, frame in enumerate(frames):
+            if progress:
+                progress(i)
+            self.scene.frame_set(frame)
+            self.obj.pose.bones.foreach_get("matrix", buffer.ravel())
+            pose_mats[i] = buffer[self.indices]
+        # Blender stores matrices column by column
+        return pose_mats.transpose(0, 1, 3, 2).astype(np.float64)
+
+
+class RangeSampler:
+    """
+    Reads the pose matrices that other Blender processes sampled, one .npy file
+    of (frames, pose bones, 4, 4) matrices per range of frames.
+    """
+
+    def __init__(self, obj, bone_names, ranges):
+        self.bone_names = list(bone_names)
+        all_indices = {pose_bone.name: i for i, pose_bone in enumerate(obj.pose.bones)}
+        self.indices = np.array([all_indices[bone_name] for bone_name in self.bone_names], dtype=np.int64)
+        self.ranges = [(frame_start, frame_end, np.load(path, mmap_mode='r')) for frame_start, frame_end, path in ranges]
+
+    def samplePoseMatrices(self, frames, progress=None):
+        """Returns the (frames, bones, 4, 4) armature space pose matrices of the bones."""
+        pose_mats = np.empty((len(frames), len(self.bone_names), 4, 4))
+        for i, frame in enumerate(frames):
+            for frame_start, frame_end, mats in self.ranges:
+                if frame_start <= frame <= frame_end:
+                    pose_mats[i] = mats[frame - frame_start][self.indices]
+                    break
+            else:
+                raise ValueError("frame %d is in none of the sampled ranges" % frame)
+        return pose_mats
+
+
+class FCurveSampler:
+    """Builds armature space pose matrices from the action F-Curves, without frame_set."""
+
+    def __init__(self, obj, bone_names):
+        arm = obj.data
+        self.bone_names = list(bone_names)
+
+        # Bones to evaluate: the requested ones and all their ancestors, parents first
+        needed = set()
+        for bone_name in bone_names:
+            bone = arm.bones[bone_name]
+            while bone and bone.name not in needed:
+                needed.add(bone.name)
+                bone = bone.parent
+        self.bones = [bone for bone in arm.bones if bone.name in needed]
+        self.bones.sort(key=lambda bone: len(bone.parent_recursive))
+
+        self.rest_mats = {}
+        for bone in self.bones:
+            if bone.parent:
+                self.rest_mats[bone.name] = np.array(bone.parent.matrix_local.inverted() @ bone.matrix_local)
+            else:
+                self.rest_mats[bone.name] = np.array(bone.matrix_local)
+
+        # F-Curve of every channel component, None when the component is not animated
+        self.fcurves = {bone.name: {} for bone in self.bones}
+        for fcurve in obj.animation_data.action.fcurves:
+            if fcurve.mute or "pose.bones" != fcurve.data_path[0:10]:
+                continue
+            parts = fcurve.data_path.rpartition('.')
+            if parts[2] not in CHANNEL_SIZES:
+                continue
+            try:
+                pose_bone = obj.path_resolve(parts[0])
+            except ValueError:
+                continue
+            if pose_bone.name not in self.fcurves:
+                continue
+            channel = self.fcurves[pose_bone.name].setdefault(parts[2], [None] * CHANNEL_SIZES[parts[2]])
+            channel[fcurve.array_index] = fcurve
+
+        self.pose_bones = {bone.name: obj.pose.bones[bone.name] for bone in self.bones}
+
+    def getBoneHasher(self, bone_name):
+        """
+        Returns a SampleHasher fed with everything the samples of a bone depend on,
+        or None when they cannot be cached.
+
+        The pose of the parent cancels out of the rest relative transform, so
+        only the bone itself matters. The pose bone values are only read for
+        the components without an F-Curve: Blender overwrites the others with
+        the animated values whenever the current frame changes.
+        """
+        bone = self.pose_bones[bone_name].bone
+        hasher = SampleHasher(bone_name, self.rest_mats[bone_name], bone.use_connect, self.pose_bones[bone_name].rotation_mode)
+
+        for channel, size in CHANNEL_SIZES.items():
+            hasher.update(channel)
+            static = tuple(getattr(self.pose_bones[bone_name], channel))
+            for component, fcurve in enumerate(self.fcurves[bone_name].get(channel, [None] * size)):
+                if fcurve is None:
+                    hasher.update(None, static[component])
+                    continue
+                if len(fcurve.modifiers):
+                    return None
+                points = fcurve.keyframe_points
+                for attribute in ("co", "handle_left", "handle_right"):
+                    values = np.empty(len(points) * 2, dtype=np.float32)
+                    points.foreach_get(attribute, values)
+                    hasher.update(values)
+                hasher.update(fcurve.extrapolation, [
+                    (point.interpolation, point.easing, point.back, point.amplitude, point.period, point.handle_left_type, point.handle_right_type) for point in points
+                ])
+
+        return hasher
+
+    def getKeyframes(self, bone_name, frame_start, frame_end):
+        """
+        Returns the frames of the range where the channels of a bone have a key,
+        and both ends of the range. Every frame when an F-Curve has modifiers.
+        """
+        frames = [np.array([frame_start, frame_end])]
+        for channel in self.fcurves[bone_name].values():
+            for fcurve in channel:
+                if fcurve is None:
+                    continue
+                if len(fcurve.modifiers):
+                    return np.arange(frame_start, frame_end + 1)
+                points = fcurve.keyframe_points
+                co = np.empty(len(points) * 2, dtype=np.float32)
+                points.foreach_get("co", co)
+                # Keys between two frames are framed by both
+                frames += [np.floor(co[0::2]), np.ceil(co[0::2])]
+        frames = np.concatenate(frames).astype(np.int64)
+        return np.unique(frames[(frames >= frame_start) & (frames <= frame_end)])
+
+    def evaluate(self, bone_name, channel, frames):
+        """Returns the (frames, components) values of a channel, static values where there is no F-Curve."""
+        values = np.empty((len(frames), CHANNEL_SIZES[channel]))
+        values[:] = tuple(getattr(self.pose_bones[bone_name], channel))
+        for i, fcurve in enumerate(self.fcurves[bone_name].get(channel, ())):
+            if fcurve:
+                values[:, i] = [fcurve.evaluate(frame) for frame in frames]
+        return values
+
+    def getBasisMatrices(self, bone, frames, with_location=True):
+        rotation_mode = self.pose_bones[bone.name].rotation_mode
+
+        if 'QUATERNION' == rotation_mode:
+            rot = posemath.getMatricesFromQuaternions(self.evaluate(bone.name, "rotation_quaternion", frames))
+        elif 'AXIS_ANGLE' == rotation_mode:
+            rot = posemath.getMatricesFromAxisAngles(self.evaluate(bone.name, "rotation_axis_angle", frames))
+        else:
+            rot = posemath.getMatricesFromEulers(self.evaluate(bone.name, "rotation_euler", frames), rotation_mode)
+
+        # Blender ignores the location of connected bones
+        if bone.use_connect or not with_location:
+            loc = np.zeros((len(frames), 3))
+        else:
+            loc = self.evaluate(bone.name, "location", frames)
+        scale = self.evaluate(bone.name, "scale", frames)
+
+        return posemath.getMatricesLocRotScale(loc, rot, scale)
+
+    def sampleLocalMatrices(self, bone_name, frames, with_location=True):
+        """
+        Returns the (frames, 4, 4) transforms of a bone relative to its rest pose, in armature space.
+
+        The pose of the parent cancels out of them, so only the channels of the bone are evaluated.
+        The location does not change the rotation, it can be left out when only the rotation is needed.
+        """
+        bone = self.pose_bones[bone_name].bone
+        rest_mat = np.array(bone.matrix_local)
+        # F-Curves evaluate Python numbers much faster than numpy scalars
+        frames = np.asarray(frames).tolist()
+        return rest_mat @ self.getBasisMatrices(bone, frames, with_location) @ np.linalg.inv(rest_mat)
+
+    def samplePoseMatrices(self, frames, progress=None):
+        """Returns the (frames, bones, 4, 4) armature space pose matrices of the bones."""
+        pose_mats = {}
+        for i, bone in enumerate(self.bones):
+            if progress:
+                progress(round(i / len(self.bones) * (len(frames) - 1)))
+            basis = self.getBasisMatrices(bone, frames)
+            if bone.parent:
+                pose_mats[bone.name] = pose_mats[bone.parent.name] @ self.rest_mats[bone.name] @ basis
+            else:
+                pose_mats[bone.name] = self.rest_mats[bone.name] @ basis
+        if not self.bone_names:
+            return np.empty((len(frames), 0, 4, 4))
+        return np.stack([pose_mats[bone_name] for bone_name in self.bone_names], axis=1)
@@ -0,0 +1,455 @@
+"""
+Headless batch export of .anim files.
+
+Exports every action matching --action, on every armature matching
+--armature, of every .blend file matching the given globs. A background
+Blender first lists the clips of each .blend file, then each clip is exported
+by its own background Blender process, and up to --jobs of them run at the
+same time, so that the clips of one large file are spread over all of them.
+
+    python sl_anim_batch.py --blender /path/to/blender "clips/*.blend" -o anims/ --priority 4 --loop
+    blender -b --python sl_anim_batch.py -- "clips/*.blend" -o anims/ --sampling FCURVES
+
+The first form only needs a plain Python to drive the workers. With
+--range-jobs, the long clips that need scene evaluation are also split into
+ranges of frames, sampled at the same time by more background Blenders on
+the same .blend file; the exporting one merges their pose matrices. A summary
+with the timing, the key counts and the failures of every clip is printed
+at the end, and can also be written as JSON with --summary.
+"""
+
+import argparse
+import contextlib
+import fnmatch
+import glob
+import importlib.util
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from math import radians
+
+RESULT_PREFIX = "SL_ANIM_RESULT "
+
+# Starting a Blender and loading the file costs more than sampling fewer frames than this
+MIN_RANGE_FRAMES = 100
+
+
+def getArgumentParser():
+    parser = argparse.ArgumentParser(
+        prog="sl_anim_batch.py",
+        description="Export Second Life .anim files from .blend files without opening the Blender UI."
+    )
+    parser.add_argument("files", nargs="*", help="Globs of the .blend files to export")
+    parser.add_argument("-o", "--output", default=".", help="Directory of the exported .anim files")
+    parser.add_argument("--name", default="{blend}_{action}",
+                        help="Name of the exported files, from {blend}, {armature} and {action} (default: %(default)s)")
+    parser.add_argument("--action", default="*", help="Glob of the actions to export (default: all)")
+    parser.add_argument("--armature", default="*", help="Glob of the armature objects to export (default: all)")
+    parser.add_argument("--frame-range", choices=("action", "scene"), default="action",
+                        help="Export the frame range of each action, or the scene frame range (default: %(default)s)")
+
+    parser.add_argument("--priority", type=int, default=4, choices=range(0, 7))
+    parser.add_argument("--loop", action="store_true")
+    parser.add_argument("--loop-start", type=int, help="First frame of the loop (default: first exported frame)")
+    parser.add_argument("--loop-end", type=int, help="Last frame of the loop (default: last exported frame)")
+    parser.add_argument("--ease-in", type=float, default=0.0)
+    parser.add_argument("--ease-out", type=float, default=0.0)
+    parser.add_argument("--with-translations", action="store_true",
+                        help="Export all location channels, not only the mPelvis one")
+    parser.add_argument("--sampling", choices=("SCENE", "FCURVES", "KEYFRAMES"), default="SCENE")
+    parser.add_argument("--reduction", choices=("DUPLICATES", "TOLERANCE"), default="DUPLICATES")
+    parser.add_argument("--rotation-tolerance", type=float, default=0.5, help="In degrees (default: %(default)s)")
+    parser.add_argument("--position-tolerance", type=float, default=0.001)
+    parser.add_argument("--max-size", type=int,
+                        help="Fit every clip in this many bytes with the smallest tolerances, 250000 for the viewer upload limit")
+    parser.add_argument("--variants",
+                        help="Other versions of every clip, written from the same sampling as {name}_VARIANT.anim. "
+                             "For instance: \"p2: priority=2; once: loop=0, ease_in=0.3; rot: with_translations=0\"")
+    parser.add_argument("--mirror", action="store_true", help="Also write every clip mirrored left to right, as {name}_mirrored.anim")
+    parser.add_argument("--no-isolate", action="store_true",
+                        help="Evaluate every object of the scene when sampling with scene evaluation, not only the ones the armature depends on")
+    parser.add_argument("--dump-json", action="store_true", help="Also write the keys before quantization next to every clip")
+    parser.add_argument("--dump-format", choices=("JSON", "COMPACT", "NPZ"), default="JSON",
+                        help="Indented or compact .json, or columnar .npz arrays (default: %(default)s)")
+
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                        help="Number of Blender processes running at the same time (default: number of CPUs)")
+    parser.add_argument("--range-jobs", type=int, default=1,
+                        help="Split the clips sampled with scene evaluation into up to this many ranges of frames, each sampled by its own "
+                             "Blender at the same time (default: %(default)s). Up to --jobs times this many Blenders run at once")
+    parser.add_argument("--blender", help="Blender executable (default: the running Blender, or 'blender')")
+    parser.add_argument("--summary", help="Also write the summary to this JSON file")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--list", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--sample-range", nargs=5, metavar=("ARMATURE", "ACTION", "START", "END", "PATH"), help=argparse.SUPPRESS)
+    return parser
+
+
+def getScriptArguments():
+    """Returns the arguments meant for this script, after '--' when running inside Blender."""
+    if "--" in sys.argv:
+        return sys.argv[sys.argv.index("--") + 1:]
+    return sys.argv[1:]
+
+
+# ---------------------------------------------- WORKER -------------------------------------------------
+
+def loadExporter():
+    """Imports the add-on next to this script, whether it is installed or not."""
+    path = os.path.dirname(os.path.abspath(__file__))
+    spec = importlib.util.spec_from_file_location(
+        "sl_anim_exporter", os.path.join(path, "__init__.py"), submodule_search_locations=[path]
+    )
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def getSkipReason(exporter, obj, action):
+    """Returns why a clip is not exported, or None: every armature is paired with every action, most of them made for other armatures."""
+    channels = exporter.getChannels(True, obj, action)
+    if not channels['rotation_channels'] and not channels['location_channels']:
+        return "the action does not animate any Second Life bone of the armature"
+    return None
+
+
+def exportClip(exporter, args, obj, action, blend_name):
+    import bpy
+
+    context = bpy.context
+    scene = context.scene
+    result = {"blend": blend_name, "armature": obj.name, "action": action.name}
+
+    context.view_layer.objects.active = obj
+    if obj.animation_data is None:
+        obj.animation_data_create()
+    obj.animation_data.action = action
+
+    if "action" == args.frame_range:
+        scene.frame_start, scene.frame_end = (int(round(frame)) for frame in action.frame_range)
+
+    filename = bpy.path.clean_name(args.name.format(blend=blend_name, armature=obj.name, action=action.name))
+    result["output"] = os.path.join(args.output, filename + ".anim")
+
+    error = exporter.getError()
+    if "" != error:
+        result["error"] = error
+        return result
+
+    options = exporter.ExportOptions(
+        priority=args.priority,
+        loop=args.loop,
+        loop_start=scene.frame_start if args.loop_start is None else args.loop_start,
+        loop_end=scene.frame_end if args.loop_end is None else args.loop_end,
+        ease_in=args.ease_in,
+        ease_out=args.ease_out,
+        with_translations=args.with_translations,
+        isolate=not args.no_isolate,
+        key_reduction=args.reduction,
+        rotation_tolerance=radians(args.rotation_tolerance),
+        position_tolerance=args.position_tolerance,
+        max_size=args.max_size,
+        variants=getVariants(exporter, args),
+        dump_json=args.dump_json,
+        dump_format=args.dump_format
+    )
+    options.sampling, result["sampling"] = exporter.getSamplingMethod(obj, args.sampling, exporter.getSampledBoneNames(options))
+
+    stats = {}
+    start = time.perf_counter()
+    # The sampled ranges are read until the clip is written
+    with tempfile.TemporaryDirectory(prefix="sl_anim_ranges_") as range_dir:
+        sampled_ranges = None
+        if 'SCENE' == options.sampling and args.range_jobs > 1:
+            sampled_ranges = sampleRanges(exporter, args, obj, action, scene.frame_start, scene.frame_end, range_dir)
+            result["ranges"] = len(sampled_ranges)
+        exporter.writeAnimToFile(context, result["output"], options, stats=stats, sampled_ranges=sampled_ranges)
+    result["seconds"] = time.perf_counter() - start
+    result["frames"] = scene.frame_end - scene.frame_start + 1
+    result["keys_before"] = stats["keys_before"]
+    result["keys_after"] = stats["keys_after"]
+    result["size"] = os.path.getsize(result["output"])
+    result["stages"] = stats["stages"]
+    if "budget" in stats:
+        result["budget"] = stats["budget"]
+    if "variants" in stats:
+        result["variants"] = stats["variants"]
+    return result
+
+
+def getVariants(exporter, args):
+    variants = exporter.parseVariants(args.variants)
+    if args.mirror and not any("mirrored" == variant["name"] for variant in variants):
+        variants.append({"name": "mirrored", "mirror": True})
+    return variants
+
+
+def getFrameRanges(frame_start, frame_end, count):
+    """Splits frame_start..frame_end into count contiguous ranges of about the same length."""
+    bounds = [frame_start + (frame_end - frame_start + 1) * i // count for i in range(count + 1)]
+    return [(bounds[i], bounds[i + 1] - 1) for i in range(count)]
+
+
+def sampleRangeToFile(exporter, scene, obj, frame_start, frame_end, path, isolate):
+    """Samples the pose matrices of every pose bone of an armature on a range of frames, to a .npy file."""
+    import numpy as np
+
+    frames = range(frame_start, frame_end + 1)
+    sampler = exporter.SceneSampler(scene, obj, [pose_bone.name for pose_bone in obj.pose.bones])
+    # Blender matrices are 32 bits, so are the sampled ones
+    mats = np.lib.format.open_memmap(path, mode='w+', dtype=np.float32, shape=(len(frames), len(obj.pose.bones), 4, 4))
+    with exporter.SceneIsolation(scene, obj) if isolate else contextlib.nullcontext():
+        for start in range(0, len(frames), exporter.FRAME_WINDOW):
+            window = frames[start:start + exporter.FRAME_WINDOW]
+            mats[start:start + len(window)] = sampler.samplePoseMatrices(window)
+    mats.flush()
+    del mats
+
+
+def sampleRanges(exporter, args, obj, action, frame_start, frame_end, directory):
+    """
+    Samples a clip in ranges of frames, the first one in this Blender and the
+    others at the same time in background Blenders on the same .blend file.
+    Returns the (frame_start, frame_end, path) of every range.
+    """
+    import bpy
+
+    count = max(1, min(args.range_jobs, (frame_end - frame_start + 1) // MIN_RANGE_FRAMES))
+    ranges = [(start, end, os.path.join(directory, "range_%d.npy" % i)) for i, (start, end) in enumerate(getFrameRanges(frame_start, frame_end, count))]
+
+    processes = []
+    try:
+        for start, end, path in ranges[1:]:
+            command = [
+                bpy.app.binary_path, "-b", bpy.data.filepath, "--python-exit-code", "1", "--python", os.path.abspath(__file__), "--",
+                "--sample-range", obj.name, action.name, str(start), str(end), path
+            ]
+            if args.no_isolate:
+                command.append("--no-isolate")
+            processes.append((start, end, subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)))
+
+        frame_current = bpy.context.scene.frame_current
+        sampleRangeToFile(exporter, bpy.context.scene, obj, ranges[0][0], ranges[0][1], ranges[0][2], not args.no_isolate)
+        bpy.context.scene.frame_set(frame_current)
+
+        for start, end, process in processes:
+            output = process.communicate()[0].strip().splitlines()
+            if 0 != process.returncode:
+                raise RuntimeError("Sampling frames %d to %d failed: %s" % (start, end, output[-1] if output else "exit code %d" % process.returncode))
+    finally:
+        for start, end, process in processes:
+            if process.poll() is None:
+                process.kill()
+    return ranges
+
+
+def runRangeWorker(args):
+    """Samples a range of frames of a clip for the Blender exporting it."""
+    import bpy
+
+    exporter = loadExporter()
+    armature, action, frame_start, frame_end, path = args.sample_range
+    obj = bpy.data.objects[armature]
+    if obj.animation_data is None:
+        obj.animation_data_create()
+    obj.animation_data.action = bpy.data.actions[action]
+    sampleRangeToFile(exporter, bpy.context.scene, obj, int(frame_start), int(frame_end), path, not args.no_isolate)
+
+
+def runWorker(args):
+    """Exports the clips of the .blend file opened by this Blender process, or only lists them with --list."""
+    import bpy
+
+    blend_name = os.path.splitext(os.path.basename(bpy.data.filepath))[0]
+    armatures = [obj for obj in bpy.context.scene.objects if 'ARMATURE' == obj.type and fnmatch.fnmatchcase(obj.name, args.armature)]
+    actions = [action for action in bpy.data.actions if fnmatch.fnmatchcase(action.name, args.action)]
+    exporter = loadExporter()
+    if args.list:
+        for obj in armatures:
+            for action in actions:
+                clip = {"blend": blend_name, "armature": obj.name, "action": action.name}
+                reason = getSkipReason(exporter, obj, action)
+                if reason is not None:
+                    clip["skipped"] = reason
+                print(RESULT_PREFIX + json.dumps(clip), flush=True)
+        return
+
+    os.makedirs(args.output, exist_ok=True)
+
+    for obj in armatures:
+        for action in actions:
+            reason = getSkipReason(exporter, obj, action)
+            if reason is not None:
+                print(RESULT_PREFIX + json.dumps({"blend": blend_name, "armature": obj.name, "action": action.name, "skipped": reason}), flush=True)
+                continue
+            try:
+                result = exportClip(exporter, args, obj, action, blend_name)
+            except Exception as e:
+                result = {"blend": blend_name, "armature": obj.name, "action": action.name, "error": "%s: %s" % (type(e).__name__, e)}
+            print(RESULT_PREFIX + json.dumps(result), flush=True)
+
+
+# ---------------------------------------------- DRIVER -------------------------------------------------
+
+def getBlenderExecutable(args):
+    if args.blender:
+        return args.blender
+    try:
+        import bpy
+        return bpy.app.binary_path
+    except ImportError:
+        return "blender"
+
+
+def getExactGlob(name):
+    """Returns the glob that only matches this name."""
+    return re.sub(r"([*?[])", r"[\1]", name)
+
+
+def exportBlendFile(blender, blend_path, worker_args):
+    """Runs one background Blender on a .blend file and collects the results of its clips, or the clips it lists."""
+    command = [blender, "-b", blend_path, "--python-exit-code", "1", "--python", os.path.abspath(__file__), "--", "--worker"] + worker_args
+    start = time.perf_counter()
+    process = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    seconds = time.perf_counter() - start
+
+    results = [json.loads(line[len(RESULT_PREFIX):]) for line in process.stdout.splitlines() if line.startswith(RESULT_PREFIX)]
+    if 0 != process.returncode or not results:
+        blend_name = os.path.splitext(os.path.basename(blend_path))[0]
+        output = process.stdout.strip().splitlines()
+        if 0 != process.returncode:
+            error = "Blender exited with code %d: %s" % (process.returncode, output[-1] if output else "")
+        else:
+            error = "No armature or action matched"
+        results.append({"blend": blend_name, "armature": "", "action": "", "error": error})
+    return blend_path, seconds, results
+
+
+def printSummary(results, seconds):
+    rows = [("CLIP", "TIME", "KEYS", "SIZE", "STATUS")]
+    for result in results:
+        clip = "/".join(part for part in (result["blend"], result["armature"], result["action"]) if part)
+        if "error" in result:
+            rows.append((clip, "", "", "", "FAILED: " + result["error"]))
+        elif "skipped" in result:
+            rows.append((clip, "", "", "", "skipped: " + result["skipped"]))
+        else:
+            rows.append((
+                clip,
+                "%.2fs" % result["seconds"],
+                "%d -> %d" % (result["keys_before"], result["keys_after"]),
+                "%d B" % result["size"],
+                "OVER SIZE LIMIT" if not result.get("budget", {}).get("fits", True) else "ok"
+            ))
+            for name, variant in result.get("variants", {}).items():
+                rows.append((
+                    "  " + name,
+                    "",
+                    "%d" % variant["keys_after"],
+                    "%d B" % variant["size"],
+                    "OVER SIZE LIMIT" if not variant.get("budget", {}).get("fits", True) else "ok"
+                ))
+    widths = [max(len(row[i]) for row in rows) for i in range(4)]
+    for row in rows:
+        print("  ".join(cell.ljust(width) for cell, width in zip(row, widths)) + "  " + row[4])
+
+    failed = sum(1 for result in results if "error" in result)
+    skipped = sum(1 for result in results if "skipped" in result)
+    print("%d clips exported, %d failed, %d skipped, in %.2fs" % (len(results) - failed - skipped, failed, skipped, seconds))
+
+
+def getWorkerArguments(args):
+    """Returns the command line that gives the export options to a worker, without the clips to export."""
+    worker_args = [
+        "--output", os.path.abspath(args.output),
+        "--name", args.name,
+        "--frame-range", args.frame_range,
+        "--priority", str(args.priority),
+        "--ease-in", repr(args.ease_in),
+        "--ease-out", repr(args.ease_out),
+        "--sampling", args.sampling,
+        "--reduction", args.reduction,
+        "--rotation-tolerance", repr(args.rotation_tolerance),
+        "--position-tolerance", repr(args.position_tolerance),
+        "--dump-format", args.dump_format,
+    ]
+    if args.loop_start is not None:
+        worker_args += ["--loop-start", str(args.loop_start)]
+    if args.loop_end is not None:
+        worker_args += ["--loop-end", str(args.loop_end)]
+    if args.max_size is not None:
+        worker_args += ["--max-size", str(args.max_size)]
+    if args.range_jobs > 1:
+        worker_args += ["--range-jobs", str(args.range_jobs)]
+    if args.variants:
+        worker_args += ["--variants", args.variants]
+    for flag in ("loop", "with_translations", "mirror", "no_isolate", "dump_json"):
+        if getattr(args, flag):
+            worker_args.append("--" + flag.replace("_", "-"))
+    return worker_args
+
+
+def runDriver(args):
+    blend_paths = sorted({os.path.abspath(path) for pattern in args.files for path in glob.glob(pattern)})
+    if not blend_paths:
+        print("No .blend file matches %s" % " ".join(args.files))
+        return 1
+
+    worker_args = getWorkerArguments(args)
+    list_args = ["--list", "--armature", args.armature, "--action", args.action]
+
+    blender = getBlenderExecutable(args)
+    start = time.perf_counter()
+    # Every clip is exported by its own Blender as soon as its file is listed
+    file_results = {blend_path: [] for blend_path in blend_paths}
+    with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+        pending = {pool.submit(exportBlendFile, blender, blend_path, list_args): None for blend_path in blend_paths}
+        while pending:
+            future = next(as_completed(pending))
+            clip = pending.pop(future)
+            blend_path, seconds, results = future.result()
+            if clip is None:
+                for result in results:
+                    file_results[blend_path].append(result)
+                    if "error" not in result and "skipped" not in result:
+                        clip_args = worker_args + ["--armature", getExactGlob(result["armature"]), "--action", getExactGlob(result["action"])]
+                        pending[pool.submit(exportBlendFile, blender, blend_path, clip_args)] = result
+                continue
+
+            result = results[0]
+            result.update(armature=clip["armature"], action=clip["action"])
+            file_results[blend_path][file_results[blend_path].index(clip)] = result
+            print("%s/%s/%s: %s in %.2fs" % (
+                result["blend"], result["armature"], result["action"],
+                "FAILED" if "error" in result else "skipped" if "skipped" in result else "ok", seconds
+            ), flush=True)
+    results = [result for blend_path in blend_paths for result in file_results[blend_path]]
+    seconds = time.perf_counter() - start
+
+    printSummary(results, seconds)
+    if args.summary:
+        with open(args.summary, 'w') as f_summary:
+            json.dump({"seconds": seconds, "clips": results}, f_summary, indent=4)
+
+    return 1 if any("error" in result for result in results) else 0
+
+
+def main():
+    args = getArgumentParser().parse_args(getScriptArguments())
+    if args.sample_range:
+        runRangeWorker(args)
+        return 0
+    if args.worker:
+        runWorker(args)
+        return 0
+    return runDriver(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
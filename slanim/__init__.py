@@ -0,0 +1,7 @@
+"""
+Blender-free core of the Second Life anim exporter.
+
+Nothing in this package imports bpy or mathutils: it only works on plain
+Python data and NumPy arrays, so it can be used from the add-on as well as
+from command line tools running outside of Blender.
+"""
@@ -0,0 +1,244 @@
+"""
+The .anim binary format.
+
+convertDictionaryToAnim computes the exact size of the file first, then
+packs everything into a single preallocated buffer. Keys are quantized a
+whole joint at a time, straight from the arrays of their JointTrack.
+
+convertAnimToDictionary reads a .anim file back into the same dictionary,
+with the keys decoded into JointTracks.
+"""
+
+import struct
+import numpy as np
+
+from .tracks import ROTATION_COMPONENTS, POSITION_COMPONENTS, JointTrack, getTrack
+
+sAnimHeader = struct.Struct("<HHLf")
+sAnimParams = struct.Struct("<ffLffLL")
+sAnimFrame = struct.Struct("<HHHH")
+sAnimUInt32 = struct.Struct("<I") #Used for various stuff
+sAnimConstraint = struct.Struct("<BB16sfff16sffffffffff")
+
+
+def quantizeRotations(quats):
+    """Converts (N, 4) w, x, y, z quaternions to the (N, 3) U16 x, y, z written in the file."""
+    quats = np.asarray(quats, dtype=np.float64).reshape(-1, 4)
+    # w is not stored: use the quaternion with a positive w
+    xyz = np.where(quats[:, :1] < 0, -quats[:, 1:], quats[:, 1:])
+    return np.clip(((xyz + 1) / 2) * 0xFFFF, 0, 0xFFFF).astype(np.uint16)
+
+
+def quantizePositions(locs):
+    """Converts (N, 3) x, y, z positions to the (N, 3) U16 x, y, z written in the file."""
+    locs = np.clip(np.asarray(locs, dtype=np.float64).reshape(-1, 3), -1, 1)
+    return (((locs / 5) + 0.5) * 0xFFFF).astype(np.uint16)
+
+
+def dequantizeRotations(quantized):
+    """Converts the (N, 3) U16 x, y, z of the file back to (N, 4) w, x, y, z quaternions with w >= 0."""
+    xyz = np.asarray(quantized, dtype=np.float64).reshape(-1, 3) / 0xFFFF * 2 - 1
+    w = np.sqrt(np.clip(1.0 - np.sum(xyz * xyz, axis=1, keepdims=True), 0.0, 1.0))
+    return np.concatenate((w, xyz), axis=1)
+
+
+def dequantizePositions(quantized):
+    """Converts the (N, 3) U16 x, y, z of the file back to positions."""
+    return (np.asarray(quantized, dtype=np.float64).reshape(-1, 3) / 0xFFFF - 0.5) * 5
+
+
+def getClipDictionary(priority, duration, loop, loop_in_point, loop_out_point, ease_in_duration, ease_out_duration, joints):
+    """Returns the dictionary of a clip made of these joints, times in seconds."""
+    return {
+        "version": 1,
+        "sub_version": 0,
+        "base_priority": priority,
+        "duration": duration,
+        "emote_name": "",
+        "loop": int(loop),
+        "loop_in_point": loop_in_point,
+        "loop_out_point": loop_out_point,
+        "ease_in_duration": ease_in_duration,
+        "ease_out_duration": ease_out_duration,
+        "hand_pose": 0,
+        "constraints": [],
+        "joints": joints
+    }
+
+
+def getRotationArrays(keys):
+    """Returns the times and the (N, 4) w, x, y, z values of rotation keys."""
+    track = getTrack(keys, ROTATION_COMPONENTS)
+    return track.times, track.values
+
+
+def getPositionArrays(keys):
+    """Returns the times and the (N, 3) x, y, z values of position keys."""
+    track = getTrack(keys, POSITION_COMPONENTS)
+    return track.times, track.values
+
+
+def getAnimSize(data):
+    """Returns the exact size in bytes of the .anim file of a dictionary."""
+    size = sAnimHeader.size + len(data["emote_name"].encode()) + 1 + sAnimParams.size
+    for bname, joint in data["joints"].items():
+        size += len(bname.encode()) + 1 + 3 * sAnimUInt32.size
+        size += sAnimFrame.size * (len(joint["rotation_keys"]) + len(joint["position_keys"]))
+    size += sAnimUInt32.size + sAnimConstraint.size * len(data["constraints"])
+    return size
+
+
+def packFrames(buffer, offset, times, values):
+    """Writes times and quantized values as sAnimFrame records straight into the buffer."""
+    frames = np.ndarray((len(times), 4), dtype="<u2", buffer=buffer, offset=offset)
+    frames[:, 0] = times
+    frames[:, 1:] = values
+    return offset + frames.nbytes
+
+
+def convertDictionaryToAnim(data):
+    buffer = bytearray(getAnimSize(data))
+    offset = 0
+
+    sAnimHeader.pack_into(
+        buffer, offset,
+        data["version"],
+        data["sub_version"],
+        data["base_priority"],
+        data["duration"]
+    )
+    offset += sAnimHeader.size
+
+    emote_name = data["emote_name"].encode() + b"\0"
+    buffer[offset:offset + len(emote_name)] = emote_name
+    offset += len(emote_name)
+
+    sAnimParams.pack_into(
+        buffer, offset,
+        data["loop_in_point"],
+        data["loop_out_point"],
+        data["loop"],
+        data["ease_in_duration"],
+        data["ease_out_duration"],
+        data["hand_pose"],
+        len(data["joints"])
+    )
+    offset += sAnimParams.size
+
+    for bname, joint in data["joints"].items():
+
+        name = bname.encode() + b"\0"
+        buffer[offset:offset + len(name)] = name
+        offset += len(name)
+
+        sAnimUInt32.pack_into(buffer, offset, joint["priority"])
+        offset += sAnimUInt32.size
+
+        sAnimUInt32.pack_into(buffer, offset, len(joint["rotation_keys"]))
+        offset += sAnimUInt32.size
+        times, values = getRotationArrays(joint["rotation_keys"])
+        offset = packFrames(buffer, offset, times, quantizeRotations(values))
+
+        sAnimUInt32.pack_into(buffer, offset, len(joint["position_keys"]))
+        offset += sAnimUInt32.size
+        times, values = getPositionArrays(joint["position_keys"])
+        offset = packFrames(buffer, offset, times, quantizePositions(values))
+
+    sAnimUInt32.pack_into(buffer, offset, len(data["constraints"]))
+    offset += sAnimUInt32.size
+
+    for constraint in data["constraints"]:
+        sAnimConstraint.pack_into(
+            buffer, offset,
+            constraint["chain_length"],
+            constraint["constraint_type"],
+            (constraint["source_volume"].encode()+(b"\0"*16))[0:16],
+            constraint["source_offset"][0],
+            constraint["source_offset"][1],
+            constraint["source_offset"][2],
+            (constraint["target_volume"].encode()+(b"\0"*16))[0:16],
+            constraint["target_offset"][0],
+            constraint["target_offset"][1],
+            constraint["target_offset"][2],
+            constraint["target_dir"][0],
+            constraint["target_dir"][1],
+            constraint["target_dir"][2],
+            constraint["ease_in_start"],
+            constraint["ease_in_stop"],
+            constraint["ease_out_start"],
+            constraint["ease_out_stop"]
+        )
+        offset += sAnimConstraint.size
+
+    return buffer
+
+
+def readString(buffer, offset):
+    """Returns a null terminated string of the buffer and the offset after it."""
+    end = buffer.index(b"\0", offset)
+    return bytes(buffer[offset:end]).decode(errors="replace"), end + 1
+
+
+def unpackFrames(buffer, offset):
+    """Reads a key count and its sAnimFrame records. Returns the times, the quantized values and the offset after them."""
+    count, = sAnimUInt32.unpack_from(buffer, offset)
+    offset += sAnimUInt32.size
+    frames = np.frombuffer(buffer, dtype="<u2", count=count * 4, offset=offset).reshape(-1, 4)
+    return frames[:, 0], frames[:, 1:], offset + frames.nbytes
+
+
+def convertAnimToDictionary(buffer):
+    """Decodes the bytes of a .anim file. Keys are JointTracks of the values the viewer will read."""
+    data = {}
+    offset = 0
+
+    data["version"], data["sub_version"], data["base_priority"], data["duration"] = sAnimHeader.unpack_from(buffer, offset)
+    offset += sAnimHeader.size
+
+    data["emote_name"], offset = readString(buffer, offset)
+
+    (
+        data["loop_in_point"],
+        data["loop_out_point"],
+        data["loop"],
+        data["ease_in_duration"],
+        data["ease_out_duration"],
+        data["hand_pose"],
+        joint_count
+    ) = sAnimParams.unpack_from(buffer, offset)
+    offset += sAnimParams.size
+
+    data["constraints"] = []
+    data["joints"] = {}
+    for _ in range(joint_count):
+        bname, offset = readString(buffer, offset)
+        priority, = sAnimUInt32.unpack_from(buffer, offset)
+        offset += sAnimUInt32.size
+
+        times, values, offset = unpackFrames(buffer, offset)
+        rotation_keys = JointTrack(times, dequantizeRotations(values), ROTATION_COMPONENTS)
+        times, values, offset = unpackFrames(buffer, offset)
+        position_keys = JointTrack(times, dequantizePositions(values), POSITION_COMPONENTS)
+
+        data["joints"][bname] = {"priority": priority, "rotation_keys": rotation_keys, "position_keys": position_keys}
+
+    constraint_count, = sAnimUInt32.unpack_from(buffer, offset)
+    offset += sAnimUInt32.size
+    for _ in range(constraint_count):
+        values = sAnimConstraint.unpack_from(buffer, offset)
+        offset += sAnimConstraint.size
+        data["constraints"].append({
+            "chain_length": values[0],
+            "constraint_type": values[1],
+            "source_volume": values[2].rstrip(b"\0").decode(errors="replace"),
+            "source_offset": list(values[3:6]),
+            "target_volume": values[6].rstrip(b"\0").decode(errors="replace"),
+            "target_offset": list(values[7:10]),
+            "target_dir": list(values[10:13]),
+            "ease_in_start": values[13],
+            "ease_in_stop": values[14],
+            "ease_out_start": values[15],
+            "ease_out_stop": values[16],
+        })
+
+    return data
@@ -0,0 +1,144 @@
+"""
+Fitting a clip into a size limit.
+
+The size of a .anim file only depends on the names of its joints and on its
+number of keys, sAnimFrame.size bytes each. fitToSize keeps the clip as it is
+when it fits, unless it is also asked to reduce it within the base
+tolerances. Otherwise it drops the joints that never leave their rest pose
+and the position channels that never leave their rest position, then looks
+for the smallest tolerance scale that fits: every joint is reduced with the
+base tolerances times the scale times a weight that grows with its depth, so
+that the roots, whose errors move everything below them, stay the most
+accurate.
+
+The Douglas-Peucker splits of a track do not depend on the tolerance, so the
+importance of every key is computed once (getKeyImportances) and the number
+of keys left at any scale is known without reducing again. The smallest
+scale that fits is then found exactly by sorting.
+"""
+
+import numpy as np
+
+from .anim import sAnimFrame, getAnimSize
+from .compare import getTrackErrors
+from .reduction import getKeyImportances, getRotationErrors, getPositionErrors
+from .tracks import ROTATION_COMPONENTS, POSITION_COMPONENTS, getTrack, getEmptyTrack
+
+# Largest .anim file the viewer uploads
+MAX_ANIM_SIZE = 250000
+
+REST_ROTATION = np.array([1.0, 0.0, 0.0, 0.0])
+
+
+def getDepthWeight(depth):
+    """Tolerance factor of a joint at a depth of the hierarchy, 1 for the roots."""
+    return 1.0 + depth
+
+
+def getRestErrors(track, rest, is_rotation):
+    """Returns the errors of the keys of a track from a rest value."""
+    rest = np.broadcast_to(np.asarray(rest, dtype=np.float64), track.values.shape)
+    if is_rotation:
+        return getRotationErrors(track.values.astype(np.float64), rest)
+    return getPositionErrors(track.values.astype(np.float64), rest)
+
+
+def dropRestTracks(joints, rest_positions, rotation_tolerance, position_tolerance):
+    """
+    Drops the position channels that stay within tolerance of their rest
+    position, then the joints left without position that stay within
+    tolerance of their rest pose. Returns the names of the dropped joints and
+    of the joints whose positions were dropped, with the errors this adds.
+    """
+    dropped_joints = []
+    dropped_positions = []
+    errors = {}
+    for name, joint in list(joints.items()):
+        rotations = joint["rotation_keys"]
+        positions = joint["position_keys"]
+        errors[name] = {"rotation": 0.0, "position": 0.0}
+        if len(positions):
+            position_errors = getRestErrors(positions, rest_positions[name], False)
+            if position_errors.max() <= position_tolerance:
+                joint["position_keys"] = getEmptyTrack(POSITION_COMPONENTS)
+                errors[name]["position"] = float(position_errors.max())
+                dropped_positions.append(name)
+        if not len(joint["position_keys"]):
+            rotation_errors = getRestErrors(rotations, REST_ROTATION, True) if len(rotations) else np.zeros(1)
+            if rotation_errors.max() <= rotation_tolerance:
+                del joints[name]
+                errors[name]["rotation"] = float(rotation_errors.max())
+                dropped_joints.append(name)
+    return dropped_joints, dropped_positions, errors
+
+
+def fitToSize(data, max_size, depths, rest_positions, rotation_tolerance, position_tolerance, within_tolerance=False):
+    """
+    Reduces the keys of a dictionary so that its .anim file fits in max_size bytes.
+
+    depths maps joint names to their depth in the hierarchy, rest_positions
+    to the value of their position keys at rest. The tolerances are the base
+    tolerances, for a scale of 1 and a root joint. A tolerance of 0 keeps
+    every key of its channels that cannot be rebuilt exactly. With
+    within_tolerance, the keys within the base tolerances are dropped even
+    when the clip fits, as the 'TOLERANCE' reduction does, and the scale
+    only removes more. Returns a report with the size, whether it fits, the
+    scale, the dropped joints and positions, and the largest rotation
+    (radians) and position errors of every joint.
+    """
+    joints = data["joints"]
+    for joint in joints.values():
+        joint["rotation_keys"] = getTrack(joint["rotation_keys"], ROTATION_COMPONENTS)
+        joint["position_keys"] = getTrack(joint["position_keys"], POSITION_COMPONENTS)
+
+    report = {
+        "max_size": max_size,
+        "size": getAnimSize(data),
+        "scale": 0.0,
+        "dropped_joints": [],
+        "dropped_positions": [],
+        "errors": {name: {"rotation": 0.0, "position": 0.0} for name in joints},
+    }
+    if report["size"] <= max_size and not within_tolerance:
+        report["fits"] = True
+        return report
+
+    report["dropped_joints"], report["dropped_positions"], errors = dropRestTracks(
+        joints, rest_positions, rotation_tolerance, position_tolerance
+    )
+    report["errors"].update(errors)
+    size = getAnimSize(data)
+
+    # Importance of every key over the tolerance of its track: the key is kept when this ratio is above the scale
+    tracks = []
+    for name, joint in joints.items():
+        weight = getDepthWeight(depths.get(name, 0))
+        for keys, tolerance, is_rotation in (
+            ("rotation_keys", rotation_tolerance, True),
+            ("position_keys", position_tolerance, False),
+        ):
+            track = joint[keys]
+            importances = getKeyImportances(track.times, track.values, is_rotation)
+            # Ends are infinitely important, and so are the keys that a tolerance of 0 cannot drop
+            with np.errstate(divide='ignore', invalid='ignore'):
+                track_ratios = importances / (tolerance * weight)
+            track_ratios[(importances == 0) | (within_tolerance & (importances <= tolerance))] = 0.0
+            tracks.append((name, keys, is_rotation, track_ratios))
+    ratios = np.concatenate([track_ratios for *_, track_ratios in tracks] or [np.empty(0)])
+    ratios = np.sort(ratios[np.isfinite(ratios)])[::-1]
+
+    # The scale keeps as many keys as the budget allows, the ends of the tracks are always kept
+    budget = max(0, (max_size - (size - sAnimFrame.size * len(ratios))) // sAnimFrame.size)
+    if budget < len(ratios) or within_tolerance:
+        scale = float(ratios[budget]) if budget < len(ratios) else 0.0
+        report["scale"] = scale
+        for name, keys, is_rotation, track_ratios in tracks:
+            track = joints[name][keys]
+            reduced = track[np.flatnonzero(track_ratios > scale)]
+            if len(reduced) < len(track):
+                joints[name][keys] = reduced
+                report["errors"][name]["rotation" if is_rotation else "position"] = float(getTrackErrors(track, reduced, is_rotation).max())
+
+    report["size"] = getAnimSize(data)
+    report["fits"] = report["size"] <= max_size
+    return report
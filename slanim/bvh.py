@@ -0,0 +1,366 @@
+"""
+BVH motion capture files.
+
+parseBVH reads the hierarchy and the motion of a .bvh file. BVHPlan maps its
+joints onto the SL skeleton and computes the same rest relative transforms as
+the exporter does on an armature imported from the file. BVH joints have no
+rest rotation, so the rotation of a joint is its rotation in the space of its
+parent, and its position the position of its head in that space. Joints that
+are not SL joints are not exported, their motion is carried by the SL joints
+below them. The BVH space, Y up with the character facing Z, is turned into
+the SL space, Z up facing X, the way the Blender importer and the exporter
+turn it.
+
+The frames are converted a window at a time, every joint at once.
+"""
+
+import numpy as np
+
+from . import posemath
+from .anim import getClipDictionary
+from .skeleton import SL_BONES, SIDES, FINGERS, getHierarchyIssues
+from .tracks import ROTATION_COMPONENTS, POSITION_COMPONENTS, JointTrack, getEmptyTrack
+
+# BVH space to SL space: x, y, z becomes z, x, y
+BVH_ROTATION = np.array([
+    [0.0, 0.0, 1.0, 0.0],
+    [1.0, 0.0, 0.0, 0.0],
+    [0.0, 1.0, 0.0, 0.0],
+    [0.0, 0.0, 0.0, 1.0]
+])
+
+# Frames converted at once
+BVH_WINDOW = 1024
+
+
+def getBVHAliases():
+    """Returns the SL joint of the usual joint names of mocap skeletons (Mixamo, CMU, Rokoko...)."""
+    aliases = {
+        "Hips": "mPelvis",
+        "Pelvis": "mPelvis",
+        "Spine": "mTorso",
+        "Spine1": "mChest",
+        "Chest": "mChest",
+        "Neck": "mNeck",
+        "Head": "mHead",
+    }
+    for side in SIDES:
+        for names, joint in (
+            (("Shoulder", "Collar", "Clavicle"), "mCollar"),
+            (("Arm", "UpArm", "UpperArm"), "mShoulder"),
+            (("ForeArm", "LowArm", "LowerArm"), "mElbow"),
+            (("Hand",), "mWrist"),
+            (("UpLeg", "Thigh", "Hip", "UpperLeg"), "mHip"),
+            (("Leg", "Shin", "Knee", "LowLeg", "LowerLeg"), "mKnee"),
+            (("Foot", "Ankle"), "mAnkle"),
+            (("ToeBase", "Toe"), "mFoot"),
+            (("Toe_End", "ToeEnd"), "mToe"),
+        ):
+            for name in names:
+                aliases[side + name] = joint + side
+        for finger in FINGERS:
+            for i in (1, 2, 3):
+                aliases["%sHand%s%d" % (side, finger, i)] = "mHand%s%d%s" % (finger, i, side)
+    return aliases
+
+
+BVH_ALIASES = getBVHAliases()
+
+
+def getSLName(name, mapping=None):
+    """
+    Returns the SL joint a BVH joint is mapped to, or None. mapping is checked
+    first, then the SL names and BVH_ALIASES, with and without the namespace
+    of the name ("mixamorig:Hips"). An empty name in mapping leaves the joint out.
+    """
+    for key in (name, name.rpartition(":")[2]):
+        if mapping and key in mapping:
+            return mapping[key] or None
+        if key in SL_BONES:
+            return key
+        if key in BVH_ALIASES:
+            return BVH_ALIASES[key]
+    return None
+
+
+class BVHJoint:
+
+    __slots__ = ("name", "parent", "offset", "channels")
+
+    def __init__(self, name, parent):
+        self.name = name
+        self.parent = parent
+        self.offset = np.zeros(3)
+        # ("position" or "rotation", axis, column of the motion)
+        self.channels = []
+
+    def __repr__(self):
+        return "BVHJoint(%r, %d channels)" % (self.name, len(self.channels))
+
+
+class BVHClip:
+    """The joints of a .bvh file, parents first, and its (frames, channels) motion, in the units of the file and in degrees."""
+
+    __slots__ = ("joints", "frame_time", "motion")
+
+    def __init__(self, joints, frame_time, motion):
+        self.joints = joints
+        self.frame_time = frame_time
+        self.motion = motion
+
+
+def parseBVH(text):
+    """Parses the text of a .bvh file. Raises ValueError on a malformed file."""
+    lines = text.splitlines()
+    joints = []
+    # Joints whose braces are open, -1 for an end site
+    stack = []
+    pending = None
+    columns = 0
+
+    motion_start = None
+    for number, line in enumerate(lines, 1):
+        words = line.split()
+        if not words or "HIERARCHY" == words[0]:
+            continue
+        keyword = words[0]
+        try:
+            if "MOTION" == keyword and joints and not stack:
+                motion_start = number
+                break
+            elif keyword in ("ROOT", "JOINT") and len(words) > 1 and ("ROOT" == keyword) == (not stack) and -1 not in stack[-1:]:
+                joints.append(BVHJoint(" ".join(words[1:]), stack[-1] if stack else -1))
+                pending = len(joints) - 1
+            elif "End" == keyword and stack:
+                pending = -1
+            elif "{" == keyword and pending is not None:
+                stack.append(pending)
+                pending = None
+            elif "}" == keyword and stack:
+                stack.pop()
+            elif "OFFSET" == keyword and stack and 4 == len(words):
+                if stack[-1] >= 0:
+                    joints[stack[-1]].offset = np.array([float(word) for word in words[1:]])
+            elif "CHANNELS" == keyword and stack and stack[-1] >= 0 and int(words[1]) == len(words) - 2:
+                for channel in words[2:]:
+                    axis, kind = channel[0].upper(), channel[1:].lower()
+                    if axis not in posemath.AXES or kind not in ("position", "rotation"):
+                        raise ValueError(channel)
+                    joints[stack[-1]].channels.append((kind, axis, columns))
+                    columns += 1
+            else:
+                raise ValueError(keyword)
+        except (ValueError, IndexError):
+            raise ValueError("line %d: unexpected '%s'" % (number, line.strip()))
+
+    if motion_start is None:
+        raise ValueError("no MOTION after the hierarchy")
+    if not columns:
+        raise ValueError("no joint has channels")
+
+    header = {}
+    index = motion_start
+    for key in ("Frames", "Frame Time"):
+        while index < len(lines) and not lines[index].strip():
+            index += 1
+        name, colon, value = lines[index].partition(":") if index < len(lines) else ("", "", "")
+        try:
+            if key != name.strip():
+                raise ValueError(name)
+            header[key] = float(value)
+        except ValueError:
+            raise ValueError("line %d: expected '%s: value'" % (index + 1, key))
+        index += 1
+    if header["Frame Time"] <= 0.0:
+        raise ValueError("line %d: the frame time is not positive" % index)
+
+    try:
+        motion = np.array(" ".join(lines[index:]).split(), dtype=np.float64)
+    except ValueError:
+        raise ValueError("the motion has values that are not numbers")
+    if not len(motion) or len(motion) % columns:
+        raise ValueError("the motion does not have %d values on every frame" % columns)
+    motion = motion.reshape(-1, columns)[:max(1, int(header["Frames"]))]
+
+    return BVHClip(joints, header["Frame Time"], motion)
+
+
+def loadBVH(filepath):
+    with open(filepath) as f_bvh:
+        return parseBVH(f_bvh.read())
+
+
+class BVHPlan:
+    """
+    Everything the conversion of a clip needs that does not change from one frame to the next.
+
+    Every joint mapped to an SL joint is exported relative to its nearest
+    mapped ancestor, with the joints in between folded into it. It gets a
+    rotation track when any of them rotates, and a position track, for
+    mPelvis or with_translations, when any of them moves its head. issues
+    lists the joints mapped twice and the SL joints with the wrong parent.
+    """
+
+    def __init__(self, clip, with_translations, scale=1.0, mapping=None):
+        self.clip = clip
+        self.scale = scale
+        self.issues = []
+        joints = clip.joints
+
+        mapped = {}
+        for i, joint in enumerate(joints):
+            name = getSLName(joint.name, mapping)
+            if name is None:
+                continue
+            if name in mapped.values():
+                self.issues.append("%s is mapped to %s, which is already taken" % (joint.name, name))
+                continue
+            mapped[i] = name
+
+        # Exported joints in file order, the BVH joints they are made of and their mapped ancestors
+        self.names = []
+        self.indices = []
+        self.ancestor_indices = []
+        self.rotated = []
+        self.moved = []
+        parents = {}
+        for i, name in mapped.items():
+            folded = [i]
+            ancestor = joints[i].parent
+            while ancestor >= 0 and ancestor not in mapped:
+                folded.append(ancestor)
+                ancestor = joints[ancestor].parent
+            parents[name] = mapped.get(ancestor)
+
+            kinds = [{kind for kind, axis, column in joints[j].channels} for j in folded]
+            rotated = any("rotation" in joint_kinds for joint_kinds in kinds)
+            moved = any("position" in joint_kinds for joint_kinds in kinds) or any("rotation" in joint_kinds for joint_kinds in kinds[1:])
+            moved = moved and ('mPelvis' == name or with_translations)
+            if rotated or moved:
+                self.names.append(name)
+                self.indices.append(i)
+                self.ancestor_indices.append(ancestor)
+                self.rotated.append(rotated)
+                self.moved.append(moved)
+        self.issues += getHierarchyIssues(parents)
+
+        self.depths = {}
+        for name in parents:
+            depth, parent = 0, parents[name]
+            while parent is not None:
+                depth, parent = depth + 1, parents[parent]
+            self.depths[name] = depth
+
+        # Rest heads, in the units of the file times scale
+        self.offsets = np.array([joint.offset for joint in joints]).reshape(-1, 3) * scale
+        self.heads = self.offsets.copy()
+        for i, joint in enumerate(joints):
+            if joint.parent >= 0:
+                self.heads[i] += self.heads[joint.parent]
+        # Same as the exporter, the mPelvis positions are relative to half the rest head of the
+        # first joint, taken in the armature space of the Blender importer: x, y, z becomes x, -z, y
+        self.offset = self.heads[0][[0, 2, 1]] * (0.5, -0.5, 0.5)
+
+        # Joints sharing an order of rotation channels are turned into matrices at once
+        self.rotation_groups = {}
+        position_channels = []
+        for i, joint in enumerate(joints):
+            axes = tuple(axis for kind, axis, column in joint.channels if "rotation" == kind)
+            if axes:
+                indices, columns = self.rotation_groups.setdefault(axes, ([], []))
+                indices.append(i)
+                columns.append([column for kind, axis, column in joint.channels if "rotation" == kind])
+            position_channels += [(i, posemath.AXES[axis], column) for kind, axis, column in joint.channels if "position" == kind]
+        self.position_joints, self.position_axes, self.position_columns = (
+            np.array(values, dtype=np.int64) for values in zip(*position_channels)
+        ) if position_channels else (np.zeros(0, dtype=np.int64),) * 3
+
+        # Joints by depth, each level is multiplied by the one above at once
+        depths = []
+        for joint in joints:
+            depths.append(depths[joint.parent] + 1 if joint.parent >= 0 else 0)
+        self.levels = [
+            np.array([i for i, depth in enumerate(depths) if depth == level], dtype=np.int64)
+            for level in range(1, max(depths) + 1)
+        ]
+        self.level_parents = [np.array([joints[i].parent for i in level], dtype=np.int64) for level in self.levels]
+
+    def getGlobalTransforms(self, motion):
+        """Returns the (frames, joints, 4, 4) transforms of every joint in BVH space, from (frames, channels) motion."""
+        frames = len(motion)
+        count = len(self.clip.joints)
+
+        locations = np.array(np.broadcast_to(self.offsets, (frames, count, 3)))
+        locations[:, self.position_joints, self.position_axes] = motion[:, self.position_columns] * self.scale
+
+        rotations = np.array(np.broadcast_to(np.identity(3), (frames, count, 3, 3)))
+        for axes, (indices, columns) in self.rotation_groups.items():
+            eulers = np.zeros((frames, len(indices), 3))
+            for k, axis in enumerate(axes):
+                eulers[..., posemath.AXES[axis]] = motion[:, [joint_columns[k] for joint_columns in columns]]
+            # The first channel is the outermost rotation, so it is applied last
+            rotations[:, indices] = posemath.getMatricesFromEulers(np.radians(eulers), "".join(reversed(axes)))
+
+        mats = posemath.getMatricesLocRotScale(locations, rotations, np.ones(3))
+        for level, parents in zip(self.levels, self.level_parents):
+            mats[:, level] = mats[:, parents] @ mats[:, level]
+        return mats
+
+    def getLocalTransforms(self, motion):
+        """Computes the rest relative transforms of the exported joints, in SL space, from (frames, channels) motion."""
+        global_mats = self.getGlobalTransforms(motion)
+        # Roots point to the identity matrix appended after the joints
+        identity = np.broadcast_to(np.identity(4), (len(motion), 1, 4, 4))
+        global_mats = np.concatenate((global_mats, identity), axis=1)
+        ancestor_mats = global_mats[:, self.ancestor_indices]
+        mats = np.array(global_mats[:, self.indices])
+
+        # The transforms are rigid: the inverse of an ancestor is its transposed rotation
+        inverted = np.swapaxes(ancestor_mats[..., :3, :3], -1, -2)
+        mats[..., :3, 3] = (inverted @ (mats[..., :3, 3] - ancestor_mats[..., :3, 3])[..., None])[..., 0]
+        mats[..., :3, :3] = inverted @ mats[..., :3, :3]
+        return BVH_ROTATION @ mats @ BVH_ROTATION.T
+
+    def getJoints(self, priority):
+        """Returns the exported joints, with a key on every frame of the clip."""
+        motion = self.clip.motion
+        frames = len(motion)
+        times = posemath.getFrameTimes(0, frames - 1, range(frames))
+
+        quats = np.empty((frames, len(self.names), 4))
+        locs = np.empty((frames, len(self.names), 3))
+        for start in range(0, frames, BVH_WINDOW):
+            mats = self.getLocalTransforms(motion[start:start + BVH_WINDOW])
+            quats[start:start + BVH_WINDOW] = posemath.getQuaternionsFromMatrices(mats)
+            locs[start:start + BVH_WINDOW] = mats[..., :3, 3] * 0.5
+
+        joints = {}
+        for j, name in enumerate(self.names):
+            joint_locs = locs[:, j] - self.offset if 'mPelvis' == name else locs[:, j]
+            joints[name] = {
+                "priority": priority,
+                "position_keys": JointTrack(times, joint_locs, POSITION_COMPONENTS) if self.moved[j] else getEmptyTrack(POSITION_COMPONENTS),
+                "rotation_keys": JointTrack(times, quats[:, j], ROTATION_COMPONENTS) if self.rotated[j] else getEmptyTrack(ROTATION_COMPONENTS)
+            }
+        return joints
+
+    def getRestPositions(self):
+        """Returns the position keys of the exported joints at rest."""
+        heads = np.concatenate((self.heads, np.zeros((1, 3))))
+        positions = (heads[self.indices] - heads[self.ancestor_indices]) @ BVH_ROTATION[:3, :3].T * 0.5
+        return {name: positions[j] - self.offset if 'mPelvis' == name else positions[j] for j, name in enumerate(self.names)}
+
+    def getDepths(self):
+        return {name: self.depths[name] for name in self.names}
+
+
+def convertBVHToDictionary(plan, priority, loop, loop_start, loop_end, ease_in_duration, ease_out_duration):
+    """Returns the dictionary of a whole clip, loop_start and loop_end are frames of the clip counted from 0."""
+    frame_time = plan.clip.frame_time
+    last = len(plan.clip.motion) - 1
+    loop_start = max(loop_start, 0)
+    loop_end = min(loop_end, last)
+    return getClipDictionary(
+        priority, last * frame_time, loop, loop_start * frame_time, loop_end * frame_time,
+        ease_in_duration, ease_out_duration, plan.getJoints(priority)
+    )
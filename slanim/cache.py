@@ -0,0 +1,102 @@
+"""
+Persistent cache of sampled tracks.
+
+Entries are stored under the hash of everything that was used to sample
+them, so an entry never has to be invalidated: when a bone changes, its hash
+changes and the old entry is simply never read again, until it is evicted.
+The cache is kept under a size budget by removing the least recently used
+entries first.
+"""
+
+import os
+import hashlib
+import tempfile
+import numpy as np
+
+from .tracks import JointTrack
+
+# Bump when the sampling or the entry format changes, so old entries are ignored
+CACHE_VERSION = 2
+CACHE_SIZE = 256 * 1024 * 1024
+
+
+class SampleHasher:
+    """Accumulates the inputs of a track into a key."""
+
+    def __init__(self, *values):
+        self.hash = hashlib.sha1(b"sl_anim_cache %d" % CACHE_VERSION)
+        self.update(*values)
+
+    def update(self, *values):
+        for value in values:
+            if isinstance(value, np.ndarray):
+                self.hash.update(b"%s%s" % (value.dtype.str.encode(), str(value.shape).encode()))
+                self.hash.update(np.ascontiguousarray(value).tobytes())
+            else:
+                self.hash.update(repr(value).encode())
+            self.hash.update(b"\0")
+        return self
+
+    def getKey(self):
+        return self.hash.hexdigest()
+
+
+class SampleCache:
+
+    def __init__(self, directory, max_size=CACHE_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def getPath(self, key):
+        return os.path.join(self.directory, key + ".npz")
+
+    def load(self, key, components):
+        """Returns the track stored under this key, or None."""
+        path = self.getPath(key)
+        try:
+            with np.load(path) as entry:
+                track = JointTrack(entry["times"], entry["values"], components)
+        except (OSError, KeyError, ValueError):
+            self.misses += 1
+            return None
+        # The modification time is the last use, for the eviction
+        os.utime(path)
+        self.hits += 1
+        return track
+
+    def store(self, key, track):
+        """Stores a track under this key. Entries are written under a temporary name, then renamed."""
+        handle, temp_path = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+        with os.fdopen(handle, 'wb') as f_entry:
+            np.savez(f_entry, times=track.times, values=track.values)
+        os.replace(temp_path, self.getPath(key))
+
+    def getEntries(self):
+        """Returns (last use, size, path) for every entry, least recently used first."""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".npz"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        entries.sort()
+        return entries
+
+    def evict(self):
+        """Removes the least recently used entries until the cache fits in its budget."""
+        entries = self.getEntries()
+        size = sum(entry[1] for entry in entries)
+        for _, entry_size, path in entries:
+            if size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            size -= entry_size
+
+    def clear(self):
+        for _, _, path in self.getEntries():
+            os.remove(path)
@@ -0,0 +1,114 @@
+"""
+Comparison of clips.
+
+Tracks are compared the way the viewer plays them: both are interpolated,
+by slerp for rotations and lerp for positions, at every time where either
+of them has a key, and the error is measured at these times.
+"""
+
+import numpy as np
+
+from .tracks import ROTATION_COMPONENTS, POSITION_COMPONENTS, getTrack
+from .reduction import getRotationErrors, getPositionErrors
+
+HEADER_FIELDS = (
+    "version", "sub_version", "base_priority", "duration", "emote_name", "loop",
+    "loop_in_point", "loop_out_point", "ease_in_duration", "ease_out_duration", "hand_pose"
+)
+
+
+def getSegments(times, at):
+    """Returns the index of the key before every time of `at`, and the factor towards the next key."""
+    times = np.asarray(times, dtype=np.float64)
+    indices = np.clip(np.searchsorted(times, at, side='right') - 1, 0, len(times) - 2)
+    span = times[indices + 1] - times[indices]
+    factors = np.clip((at - times[indices]) / np.where(span > 0, span, 1.0), 0.0, 1.0)
+    return indices, factors
+
+
+def interpolateRotations(times, quats, at):
+    """Slerps (N, 4) quaternions keyed at `times` for every time of `at`."""
+    quats = np.asarray(quats, dtype=np.float64)
+    quats = quats / np.linalg.norm(quats, axis=1, keepdims=True)
+    if 1 == len(quats):
+        return np.repeat(quats, len(at), axis=0)
+    indices, factors = getSegments(times, at)
+    q0, q1 = quats[indices], quats[indices + 1]
+    dots = np.sum(q0 * q1, axis=1)
+    q1 = np.where(dots[:, None] < 0, -q1, q1)
+    theta = np.arccos(np.clip(np.abs(dots), 0.0, 1.0))
+    sin = np.sin(theta)
+    close = sin < 1e-6
+    sin = np.where(close, 1.0, sin)
+    w0 = np.where(close, 1.0 - factors, np.sin((1.0 - factors) * theta) / sin)
+    w1 = np.where(close, factors, np.sin(factors * theta) / sin)
+    result = w0[:, None] * q0 + w1[:, None] * q1
+    return result / np.linalg.norm(result, axis=1, keepdims=True)
+
+
+def interpolatePositions(times, locs, at):
+    """Lerps (N, 3) positions keyed at `times` for every time of `at`."""
+    locs = np.asarray(locs, dtype=np.float64)
+    if 1 == len(locs):
+        return np.repeat(locs, len(at), axis=0)
+    indices, factors = getSegments(times, at)
+    return locs[indices] + (locs[indices + 1] - locs[indices]) * factors[:, None]
+
+
+def getTrackErrors(track_a, track_b, is_rotation):
+    """Returns the errors between two tracks at every time where either has a key, or None if one of them is empty."""
+    if not len(track_a) or not len(track_b):
+        return None
+    at = np.union1d(track_a.times, track_b.times).astype(np.float64)
+    if is_rotation:
+        return getRotationErrors(
+            interpolateRotations(track_a.times, track_a.values, at),
+            interpolateRotations(track_b.times, track_b.values, at)
+        )
+    return getPositionErrors(
+        interpolatePositions(track_a.times, track_a.values, at),
+        interpolatePositions(track_b.times, track_b.values, at)
+    )
+
+
+def isSameValue(value_a, value_b):
+    """Floats of the file are 32 bits, so they are only compared to the precision of a float32."""
+    if isinstance(value_a, float) or isinstance(value_b, float):
+        return value_a is not None and value_b is not None and abs(value_a - value_b) <= 1e-6 * max(1.0, abs(value_a))
+    return value_a == value_b
+
+
+def compareClips(data_a, data_b):
+    """
+    Compares two clip dictionaries.
+
+    Returns the header fields that differ, as {field: (a, b)}, and one entry
+    per joint of either clip with the key counts and the max and mean errors,
+    rotation errors in radians. Errors are None when a track is missing from
+    one of the clips.
+    """
+    header = {
+        field: (data_a.get(field), data_b.get(field))
+        for field in HEADER_FIELDS
+        if not isSameValue(data_a.get(field), data_b.get(field))
+    }
+
+    joints = {}
+    for name in list(data_a["joints"]) + [name for name in data_b["joints"] if name not in data_a["joints"]]:
+        joint_a = data_a["joints"].get(name)
+        joint_b = data_b["joints"].get(name)
+        entry = {"in_a": joint_a is not None, "in_b": joint_b is not None}
+        for keys, components, is_rotation in (
+            ("rotation_keys", ROTATION_COMPONENTS, True),
+            ("position_keys", POSITION_COMPONENTS, False),
+        ):
+            track_a = getTrack(joint_a[keys], components) if joint_a else None
+            track_b = getTrack(joint_b[keys], components) if joint_b else None
+            channel = keys.split("_")[0]
+            entry[channel + "_keys"] = (len(track_a) if track_a else 0, len(track_b) if track_b else 0)
+            errors = getTrackErrors(track_a, track_b, is_rotation) if track_a and track_b else None
+            entry[channel + "_max"] = float(errors.max()) if errors is not None else None
+            entry[channel + "_mean"] = float(errors.mean()) if errors is not None else None
+        joints[name] = entry
+
+    return header, joints
@@ -0,0 +1,59 @@
+"""
+Mirrored clips.
+
+The SL avatar is symmetric about the plane of its X (forward) and Z (up)
+axes. Reflecting a clip about that plane swaps the left and right joints and
+flips Y: positions become (x, -y, z) and rotations (w, -x, y, -z), the
+rotations about X and Z turning the other way. The mPelvis positions are
+stored relative to the rest position of the armature, which is flipped with
+them, so a rig whose pelvis is off the plane mirrors to the other side. The
+mirrored clip is made from the tracks of the exported one, without sampling
+again.
+"""
+
+import numpy as np
+
+from .skeleton import SL_MIRRORS
+from .tracks import ROTATION_COMPONENTS, POSITION_COMPONENTS, JointTrack, getTrack
+
+MIRROR_ROTATION = np.array([1.0, -1.0, 1.0, -1.0])
+MIRROR_POSITION = np.array([1.0, -1.0, 1.0])
+
+
+def getMirroredTrack(track, is_rotation, offset=0.0):
+    """Returns the mirrored copy of a track. offset is the position subtracted from the positions, which is not mirrored with them."""
+    components = ROTATION_COMPONENTS if is_rotation else POSITION_COMPONENTS
+    track = getTrack(track, components)
+    if is_rotation:
+        return JointTrack(track.times, track.values * MIRROR_ROTATION, components)
+    return JointTrack(track.times, (track.values + offset) * MIRROR_POSITION - offset, components)
+
+
+def getMirroredJoints(joints, offset=0.0):
+    """
+    Returns the joints of the mirrored clip: every joint takes the mirrored
+    tracks of the joint on the other side. offset is the rest position
+    subtracted from the mPelvis positions, which is mirrored as part of them.
+    """
+    return {
+        SL_MIRRORS.get(name, name): dict(
+            joint,
+            rotation_keys=getMirroredTrack(joint["rotation_keys"], True),
+            position_keys=getMirroredTrack(joint["position_keys"], False, offset if 'mPelvis' == name else 0.0)
+        )
+        for name, joint in joints.items()
+    }
+
+
+def getMirroredValues(values):
+    """Returns a {joint name: value} dictionary for the mirrored joints, like the depths or the rest positions of the joints."""
+    return {SL_MIRRORS.get(name, name): value for name, value in values.items()}
+
+
+def getMirroredPositions(positions, offset=0.0):
+    """Returns the mirrored rest positions of the joints, offset being subtracted from the mPelvis one as in getMirroredJoints."""
+    mirrored = {}
+    for name, position in positions.items():
+        joint_offset = offset if 'mPelvis' == name else 0.0
+        mirrored[SL_MIRRORS.get(name, name)] = (np.asarray(position) + joint_offset) * MIRROR_POSITION - joint_offset
+    return mirrored
@@ -0,0 +1,48 @@
+"""
+Export options.
+
+ExportOptions holds everything the user picks for an export, so that the
+stages of the export and the tools driving them pass one object instead of
+a long list of positional arguments. The settings of a variant, see
+variants.VARIANT_SETTINGS, are fields of the same name, and the options of a
+variant are the options of the export with them replaced.
+"""
+
+from dataclasses import dataclass, field, replace
+from math import radians
+
+
+@dataclass
+class ExportOptions:
+    priority: int = 4
+    loop: bool = False
+    # Frames of the scene, clamped to the exported range
+    loop_start: int = 0
+    loop_end: int = 0
+    # Seconds
+    ease_in: float = 0.0
+    ease_out: float = 0.0
+    with_translations: bool = False
+    mirror: bool = False
+
+    sampling: str = 'SCENE'
+    isolate: bool = False
+    # 'DUPLICATES' or 'TOLERANCE', None keeps every sampled key
+    key_reduction: str = 'DUPLICATES'
+    # Radians and meters, the base of the search with a max_size in bytes
+    rotation_tolerance: float = radians(0.5)
+    position_tolerance: float = 0.001
+    max_size: int = None
+    # As returned by parseVariants
+    variants: list = field(default_factory=list)
+
+    dump_json: bool = False
+    dump_format: str = 'JSON'
+
+    def getVariant(self, variant):
+        """Returns the options of a variant of the export."""
+        return replace(self, variants=[], **{setting: value for setting, value in variant.items() if "name" != setting})
+
+    def getSampledTranslations(self):
+        """Returns whether the export or any of its variants has translations, which are then sampled once for all of them."""
+        return self.with_translations or any(self.getVariant(variant).with_translations for variant in self.variants)
@@ -0,0 +1,86 @@
+"""
+Worker lanes for the export stages that do not need Blender.
+
+Sampling has to run on the main thread of Blender, but reducing the sampled
+windows, encoding and dumping the JSON only work on numpy arrays and Python
+objects. A Pipeline runs them in worker threads while the main thread goes on
+sampling. Tasks of the same lane run one after the other, in the order they
+were submitted, which keeps the windows of a track in order; different lanes
+run at the same time. numpy releases the GIL for most of the work, and
+threads, unlike processes, share the arrays and the add-on modules.
+
+With no workers, tasks run right away on the calling thread.
+"""
+
+import os
+import time
+from collections import deque
+from concurrent import futures
+
+
+def getDefaultWorkers():
+    """Returns the number of workers to use, leaving one core to Blender."""
+    return max(1, min(4, (os.cpu_count() or 2) - 1))
+
+
+def runTask(func, args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+class Pipeline:
+
+    def __init__(self, workers=0, profiler=None, max_pending=None):
+        self.lanes = [futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="sl_anim_%d" % i) for i in range(workers)]
+        self.profiler = profiler
+        # Bounds the sampled windows waiting for a worker when sampling is faster than reduction
+        self.max_pending = max_pending if max_pending is not None else 8 * max(1, workers)
+        self.pending = deque()
+
+    @property
+    def workers(self):
+        """Number of lanes to spread tasks over, 1 when tasks run on the calling thread."""
+        return max(1, len(self.lanes))
+
+    def addTime(self, stage, seconds):
+        if self.profiler:
+            self.profiler.addSeconds(stage, seconds)
+
+    def submit(self, lane, stage, func, *args):
+        """Runs func(*args) after the tasks already submitted to the lane, and adds its time to a profiler stage."""
+        if not self.lanes:
+            seconds, result = runTask(func, args)
+            self.addTime(stage, seconds)
+            return
+        self.pending.append((stage, self.lanes[lane % len(self.lanes)].submit(runTask, func, args)))
+        self.wait(self.max_pending)
+
+    def wait(self, count=0):
+        """Waits until no more than count tasks are pending, oldest first. Raises the error of a failed task."""
+        while len(self.pending) > count:
+            stage, future = self.pending.popleft()
+            seconds, result = future.result()
+            self.addTime(stage, seconds)
+
+    def isDone(self, timeout=0):
+        """Collects the finished tasks, waiting at most timeout seconds for the oldest one. Returns True when none is left."""
+        if self.pending:
+            futures.wait([self.pending[0][1]], timeout)
+        while self.pending and self.pending[0][1].done():
+            self.wait(len(self.pending) - 1)
+        return not self.pending
+
+    def close(self, cancel=False):
+        """Stops the workers. Pending tasks are dropped when cancelling, waited for otherwise."""
+        if not cancel:
+            self.wait()
+        for lane in self.lanes:
+            lane.shutdown(wait=True, cancel_futures=cancel)
+        self.pending.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(cancel=exc_type is not None)
@@ -0,0 +1,143 @@
+"""
+Batched pose math.
+
+All functions work on stacks of matrices, usually (frames, bones, 4, 4)
+arrays, and follow the conventions of Blender's mathutils: matrices are
+indexed by row and multiply column vectors.
+"""
+
+import numpy as np
+
+AXES = {"X": 0, "Y": 1, "Z": 2}
+
+
+def getMatricesFromQuaternions(quats):
+    """Converts (..., 4) w, x, y, z quaternions to (..., 3, 3) rotation matrices. Quaternions are normalized first."""
+    quats = np.asarray(quats, dtype=np.float64)
+    length = np.linalg.norm(quats, axis=-1, keepdims=True)
+    quats = np.where(length > 0.0, quats / np.where(length > 0.0, length, 1.0), (1.0, 0.0, 0.0, 0.0))
+    w, x, y, z = np.moveaxis(quats, -1, 0)
+
+    mats = np.empty(quats.shape[:-1] + (3, 3))
+    mats[..., 0, 0] = 1.0 - 2.0 * (y * y + z * z)
+    mats[..., 0, 1] = 2.0 * (x * y - w * z)
+    mats[..., 0, 2] = 2.0 * (x * z + w * y)
+    mats[..., 1, 0] = 2.0 * (x * y + w * z)
+    mats[..., 1, 1] = 1.0 - 2.0 * (x * x + z * z)
+    mats[..., 1, 2] = 2.0 * (y * z - w * x)
+    mats[..., 2, 0] = 2.0 * (x * z - w * y)
+    mats[..., 2, 1] = 2.0 * (y * z + w * x)
+    mats[..., 2, 2] = 1.0 - 2.0 * (x * x + y * y)
+    return mats
+
+
+def getMatricesFromAxisAngles(axis_angles):
+    """Converts (..., 4) angle, x, y, z axis angle rotations to (..., 3, 3) rotation matrices."""
+    axis_angles = np.asarray(axis_angles, dtype=np.float64)
+    angles = axis_angles[..., 0]
+    axes = axis_angles[..., 1:]
+    length = np.linalg.norm(axes, axis=-1, keepdims=True)
+    axes = np.where(length > 0.0, axes / np.where(length > 0.0, length, 1.0), (0.0, 1.0, 0.0))
+    quats = np.concatenate((np.cos(angles / 2)[..., None], axes * np.sin(angles / 2)[..., None]), axis=-1)
+    return getMatricesFromQuaternions(quats)
+
+
+def getMatricesFromEulers(eulers, order):
+    """Converts (..., 3) euler angles to (..., 3, 3) rotation matrices. The first axis of `order` is applied first."""
+    eulers = np.asarray(eulers, dtype=np.float64)
+    mats = np.broadcast_to(np.identity(3), eulers.shape[:-1] + (3, 3))
+    for axis in order:
+        angle = eulers[..., AXES[axis]]
+        cos, sin = np.cos(angle), np.sin(angle)
+        rot = np.zeros(eulers.shape[:-1] + (3, 3))
+        i = AXES[axis]
+        j, k = (i + 1) % 3, (i + 2) % 3
+        rot[..., i, i] = 1.0
+        rot[..., j, j] = cos
+        rot[..., j, k] = -sin
+        rot[..., k, j] = sin
+        rot[..., k, k] = cos
+        mats = rot @ mats
+    return mats
+
+
+def getMatricesLocRotScale(locations, rotations, scales):
+    """Builds (..., 4, 4) matrices from (..., 3) locations, (..., 3, 3) rotations and (..., 3) scales."""
+    rotations = np.asarray(rotations, dtype=np.float64)
+    mats = np.zeros(rotations.shape[:-2] + (4, 4))
+    mats[..., :3, :3] = rotations * np.asarray(scales, dtype=np.float64)[..., None, :]
+    mats[..., :3, 3] = locations
+    mats[..., 3, 3] = 1.0
+    return mats
+
+
+def getTranslationMatrices(vectors):
+    """Builds (..., 4, 4) translation matrices from (..., 3) vectors."""
+    vectors = np.asarray(vectors, dtype=np.float64)
+    mats = np.zeros(vectors.shape[:-1] + (4, 4))
+    mats[..., :, :] = np.identity(4)
+    mats[..., :3, 3] = vectors
+    return mats
+
+
+def getQuaternionsFromMatrices(mats):
+    """
+    Converts (..., 3, 3) or (..., 4, 4) matrices to (..., 4) w, x, y, z quaternions.
+
+    Same as Matrix.to_quaternion(): the axes are normalized, negative matrices
+    are flipped, and the result is the canonical quaternion with w >= 0.
+    """
+    mats = np.array(np.asarray(mats, dtype=np.float64)[..., :3, :3])
+    length = np.linalg.norm(mats, axis=-2, keepdims=True)
+    mats = np.where(length > 0.0, mats / np.where(length > 0.0, length, 1.0), mats)
+    mats = np.where((np.linalg.det(mats) < 0.0)[..., None, None], -mats, mats)
+
+    m00, m01, m02 = mats[..., 0, 0], mats[..., 0, 1], mats[..., 0, 2]
+    m10, m11, m12 = mats[..., 1, 0], mats[..., 1, 1], mats[..., 1, 2]
+    m20, m21, m22 = mats[..., 2, 0], mats[..., 2, 1], mats[..., 2, 2]
+
+    quats = np.empty(mats.shape[:-2] + (4,))
+    case_x = (m22 < 0.0) & (m00 > m11)
+    case_y = (m22 < 0.0) & ~case_x
+    case_z = (m22 >= 0.0) & (m00 < -m11)
+    case_w = ~(case_x | case_y | case_z)
+
+    # Each case picks the largest component, the sign keeps w positive
+    for case, big, trace, sign, others in (
+        (case_x, 1, 1.0 + m00 - m11 - m22, m21 < m12, ((0, m21 - m12), (2, m10 + m01), (3, m02 + m20))),
+        (case_y, 2, 1.0 - m00 + m11 - m22, m02 < m20, ((0, m02 - m20), (1, m10 + m01), (3, m21 + m12))),
+        (case_z, 3, 1.0 - m00 - m11 + m22, m10 < m01, ((0, m10 - m01), (1, m02 + m20), (2, m21 + m12))),
+        (case_w, 0, 1.0 + m00 + m11 + m22, np.zeros_like(case_w), ((1, m21 - m12), (2, m02 - m20), (3, m10 - m01))),
+    ):
+        if not case.any():
+            continue
+        s = 2.0 * np.sqrt(trace[case])
+        s = np.where(sign[case], -s, s)
+        quats[case, big] = 0.25 * s
+        s = 1.0 / s
+        for index, values in others:
+            quats[case, index] = values[case] * s
+
+    return quats / np.linalg.norm(quats, axis=-1, keepdims=True)
+
+
+def getLocalTransforms(pose_mats, parent_pose_mats, parent_rest_mats, rest_imats, heads):
+    """
+    Computes the rest relative transform of every joint on every frame.
+
+    pose_mats and parent_pose_mats are (frames, joints, 4, 4) armature space
+    pose matrices, parent_rest_mats and rest_imats are the (joints, 4, 4)
+    rest matrices of the parents and the inverted rest matrices of the joints,
+    heads are the (joints, 3) rest heads. Root joints use identity matrices
+    for their parent. The result is expressed around the head of the joint.
+    """
+    mats = parent_rest_mats @ np.linalg.inv(parent_pose_mats) @ pose_mats @ rest_imats
+    return getTranslationMatrices(-heads) @ mats @ getTranslationMatrices(heads)
+
+
+def getFrameTimes(frame_start, frame_end, frames):
+    """Maps frames of the scene range to the 0..0xFFFF time of the .anim format."""
+    nbr_inter_frames = frame_end - frame_start
+    if nbr_inter_frames <= 0:
+        return np.zeros(len(frames), dtype=np.int64)
+    return np.round((np.asarray(frames, dtype=np.float64) - frame_start) / nbr_inter_frames * 0xFFFF).astype(np.int64)
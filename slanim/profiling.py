@@ -0,0 +1,117 @@
+"""
+Per-stage instrumentation of an export.
+
+An ExportProfiler records, for every named stage, the wall time, the number
+of calls and the keys that went in and out. It can also record the peak
+memory allocated during each stage with tracemalloc, and run a cProfile
+capture around the hot loop. Stages must not be nested. Stages that run in
+worker threads are timed by the workers and added with addSeconds, their
+time can add up to more than the wall time of the export.
+
+The export runs in a `with profiler:` block, which starts tracemalloc and
+stops it when the export ends, whether it finishes, fails or is cancelled.
+"""
+
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+
+class StageStats:
+
+    __slots__ = ("seconds", "calls", "peak_memory", "keys_in", "keys_out")
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.calls = 0
+        self.peak_memory = 0
+        self.keys_in = 0
+        self.keys_out = 0
+
+    def toDict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class ExportProfiler:
+
+    def __init__(self, trace_memory=False, profile=None):
+        self.stages = {}
+        self.trace_memory = trace_memory
+        self.profile = profile
+        self.started_tracing = False
+        self.start = time.perf_counter()
+        self.seconds = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracing = True
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def getStage(self, name):
+        if name not in self.stages:
+            self.stages[name] = StageStats()
+        return self.stages[name]
+
+    @contextmanager
+    def stage(self, name):
+        stats = self.getStage(name)
+        tracing = self.trace_memory and tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+            base_memory = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield stats
+        finally:
+            stats.seconds += time.perf_counter() - start
+            stats.calls += 1
+            if tracing:
+                stats.peak_memory = max(stats.peak_memory, tracemalloc.get_traced_memory()[1] - base_memory)
+
+    @contextmanager
+    def hotLoop(self):
+        """Runs the cProfile capture, if any, around the loop that does most of the work."""
+        if self.profile is None:
+            yield
+            return
+        self.profile.enable()
+        try:
+            yield
+        finally:
+            self.profile.disable()
+
+    def addSeconds(self, name, seconds, calls=1):
+        stats = self.getStage(name)
+        stats.seconds += seconds
+        stats.calls += calls
+
+    def addKeys(self, name, keys_in, keys_out):
+        stats = self.getStage(name)
+        stats.keys_in += keys_in
+        stats.keys_out += keys_out
+
+    def stop(self):
+        """Ends the export. Stops tracemalloc if this profiler started it."""
+        self.seconds = time.perf_counter() - self.start
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+
+    def getStats(self):
+        return {
+            "seconds": self.seconds if self.seconds is not None else time.perf_counter() - self.start,
+            "stages": {name: stats.toDict() for name, stats in self.stages.items()}
+        }
+
+    def getSummary(self, count=3):
+        """Returns a line with the total time and the slowest stages."""
+        stats = self.getStats()
+        slowest = sorted(self.stages.items(), key=lambda item: item[1].seconds, reverse=True)[:count]
+        return "%.2fs: %s" % (stats["seconds"], ", ".join(
+            "%s %.2fs" % (name.replace("_", " "), stage.seconds) for name, stage in slowest
+        ))
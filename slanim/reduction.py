@@ -0,0 +1,281 @@
+"""
+Keyframe reduction.
+
+removeDuplicatedFrames drops the keys that the file would store with the
+same values as both of their neighbours. reduceKeyframes simplifies every
+track of a dictionary with a Douglas-Peucker search: a key is only dropped
+when the viewer can rebuild it from the kept keys around it, by slerp for
+rotations and lerp for positions, within the tolerance of the joint.
+
+The streaming reducers do the same on a track that arrives one window of
+frames at a time, and hand back the keys as soon as they are decided.
+"""
+
+import numpy as np
+
+from .anim import quantizeRotations, quantizePositions
+from .tracks import ROTATION_COMPONENTS, POSITION_COMPONENTS, JointTrack, getTrack
+
+
+def getDuplicatedMask(quantized):
+    """Returns which of the (N, 3) quantized keys are equal to both of their neighbours."""
+    same = np.all(quantized[1:] == quantized[:-1], axis=1)
+    mask = np.zeros(len(quantized), dtype=bool)
+    mask[1:-1] = same[:-1] & same[1:]
+    return mask
+
+
+def removeDuplicatedFrames(data):
+    """Drops the keys that encode to the same U16 values as both of their neighbours."""
+    for joint in data['joints'].values():
+        track = getTrack(joint['rotation_keys'], ROTATION_COMPONENTS)
+        if len(track) >= 3:
+            track = track[~getDuplicatedMask(quantizeRotations(track.values))]
+        joint['rotation_keys'] = track
+
+        track = getTrack(joint['position_keys'], POSITION_COMPONENTS)
+        if len(track) >= 3:
+            track = track[~getDuplicatedMask(quantizePositions(track.values))]
+        joint['position_keys'] = track
+
+    return data
+
+
+def slerp(q0, q1, factors):
+    """Interpolates between two w, x, y, z quaternions along the shortest path, for (N,) factors."""
+    dot = np.dot(q0, q1)
+    if dot < 0.0:
+        q1 = -q1
+        dot = -dot
+    factors = np.asarray(factors, dtype=np.float64)[:, None]
+    if dot > 0.9995:
+        quats = q0 + (q1 - q0) * factors
+        return quats / np.linalg.norm(quats, axis=1, keepdims=True)
+    theta = np.arccos(dot)
+    return (np.sin((1.0 - factors) * theta) * q0 + np.sin(factors * theta) * q1) / np.sin(theta)
+
+
+def getRotationErrors(quats, rebuilt):
+    """Returns the angles in radians between (N, 4) quaternions and their rebuilt values."""
+    dots = np.abs(np.sum(quats * rebuilt, axis=1))
+    return 2.0 * np.arccos(np.clip(dots, 0.0, 1.0))
+
+
+def getPositionErrors(locs, rebuilt):
+    """Returns the distances between (N, 3) positions and their rebuilt values."""
+    return np.linalg.norm(locs - rebuilt, axis=1)
+
+
+def getSegmentErrors(times, values, first, last, is_rotation):
+    """Returns the errors of the keys between first and last when they are rebuilt from these two keys."""
+    inner = slice(first + 1, last)
+    span = times[last] - times[first]
+    factors = (times[inner] - times[first]) / span if span > 0 else np.zeros(last - first - 1)
+    if is_rotation:
+        return getRotationErrors(values[inner], slerp(values[first], values[last], factors))
+    rebuilt = values[first] + (values[last] - values[first]) * factors[:, None]
+    return getPositionErrors(values[inner], rebuilt)
+
+
+def getReducedIndices(times, values, tolerance, is_rotation):
+    """Returns the sorted indices of the keys to keep so that every dropped key is within tolerance."""
+    count = len(times)
+    if count <= 2:
+        return np.arange(count)
+
+    times = np.asarray(times, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    keep = np.zeros(count, dtype=bool)
+    keep[0] = keep[-1] = True
+
+    segments = [(0, count - 1)]
+    while segments:
+        first, last = segments.pop()
+        if last - first < 2:
+            continue
+
+        errors = getSegmentErrors(times, values, first, last, is_rotation)
+        worst = int(np.argmax(errors))
+        if errors[worst] > tolerance:
+            split = first + 1 + worst
+            keep[split] = True
+            segments.append((first, split))
+            segments.append((split, last))
+
+    return np.flatnonzero(keep)
+
+
+def getKeyImportances(times, values, is_rotation):
+    """
+    Returns the importance of every key: getReducedIndices keeps exactly the
+    keys whose importance is above the tolerance. Both ends are always kept.
+
+    The keys are split in the same order whatever the tolerance, a key is
+    kept when its own error and the errors of the splits above it are all
+    above the tolerance, so its importance is the smallest of them.
+    """
+    count = len(times)
+    importances = np.full(count, np.inf)
+    if count <= 2:
+        return importances
+
+    times = np.asarray(times, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+
+    segments = [(0, count - 1, np.inf)]
+    while segments:
+        first, last, bound = segments.pop()
+        if last - first < 2:
+            continue
+
+        errors = getSegmentErrors(times, values, first, last, is_rotation)
+        split = first + 1 + int(np.argmax(errors))
+        importances[split] = min(bound, errors[split - first - 1])
+        segments.append((first, split, importances[split]))
+        segments.append((split, last, importances[split]))
+
+    return importances
+
+
+def countKeys(data):
+    """Returns the total number of rotation and position keys of a dictionary."""
+    return sum(len(joint["rotation_keys"]) + len(joint["position_keys"]) for joint in data["joints"].values())
+
+
+def countSampledKeys(data):
+    """Returns the number of keys of a dictionary before the reduction done while sampling, if any."""
+    return sum(
+        getattr(track, "sampled", len(track))
+        for joint in data["joints"].values()
+        for track in (joint["rotation_keys"], joint["position_keys"])
+    )
+
+
+def reduceKeyframes(data, rotation_tolerance, position_tolerance, joint_tolerances=None):
+    """
+    Drops every key that can be rebuilt from its neighbours within tolerance.
+
+    rotation_tolerance is an angle in radians, position_tolerance a distance
+    in the units of the position keys. joint_tolerances optionally maps joint
+    names to their own (rotation_tolerance, position_tolerance).
+    """
+    joint_tolerances = joint_tolerances or {}
+
+    for joint_name, joint in data['joints'].items():
+        rotation, position = joint_tolerances.get(joint_name, (rotation_tolerance, position_tolerance))
+
+        track = getTrack(joint['rotation_keys'], ROTATION_COMPONENTS)
+        joint['rotation_keys'] = track[getReducedIndices(track.times, track.values, rotation, True)]
+
+        track = getTrack(joint['position_keys'], POSITION_COMPONENTS)
+        joint['position_keys'] = track[getReducedIndices(track.times, track.values, position, False)]
+
+    return data
+
+
+def concatenateTracks(first, second):
+    return JointTrack(
+        np.concatenate((first.times, second.times)),
+        np.concatenate((first.values, second.values)),
+        second.components
+    )
+
+
+class StreamingDuplicateRemover:
+    """
+    Same result as removeDuplicatedFrames, window by window.
+
+    The last key of a window cannot be decided before the next key is known,
+    so the last two keys are carried over to the next window: the one to
+    decide and its left neighbour.
+    """
+
+    def __init__(self, is_rotation):
+        self.quantize = quantizeRotations if is_rotation else quantizePositions
+        self.tail = None
+
+    def push(self, track):
+        """Returns the keys of the window, and of the previous ones, that are decided and kept."""
+        if self.tail is not None:
+            start = len(self.tail) - 1
+            track = concatenateTracks(self.tail, track)
+        else:
+            start = 0
+        if not len(track):
+            return track
+
+        mask = getDuplicatedMask(self.quantize(track.values))
+        self.tail = track[len(track) - 2 if len(track) >= 2 else 0:]
+        return track[start + np.flatnonzero(~mask[start:-1])]
+
+    def flush(self):
+        """Returns the last key, which is always kept."""
+        if self.tail is None:
+            return None
+        return self.tail[len(self.tail) - 1:]
+
+
+class StreamingKeyframeReducer:
+    """
+    Same as reduceKeyframes, window by window.
+
+    Each window is simplified on its own, starting from the last kept key of
+    the previous window, so the error bound holds everywhere. The keys at the
+    end of the windows are always kept, which can keep a few more keys than
+    reducing the whole track at once.
+    """
+
+    def __init__(self, tolerance, is_rotation):
+        self.tolerance = tolerance
+        self.is_rotation = is_rotation
+        self.tail = None
+
+    def push(self, track):
+        """Returns the keys of the window that are kept."""
+        if self.tail is not None:
+            track = concatenateTracks(self.tail, track)
+        if not len(track):
+            return track
+
+        kept = getReducedIndices(track.times, track.values, self.tolerance, self.is_rotation)
+        if self.tail is not None:
+            kept = kept[1:]
+        self.tail = track[len(track) - 1:]
+        return track[kept]
+
+    def flush(self):
+        return None
+
+
+def getStreamingReducer(key_reduction, tolerance, is_rotation):
+    """Returns the streaming reducer of a reduction mode, None when keys are kept as they are."""
+    if 'TOLERANCE' == key_reduction:
+        return StreamingKeyframeReducer(tolerance, is_rotation)
+    if 'DUPLICATES' == key_reduction:
+        return StreamingDuplicateRemover(is_rotation)
+    return None
+
+
+class TrackStream:
+    """Feeds the windows of a track through its reducer into its spill, keeping the raw keys too if asked."""
+
+    __slots__ = ("spill", "reducer", "raw")
+
+    def __init__(self, spill, reducer, raw=None):
+        self.spill = spill
+        self.reducer = reducer
+        self.raw = raw
+
+    def push(self, track):
+        self.spill.sampled += len(track)
+        if self.raw is not None:
+            self.raw.append(track)
+        self.spill.append(self.reducer.push(track) if self.reducer else track)
+
+    def pushWindows(self, track, window):
+        for start in range(0, len(track), window):
+            self.push(track[start:start + window])
+
+    def flush(self):
+        if self.reducer:
+            self.spill.append(self.reducer.flush())
@@ -0,0 +1,104 @@
+"""
+Debug sidecars: the tracks of an export, before quantization, written next
+to the .anim file.
+
+'JSON' is the indented dump, to read in a text editor. 'COMPACT' is the same
+JSON without whitespace, which the C encoder of the json module writes many
+times faster. Both are streamed to the file, the compact one is encoded one
+track at a time so that only one track is held as a string. 'NPZ' is a numpy
+archive with the times and values of every track as arrays, named
+"<joint>/rotation_times", "<joint>/rotation_values", "<joint>/position_times"
+and "<joint>/position_values", and the header and joint priorities as JSON in
+"header". It is written one array at a time, and numpy.load opens it without
+reading the tracks.
+"""
+
+import json
+import zipfile
+
+import numpy as np
+
+from .tracks import ROTATION_COMPONENTS, POSITION_COMPONENTS, JointTrack, getTrack, getJSONValue
+
+SIDECAR_FORMATS = {
+    'JSON': ".json",
+    'COMPACT': ".json",
+    'NPZ': ".npz",
+}
+
+TRACKS = (("rotation_keys", "rotation", ROTATION_COMPONENTS), ("position_keys", "position", POSITION_COMPONENTS))
+
+
+def getSidecarPath(filepath, sidecar_format='JSON'):
+    return filepath + SIDECAR_FORMATS[sidecar_format]
+
+
+def writeCompactJSON(f_json, dictionary):
+    """Writes the dictionary without whitespace, encoding one track at a time."""
+    def dumps(value):
+        return json.dumps(value, separators=(",", ":"), default=getJSONValue)
+
+    f_json.write("{")
+    for i, (field, value) in enumerate(dictionary.items()):
+        f_json.write("," * bool(i) + dumps(field) + ":")
+        if "joints" != field:
+            f_json.write(dumps(value))
+            continue
+        f_json.write("{")
+        for j, (name, joint) in enumerate(value.items()):
+            f_json.write("," * bool(j) + dumps(name) + ":{")
+            f_json.write(",".join(dumps(key) + ":" + dumps(item) for key, item in joint.items()))
+            f_json.write("}")
+        f_json.write("}")
+    f_json.write("}")
+
+
+def writeJSON(filepath, dictionary, compact=False):
+    with open(filepath, 'w') as f_json:
+        if compact:
+            writeCompactJSON(f_json, dictionary)
+        else:
+            json.dump(dictionary, f_json, indent=4, default=getJSONValue)
+
+
+def writeArray(f_npz, name, array):
+    """Writes an array to an open .npz archive, the way numpy.savez does."""
+    with f_npz.open(name + ".npy", 'w', force_zip64=True) as f_array:
+        np.lib.format.write_array(f_array, np.asanyarray(array), allow_pickle=False)
+
+
+def writeNPZ(filepath, dictionary):
+    header = {field: value for field, value in dictionary.items() if "joints" != field}
+    header["joints"] = {name: {"priority": joint["priority"]} for name, joint in dictionary["joints"].items()}
+    with zipfile.ZipFile(filepath, 'w', allowZip64=True) as f_npz:
+        writeArray(f_npz, "header", np.array(json.dumps(header)))
+        for name, joint in dictionary["joints"].items():
+            for keys, channel, components in TRACKS:
+                track = getTrack(joint[keys], components)
+                writeArray(f_npz, "%s/%s_times" % (name, channel), track.times)
+                writeArray(f_npz, "%s/%s_values" % (name, channel), track.values)
+
+
+def writeSidecar(filepath, dictionary, sidecar_format='JSON'):
+    if 'NPZ' == sidecar_format:
+        writeNPZ(filepath, dictionary)
+    else:
+        writeJSON(filepath, dictionary, 'COMPACT' == sidecar_format)
+
+
+def readSidecar(filepath):
+    """Reads a sidecar of either format back into a clip dictionary with JointTrack keys."""
+    if filepath.endswith(".npz"):
+        with np.load(filepath) as f_npz:
+            data = json.loads(str(f_npz["header"]))
+            for name, joint in data["joints"].items():
+                for keys, channel, components in TRACKS:
+                    joint[keys] = JointTrack(f_npz["%s/%s_times" % (name, channel)], f_npz["%s/%s_values" % (name, channel)], components)
+        return data
+
+    with open(filepath) as f_json:
+        data = json.load(f_json)
+    for joint in data["joints"].values():
+        for keys, channel, components in TRACKS:
+            joint[keys] = getTrack(joint[keys], components)
+    return data
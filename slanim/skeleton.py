@@ -0,0 +1,273 @@
+"""
+The Second Life skeleton.
+
+SL_BONES maps the name of every bone of the SL skeleton (base, volume and
+Bento bones) to its canonical parent and to the group it belongs to. It is
+ordered so that parents always come before their children. SL_MIRRORS maps
+every bone to the bone on the other side of the body.
+"""
+
+BASE_BONES = [
+    "mPelvis",
+    "mTorso",
+    "mChest",
+    "mNeck",
+    "mHead",
+    "mSkull",
+    "mCollarLeft",
+    "mShoulderLeft",
+    "mElbowLeft",
+    "mWristLeft",
+    "mCollarRight",
+    "mShoulderRight",
+    "mElbowRight",
+    "mWristRight",
+    "mHipLeft",
+    "mKneeLeft",
+    "mAnkleLeft",
+    "mFootLeft",
+    "mToeLeft",
+    "mHipRight",
+    "mKneeRight",
+    "mAnkleRight",
+    "mFootRight",
+    "mToeRight",
+    "mGroin"
+]
+
+VOLUME_BONES = [
+    "LEFT_PEC",
+    "RIGHT_PEC",
+    "PELVIS",
+    "HEAD",
+    "NECK",
+    "R_CLAVICLE",
+    "L_CLAVICLE",
+    "CHEST",
+    "UPPER_BACK",
+    "BELLY",
+    "LEFT_HANDLE",
+    "RIGHT_HANDLE",
+    "R_UPPER_ARM",
+    "L_UPPER_ARM",
+    "LOWER_BACK",
+    "BUTT",
+    "R_LOWER_ARM",
+    "L_LOWER_ARM",
+    "L_HAND",
+    "R_HAND",
+    "R_UPPER_LEG",
+    "L_UPPER_LEG",
+    "R_LOWER_LEG",
+    "L_LOWER_LEG",
+    "R_FOOT",
+    "L_FOOT"
+]
+
+SIDES = ("Left", "Right")
+FINGERS = ("Thumb", "Index", "Middle", "Ring", "Pinky")
+
+
+class SLBone:
+
+    __slots__ = ("name", "parent", "group")
+
+    def __init__(self, name, parent, group):
+        self.name = name
+        self.parent = parent
+        self.group = group
+
+    def __repr__(self):
+        return "SLBone(%r, %r, %r)" % (self.name, self.parent, self.group)
+
+
+def getSkeletonDefinition():
+    """Returns (name, parent, group) for every bone of the skeleton, parents first."""
+    bones = [
+        ("mPelvis", None, 'BASE'),
+        ("mSpine1", "mPelvis", 'SPINE'),
+        ("mSpine2", "mSpine1", 'SPINE'),
+        ("mTorso", "mSpine2", 'BASE'),
+        ("mSpine3", "mTorso", 'SPINE'),
+        ("mSpine4", "mSpine3", 'SPINE'),
+        ("mChest", "mSpine4", 'BASE'),
+        ("mNeck", "mChest", 'BASE'),
+        ("mHead", "mNeck", 'BASE'),
+        ("mSkull", "mHead", 'BASE'),
+        ("mEyeRight", "mHead", 'EYES'),
+        ("mEyeLeft", "mHead", 'EYES'),
+        ("mFaceRoot", "mHead", 'FACE'),
+        ("mGroin", "mPelvis", 'BASE'),
+    ]
+
+    # Arms and fingers
+    for side in SIDES:
+        bones += [
+            ("mCollar" + side, "mChest", 'BASE'),
+            ("mShoulder" + side, "mCollar" + side, 'BASE'),
+            ("mElbow" + side, "mShoulder" + side, 'BASE'),
+            ("mWrist" + side, "mElbow" + side, 'BASE'),
+        ]
+        for finger in FINGERS:
+            parent = "mWrist" + side
+            for i in (1, 2, 3):
+                name = "mHand%s%d%s" % (finger, i, side)
+                bones.append((name, parent, 'FINGERS'))
+                parent = name
+
+    # Legs
+    for side in SIDES:
+        bones += [
+            ("mHip" + side, "mPelvis", 'BASE'),
+            ("mKnee" + side, "mHip" + side, 'BASE'),
+            ("mAnkle" + side, "mKnee" + side, 'BASE'),
+            ("mFoot" + side, "mAnkle" + side, 'BASE'),
+            ("mToe" + side, "mFoot" + side, 'BASE'),
+        ]
+
+    # Tail
+    parent = "mPelvis"
+    for i in range(1, 7):
+        bones.append(("mTail%d" % i, parent, 'TAIL'))
+        parent = "mTail%d" % i
+
+    # Wings
+    bones.append(("mWingsRoot", "mChest", 'WINGS'))
+    for side in SIDES:
+        parent = "mWingsRoot"
+        for i in (1, 2, 3, 4):
+            bones.append(("mWing%d%s" % (i, side), parent, 'WINGS'))
+            parent = "mWing%d%s" % (i, side)
+        bones.append(("mWing4Fan" + side, "mWing3" + side, 'WINGS'))
+
+    # Hind limbs
+    bones.append(("mHindLimbsRoot", "mPelvis", 'HIND_LIMBS'))
+    for side in SIDES:
+        parent = "mHindLimbsRoot"
+        for i in (1, 2, 3, 4):
+            bones.append(("mHindLimb%d%s" % (i, side), parent, 'HIND_LIMBS'))
+            parent = "mHindLimb%d%s" % (i, side)
+
+    # Face
+    for side in SIDES:
+        bones += [
+            ("mFaceEyeAlt" + side, "mFaceRoot", 'FACE'),
+            ("mFaceForehead" + side, "mFaceRoot", 'FACE'),
+            ("mFaceEyebrowOuter" + side, "mFaceRoot", 'FACE'),
+            ("mFaceEyebrowCenter" + side, "mFaceRoot", 'FACE'),
+            ("mFaceEyebrowInner" + side, "mFaceRoot", 'FACE'),
+            ("mFaceEyeLidUpper" + side, "mFaceRoot", 'FACE'),
+            ("mFaceEyeLidLower" + side, "mFaceRoot", 'FACE'),
+            ("mFaceEar1" + side, "mFaceRoot", 'FACE'),
+            ("mFaceEar2" + side, "mFaceEar1" + side, 'FACE'),
+            ("mFaceNose" + side, "mFaceRoot", 'FACE'),
+            ("mFaceCheekUpper" + side, "mFaceRoot", 'FACE'),
+            ("mFaceCheekLower" + side, "mFaceRoot", 'FACE'),
+            ("mFaceEyecornerInner" + side, "mFaceRoot", 'FACE'),
+        ]
+    bones += [
+        ("mFaceForeheadCenter", "mFaceRoot", 'FACE'),
+        ("mFaceNoseCenter", "mFaceRoot", 'FACE'),
+        ("mFaceNoseBase", "mFaceRoot", 'FACE'),
+        ("mFaceNoseBridge", "mFaceRoot", 'FACE'),
+        ("mFaceJawShaper", "mFaceRoot", 'FACE'),
+        ("mFaceJaw", "mFaceRoot", 'FACE'),
+        ("mFaceChin", "mFaceJaw", 'FACE'),
+        ("mFaceTeethLower", "mFaceJaw", 'FACE'),
+        ("mFaceLipLowerLeft", "mFaceTeethLower", 'FACE'),
+        ("mFaceLipLowerRight", "mFaceTeethLower", 'FACE'),
+        ("mFaceLipLowerCenter", "mFaceTeethLower", 'FACE'),
+        ("mFaceTongueBase", "mFaceTeethLower", 'FACE'),
+        ("mFaceTongueTip", "mFaceTongueBase", 'FACE'),
+        ("mFaceTeethUpper", "mFaceRoot", 'FACE'),
+        ("mFaceLipUpperLeft", "mFaceTeethUpper", 'FACE'),
+        ("mFaceLipUpperRight", "mFaceTeethUpper", 'FACE'),
+        ("mFaceLipUpperCenter", "mFaceTeethUpper", 'FACE'),
+        ("mFaceLipCornerLeft", "mFaceTeethUpper", 'FACE'),
+        ("mFaceLipCornerRight", "mFaceTeethUpper", 'FACE'),
+    ]
+
+    # Volume bones
+    bones += [
+        ("PELVIS", "mPelvis", 'VOLUME'),
+        ("BUTT", "mPelvis", 'VOLUME'),
+        ("BELLY", "mTorso", 'VOLUME'),
+        ("LEFT_HANDLE", "mTorso", 'VOLUME'),
+        ("RIGHT_HANDLE", "mTorso", 'VOLUME'),
+        ("LOWER_BACK", "mTorso", 'VOLUME'),
+        ("CHEST", "mChest", 'VOLUME'),
+        ("LEFT_PEC", "mChest", 'VOLUME'),
+        ("RIGHT_PEC", "mChest", 'VOLUME'),
+        ("UPPER_BACK", "mChest", 'VOLUME'),
+        ("NECK", "mNeck", 'VOLUME'),
+        ("HEAD", "mHead", 'VOLUME'),
+    ]
+    for side, prefix in (("Left", "L_"), ("Right", "R_")):
+        bones += [
+            (prefix + "CLAVICLE", "mCollar" + side, 'VOLUME'),
+            (prefix + "UPPER_ARM", "mShoulder" + side, 'VOLUME'),
+            (prefix + "LOWER_ARM", "mElbow" + side, 'VOLUME'),
+            (prefix + "HAND", "mWrist" + side, 'VOLUME'),
+            (prefix + "UPPER_LEG", "mHip" + side, 'VOLUME'),
+            (prefix + "LOWER_LEG", "mKnee" + side, 'VOLUME'),
+            (prefix + "FOOT", "mAnkle" + side, 'VOLUME'),
+        ]
+
+    return bones
+
+
+SL_BONES = {name: SLBone(name, parent, group) for name, parent, group in getSkeletonDefinition()}
+
+# Left and right parts of the names: Left/Right suffixes, L_/R_ and LEFT_/RIGHT_ volume bone prefixes
+MIRROR_SUFFIXES = (("Left", "Right"),)
+MIRROR_PREFIXES = (("L_", "R_"), ("LEFT_", "RIGHT_"))
+
+
+def getMirrorName(name):
+    """Returns the name of the bone on the other side of the body, or the name itself for the bones of the middle."""
+    for left, right in MIRROR_SUFFIXES:
+        for side, other in ((left, right), (right, left)):
+            if name.endswith(side):
+                return name[:-len(side)] + other
+    for left, right in MIRROR_PREFIXES:
+        for side, other in ((left, right), (right, left)):
+            if name.startswith(side):
+                return other + name[len(side):]
+    return name
+
+
+SL_MIRRORS = {name: getMirrorName(name) for name in SL_BONES}
+
+
+def is_sl_bone(bone):
+    return bone in SL_BONES
+
+
+def getHierarchyIssues(parents):
+    """
+    Checks an armature against the SL hierarchy.
+
+    parents maps every bone name of the armature to the name of its parent,
+    or None. Bones of the SL skeleton that are missing from the armature are
+    skipped, so a bone may be parented to its nearest SL ancestor. Returns
+    one message per SL bone that is parented elsewhere.
+    """
+    issues = []
+    for name in parents:
+        if name not in SL_BONES:
+            continue
+
+        # Nearest ancestor in the armature that is an SL bone
+        actual = parents[name]
+        while actual is not None and actual not in SL_BONES:
+            actual = parents.get(actual)
+
+        # Nearest canonical ancestor that exists in the armature
+        expected = SL_BONES[name].parent
+        while expected is not None and expected not in parents:
+            expected = SL_BONES[expected].parent
+
+        if actual != expected:
+            issues.append("%s is parented to %s instead of %s" % (name, actual, expected))
+
+    return issues
@@ -0,0 +1,70 @@
+"""
+Sparse sampling.
+
+Clips keyed by hand often have a few keys per bone over hundreds of frames.
+Instead of sampling every frame, a track is first sampled at the frames of
+its keys. Every gap between two samples is then probed at its thirds: when
+a probe strays from the interpolation of the ends of the gap by more than
+the tolerance, the probes are kept and the new gaps are probed in turn.
+Gaps that interpolate well are never sampled again. A single probe in the
+middle would miss the error of eases, which are symmetric.
+"""
+
+import numpy as np
+
+from .compare import interpolateRotations, interpolatePositions
+from .reduction import getRotationErrors, getPositionErrors
+
+PROBES = np.array([1, 2])
+
+
+def getProbes(starts, ends):
+    """Returns the frames strictly inside every gap at its thirds, and the index of the gap of each of them."""
+    spans = ends - starts
+    probes = starts[:, None] + spans[:, None] * PROBES // 3
+    inside = (probes > starts[:, None]) & (probes < ends[:, None])
+    # Short gaps give the same probe more than once
+    inside[:, 1:] &= probes[:, 1:] != probes[:, :-1]
+    gaps = np.broadcast_to(np.arange(len(starts))[:, None], probes.shape)
+    return probes[inside], gaps[inside]
+
+
+def sampleSparse(frames, sample, tolerance, is_rotation):
+    """
+    Samples a track at the given frames, then refines it until it is within
+    tolerance of the interpolation of its samples on every probed frame.
+
+    frames are integers and must include both ends of the range. sample
+    returns the (N, 4) quaternions or (N, 3) positions of a list of frames.
+    Returns the sorted sampled frames and their values.
+    """
+    frames = np.unique(np.asarray(frames, dtype=np.int64))
+    values = np.asarray(sample(frames), dtype=np.float64)
+    interpolate = interpolateRotations if is_rotation else interpolatePositions
+    getErrors = getRotationErrors if is_rotation else getPositionErrors
+    pending = np.ones(max(len(frames) - 1, 0), dtype=bool)
+
+    while pending.any():
+        starts = frames[:-1][pending]
+        ends = frames[1:][pending]
+        probes, gaps = getProbes(starts, ends)
+        if not len(probes):
+            break
+
+        probe_values = np.asarray(sample(probes), dtype=np.float64)
+        errors = getErrors(probe_values, interpolate(frames, values, probes))
+        gap_errors = np.zeros(len(starts))
+        np.maximum.at(gap_errors, gaps, errors)
+
+        # Probes of the gaps that stray are kept, the gaps around them are probed next
+        keep = gap_errors[gaps] > tolerance
+        if not keep.any():
+            break
+        frames = np.concatenate((frames, probes[keep]))
+        values = np.concatenate((values, probe_values[keep]))
+        is_new = np.concatenate((np.zeros(len(frames) - keep.sum(), dtype=bool), np.ones(keep.sum(), dtype=bool)))
+        order = np.argsort(frames, kind='stable')
+        frames, values, is_new = frames[order], values[order], is_new[order]
+        pending = is_new[:-1] | is_new[1:]
+
+    return frames, values
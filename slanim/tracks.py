@@ -0,0 +1,121 @@
+"""
+Compact key storage.
+
+A JointTrack holds the keys of one channel of one joint as two contiguous
+arrays: the U16 times and the float32 values, one row per key. It replaces
+the lists of {"time", "x", "y", "z"} dictionaries, which are only built when
+they are actually needed, for the JSON dump.
+
+A TrackSpill collects the keys of a track chunk by chunk, either in memory
+or appended to a file, so that a long take never has to be held in memory
+all at once.
+"""
+
+import numpy as np
+
+ROTATION_COMPONENTS = ("w", "x", "y", "z")
+POSITION_COMPONENTS = ("x", "y", "z")
+
+
+class JointTrack:
+
+    __slots__ = ("times", "values", "components")
+
+    def __init__(self, times, values, components):
+        self.times = np.ascontiguousarray(times, dtype=np.uint16)
+        self.values = np.ascontiguousarray(values, dtype=np.float32).reshape(-1, len(components))
+        self.components = components
+
+    @classmethod
+    def fromKeys(cls, keys, components):
+        """Builds a track from a list of key dictionaries."""
+        times = [key["time"] for key in keys]
+        values = [[key[component] for component in components] for key in keys]
+        return cls(times, values, components)
+
+    def toKeys(self):
+        """Returns the keys as a list of dictionaries."""
+        return [
+            {"time": time, **dict(zip(self.components, values))}
+            for time, values in zip(self.times.tolist(), self.values.tolist())
+        ]
+
+    def __len__(self):
+        return len(self.times)
+
+    def __getitem__(self, indices):
+        """Returns a new track with the keys at these indices."""
+        return JointTrack(self.times[indices], self.values[indices], self.components)
+
+    def __repr__(self):
+        return "JointTrack(%d keys, %s)" % (len(self), "".join(self.components))
+
+
+class TrackSpill:
+
+    __slots__ = ("components", "path", "chunks", "count", "sampled")
+
+    def __init__(self, components, path=None):
+        self.components = components
+        self.path = path
+        self.chunks = []
+        self.count = 0
+        self.sampled = 0
+        if path is not None:
+            open(path, 'wb').close()
+
+    def getRecordType(self):
+        return np.dtype([("time", "<u2"), ("values", "<f4", (len(self.components),))])
+
+    def append(self, track):
+        """Adds the keys of a track after the ones already spilled."""
+        if track is None or not len(track):
+            return
+        self.count += len(track)
+        if self.path is None:
+            self.chunks.append(track)
+            return
+        records = np.empty(len(track), dtype=self.getRecordType())
+        records["time"] = track.times
+        records["values"] = track.values
+        with open(self.path, 'ab') as f_spill:
+            f_spill.write(records.tobytes())
+
+    def load(self):
+        """Returns all the spilled keys as a single JointTrack."""
+        if self.path is None:
+            if 1 == len(self.chunks):
+                return self.chunks[0]
+            return JointTrack(
+                np.concatenate([track.times for track in self.chunks]) if self.chunks else np.empty(0),
+                np.concatenate([track.values for track in self.chunks]) if self.chunks else np.empty(0),
+                self.components
+            )
+        records = np.fromfile(self.path, dtype=self.getRecordType())
+        return JointTrack(records["time"], records["values"], self.components)
+
+    def __len__(self):
+        return self.count
+
+    def __repr__(self):
+        return "TrackSpill(%d keys, %s)" % (self.count, "".join(self.components))
+
+
+def getTrack(keys, components):
+    """Returns keys as a JointTrack, whether they are one, a TrackSpill or a list of dictionaries."""
+    if isinstance(keys, JointTrack):
+        return keys
+    if isinstance(keys, TrackSpill):
+        return keys.load()
+    return JointTrack.fromKeys(keys, components)
+
+
+def getEmptyTrack(components):
+    return JointTrack(np.empty(0), np.empty((0, len(components))), components)
+
+
+def getJSONValue(value):
+    """json default hook that expands tracks into lists of key dictionaries."""
+    if isinstance(value, (JointTrack, TrackSpill)):
+        return getTrack(value, value.components).toKeys()
+    raise TypeError("Object of type %s is not JSON serializable" % type(value).__name__)
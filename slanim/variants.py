@@ -0,0 +1,88 @@
+"""
+Export variants.
+
+A motion is often shipped in several versions that only differ by their
+header (priority, loop, ease in and out), by leaving the translations out,
+or by being mirrored. They are all cut from the same sampled tracks, so the
+clip is sampled and reduced once and every variant only costs its encoding.
+A spec lists the variants, separated by semicolons, each with a name and the
+settings that differ from the export:
+
+    p2: priority=2; once: loop=0, ease_in=0.3, ease_out=0.3; rot: with_translations=0; left: mirror=1
+
+Every variant is written next to the exported file, with its name as a suffix.
+"""
+
+import os
+import re
+
+from .mirror import getMirroredJoints
+from .tracks import POSITION_COMPONENTS, getEmptyTrack
+
+BOOLEANS = {"1": True, "true": True, "yes": True, "0": False, "false": False, "no": False}
+
+VARIANT_SETTINGS = {
+    "priority": int,
+    "loop": lambda value: BOOLEANS[value.lower()],
+    "loop_start": int,
+    "loop_end": int,
+    "ease_in": float,
+    "ease_out": float,
+    "with_translations": lambda value: BOOLEANS[value.lower()],
+    "mirror": lambda value: BOOLEANS[value.lower()],
+}
+
+
+def parseVariants(spec):
+    """Returns the variants of a spec as a list of {"name": name, setting: value}. Raises ValueError on a bad spec."""
+    variants = []
+    for part in (spec or "").split(";"):
+        if not part.strip():
+            continue
+        name, colon, settings = part.partition(":")
+        name = name.strip()
+        if not re.match(r'^[\w-]+$', name):
+            raise ValueError("bad variant name '%s', use letters, digits, - and _" % name)
+        if any(name == variant["name"] for variant in variants):
+            raise ValueError("variant '%s' is given twice" % name)
+
+        variant = {"name": name}
+        for setting in settings.split(","):
+            if not setting.strip():
+                continue
+            key, equals, value = (item.strip() for item in setting.partition("="))
+            if key not in VARIANT_SETTINGS or not equals:
+                raise ValueError("bad setting '%s' in variant '%s', expected one of %s" % (setting.strip(), name, ", ".join(VARIANT_SETTINGS)))
+            try:
+                variant[key] = VARIANT_SETTINGS[key](value)
+            except (KeyError, ValueError):
+                raise ValueError("bad value '%s' for %s in variant '%s'" % (value, key, name))
+        if not 0 <= variant.get("priority", 0) <= 6:
+            raise ValueError("the priority of variant '%s' is not between 0 and 6" % name)
+        variants.append(variant)
+    return variants
+
+
+def getVariantPath(filepath, name):
+    """Returns the path of a variant of an exported file: walk.anim gives walk_name.anim."""
+    base, ext = os.path.splitext(filepath)
+    return "%s_%s%s" % (base, name, ext)
+
+
+def getVariantJoints(joints, priority, with_translations, mirror=False, offset=0.0):
+    """
+    Returns the joints of a variant, sharing the tracks of the sampled ones.
+
+    Without translations, only mPelvis keeps its position keys, and the
+    joints left without keys are dropped, as if they were never sampled.
+    Mirrored joints get mirrored copies of the tracks, offset being the
+    rest position subtracted from the mPelvis positions.
+    """
+    variant = {}
+    for name, joint in joints.items():
+        joint = dict(joint, priority=priority)
+        if not with_translations and 'mPelvis' != name:
+            joint["position_keys"] = getEmptyTrack(POSITION_COMPONENTS)
+        if len(joint["rotation_keys"]) or len(joint["position_keys"]):
+            variant[name] = joint
+    return getMirroredJoints(variant, offset) if mirror else variant